@@ -0,0 +1,24 @@
+from django.core.files.storage import Storage
+import pytest
+
+# The tests directory is on the path of benchmarks, to share its Django project
+from storage_factories import minio_storage_factory, s3boto3_storage_factory
+
+from s3_file_field._multipart import MultipartManager
+from s3_file_field.memory import MemoryStorage
+
+
+@pytest.fixture(
+    params=[s3boto3_storage_factory, minio_storage_factory, MemoryStorage],
+    ids=['s3boto3', 'minio', 'memory'],
+)
+def storage(request) -> Storage:
+    if request.param is MemoryStorage:
+        # Part URLs can only be presigned while the store is served
+        request.getfixturevalue('s3ff_memory_store')
+    return request.param()
+
+
+@pytest.fixture
+def multipart_manager(storage: Storage) -> MultipartManager:
+    return MultipartManager.from_storage(storage)
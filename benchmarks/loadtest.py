@@ -0,0 +1,245 @@
+"""
+A load test of the upload API, which simulates many concurrent clients uploading files.
+
+Virtual uploaders each repeatedly upload a file with the Python client, with sizes drawn from a
+weighted distribution. Their number is ramped through several stages; for each stage, the latency
+percentiles, throughput and error rate of each endpoint (and of whole uploads) are reported.
+
+By default, the Django project of the tests is served in-process, by a single worker, with either an
+in-memory object store ("--store memory") or the MinIO-compatible store configured for the tests
+("--store minio"). Alternatively, the URL of the upload API of an existing deployment may be given
+with "--target". Run with, e.g.:
+    python benchmarks/loadtest.py --users 1,8,32 --duration 10 --sizes 1KB:8,64MB:2
+"""
+
+import argparse
+import contextlib
+from dataclasses import dataclass, field
+import io
+import math
+import os
+from pathlib import Path
+import random
+import re
+from socketserver import ThreadingMixIn
+import sys
+import threading
+import time
+from typing import Dict, Iterator, List, Optional, Sequence, Tuple
+from wsgiref.simple_server import WSGIRequestHandler, WSGIServer, make_server
+
+import requests
+
+# Allow running this script directly from a source checkout, with the Django project of the tests
+ROOT = Path(__file__).resolve().parent.parent
+sys.path[:0] = [str(ROOT), str(ROOT / 'python-client'), str(ROOT / 'tests')]
+
+from s3_file_field_client import S3FileFieldClient  # noqa: E402
+
+_SIZE_UNITS = {'': 1, 'B': 1, 'KB': 2**10, 'MB': 2**20, 'GB': 2**30}
+
+# Request paths, by the endpoint they belong to
+_ENDPOINTS = {
+    'upload-initialize/': 'initialize',
+    'upload-complete/': 'complete',
+    'finalize/': 'finalize',
+}
+
+
+def parse_size(size: str) -> int:
+    match = re.fullmatch(r'(\d+)\s*([KMG]?B?)', size.strip().upper())
+    if not match:
+        raise argparse.ArgumentTypeError(f'Invalid size "{size}".')
+    return int(match[1]) * _SIZE_UNITS[match[2]]
+
+
+def parse_size_distribution(distribution: str) -> List[Tuple[int, float]]:
+    """Parse a distribution of file sizes, e.g. "1KB:8,64MB:2", into (size, weight) pairs."""
+    sizes = []
+    for item in distribution.split(','):
+        size, _, weight = item.partition(':')
+        sizes.append((parse_size(size), float(weight or 1)))
+    return sizes
+
+
+def parse_users(users: str) -> List[int]:
+    return [int(stage) for stage in users.split(',')]
+
+
+def percentile(sorted_samples: Sequence[float], percent: float) -> float:
+    # Nearest-rank
+    return sorted_samples[max(math.ceil(percent / 100 * len(sorted_samples)) - 1, 0)]
+
+
+@dataclass
+class _EndpointStats:
+    latencies: List[float] = field(default_factory=list)
+    errors: int = 0
+
+
+class Recorder:
+    """Record the latency and outcome of requests, by endpoint, from any thread."""
+
+    def __init__(self) -> None:
+        self._lock = threading.Lock()
+        self.endpoints: Dict[str, _EndpointStats] = {}
+
+    def record(self, endpoint: str, latency: float, ok: bool) -> None:
+        with self._lock:
+            stats = self.endpoints.setdefault(endpoint, _EndpointStats())
+            stats.latencies.append(latency)
+            if not ok:
+                stats.errors += 1
+
+    def response_hook(self, response: requests.Response, *args, **kwargs) -> None:
+        for path, endpoint in _ENDPOINTS.items():
+            if response.request.path_url.split('?')[0].endswith(path):
+                self.record(endpoint, response.elapsed.total_seconds(), response.ok)
+                return
+
+    def report(self, users: int, duration: float) -> str:
+        lines = [
+            f'{users} concurrent uploader(s), {duration:.1f}s',
+            f'  {"endpoint":<12}{"requests":>9}{"req/s":>9}{"p50 ms":>10}{"p95 ms":>10}'
+            f'{"p99 ms":>10}{"errors":>9}',
+        ]
+        for endpoint in [*_ENDPOINTS.values(), 'upload']:
+            stats = self.endpoints.get(endpoint)
+            if not stats:
+                continue
+            latencies = sorted(stats.latencies)
+            lines.append(
+                f'  {endpoint:<12}{len(latencies):>9}{len(latencies) / duration:>9.1f}'
+                + ''.join(
+                    f'{percentile(latencies, percent) * 1000:>10.1f}' for percent in [50, 95, 99]
+                )
+                + f'{stats.errors / len(latencies):>9.1%}'
+            )
+        return '\n'.join(lines)
+
+
+def run_stage(
+    base_url: str,
+    field_id: str,
+    users: int,
+    duration: float,
+    sizes: List[Tuple[int, float]],
+    max_workers: int,
+) -> Tuple[Recorder, float]:
+    """
+    Run a number of virtual uploaders concurrently, for a duration.
+
+    Return the recorded requests, and the actual duration (including the last uploads to finish).
+    """
+    recorder = Recorder()
+    stage_start = time.monotonic()
+    deadline = stage_start + duration
+    size_values = [size for size, _ in sizes]
+    size_weights = [weight for _, weight in sizes]
+
+    def uploader() -> None:
+        # Each uploader is a separate client, as each browser would be
+        api_session = requests.Session()
+        api_session.hooks['response'].append(recorder.response_hook)
+        client = S3FileFieldClient(base_url, api_session, max_workers=max_workers)
+        while time.monotonic() < deadline:
+            file_size = random.choices(size_values, size_weights)[0]
+            start = time.monotonic()
+            try:
+                client.upload_file(io.BytesIO(bytes(file_size)), 'loadtest.bin', field_id)
+            except Exception:
+                recorder.record('upload', time.monotonic() - start, ok=False)
+            else:
+                recorder.record('upload', time.monotonic() - start, ok=True)
+
+    threads = [threading.Thread(target=uploader, daemon=True) for _ in range(users)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    return recorder, time.monotonic() - stage_start
+
+
+class _ThreadingWSGIServer(ThreadingMixIn, WSGIServer):
+    daemon_threads = True
+
+
+class _QuietHandler(WSGIRequestHandler):
+    def log_message(self, format, *args):
+        pass
+
+
+@contextlib.contextmanager
+def serve_project(store: str) -> Iterator[str]:
+    """Serve the Django project of the tests in-process, yielding the URL of the upload API."""
+    os.environ.setdefault('DJANGO_SETTINGS_MODULE', 'test_app.settings')
+    import django
+    from django.conf import settings
+    from django.core.wsgi import get_wsgi_application
+    from django.urls import reverse
+
+    django.setup()
+    with contextlib.ExitStack() as stack:
+        if store == 'memory':
+            from s3_file_field.memory import default_store
+
+            settings.DEFAULT_FILE_STORAGE = 's3_file_field.memory.MemoryStorage'
+            stack.enter_context(default_store.serve())
+
+        server = make_server(
+            '127.0.0.1',
+            0,
+            get_wsgi_application(),
+            server_class=_ThreadingWSGIServer,
+            handler_class=_QuietHandler,
+        )
+        thread = threading.Thread(target=server.serve_forever, daemon=True)
+        thread.start()
+        stack.callback(server.server_close)
+        stack.callback(server.shutdown)
+
+        api_path = reverse('s3_file_field:upload-initialize').rsplit('upload-initialize/', 1)[0]
+        yield f'http://127.0.0.1:{server.server_port}{api_path}'
+
+
+def main(argv: Optional[Sequence[str]] = None) -> None:
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument(
+        '--users',
+        type=parse_users,
+        default=[1, 2, 4, 8, 16],
+        help='The number of concurrent uploaders in each stage, e.g. "1,4,16".',
+    )
+    parser.add_argument(
+        '--duration', type=float, default=10, help='The duration of each stage, in seconds.'
+    )
+    parser.add_argument(
+        '--sizes',
+        type=parse_size_distribution,
+        default=[(2**10, 1)],
+        help='File sizes, with optional relative weights, e.g. "1KB:8,64MB:2".',
+    )
+    parser.add_argument('--field-id', default='test_app.Resource.blob')
+    parser.add_argument(
+        '--max-workers',
+        type=int,
+        default=4,
+        help='The number of parts each client uploads at once.',
+    )
+    parser.add_argument('--store', choices=['memory', 'minio'], default='memory')
+    parser.add_argument(
+        '--target', help='The URL of the upload API to test, rather than serving the test project.'
+    )
+    args = parser.parse_args(argv)
+
+    with contextlib.ExitStack() as stack:
+        base_url = args.target or stack.enter_context(serve_project(args.store))
+        for users in args.users:
+            recorder, duration = run_stage(
+                base_url, args.field_id, users, args.duration, args.sizes, args.max_workers
+            )
+            print(recorder.report(users, duration), flush=True)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,120 @@
+"""
+Simulate the cost of uploading files with different part size planning strategies.
+
+For each combination of client profile and file size, this reports the number of HTTP requests
+required to upload a file and the expected retry overhead. Part failures are modeled as a Poisson
+process over transfer time, where a failed part must be re-sent from its beginning.
+
+Run with: python benchmarks/part_size_planning.py
+"""
+
+from __future__ import annotations
+
+from dataclasses import dataclass
+import math
+from pathlib import Path
+import sys
+from typing import Dict, List
+
+# Allow running this script directly from a source checkout
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+
+from s3_file_field._multipart import MultipartManager  # noqa: E402
+from s3_file_field._sizes import gb, kb, mb, tb  # noqa: E402
+from s3_file_field.planning import (  # noqa: E402
+    AdaptivePartSizePlanner,
+    ClientHints,
+    FixedPartSizePlanner,
+    PartSizePlanner,
+)
+
+# Requests made to Django (initialize, complete, finalize) and to S3 (CompleteMultipartUpload)
+FIXED_REQUEST_COUNT = 4
+
+
+@dataclass(frozen=True)
+class ClientProfile:
+    name: str
+    hints: ClientHints
+    # The expected number of failures per hour of transfer time
+    failures_per_hour: float
+
+
+CLIENT_PROFILES = [
+    ClientProfile('datacenter', ClientHints(bandwidth=mb(100), concurrency=8), 0.1),
+    ClientProfile('broadband', ClientHints(bandwidth=mb(5), concurrency=4), 1.0),
+    ClientProfile('mobile', ClientHints(bandwidth=kb(256), concurrency=2), 12.0),
+]
+
+FILE_SIZES = [mb(10), gb(1), gb(100), tb(5)]
+
+STRATEGIES: Dict[str, PartSizePlanner] = {
+    'fixed-64MB': FixedPartSizePlanner(mb(64)),
+    'fixed-5MB': FixedPartSizePlanner(mb(5)),
+    'adaptive': AdaptivePartSizePlanner(),
+}
+
+
+def expected_transfer_time(part_duration: float, failure_rate: float) -> float:
+    """Return the expected time to transfer a part, if it restarts after each failure."""
+    if failure_rate == 0:
+        return part_duration
+    return math.expm1(failure_rate * part_duration) / failure_rate
+
+
+def simulate(planner: PartSizePlanner, profile: ClientProfile, file_size: int) -> Dict:
+    part_size = planner(file_size, None, profile.hints)
+    part_sizes = [size for _, size in MultipartManager._iter_part_sizes(file_size, part_size)]
+
+    bandwidth = profile.hints.bandwidth or 1
+    failure_rate = profile.failures_per_hour / 3600
+    ideal_time = 0.0
+    expected_time = 0.0
+    # Parts of the same size have the same cost, so avoid iterating over up to 10,000 parts
+    for size in set(part_sizes):
+        count = part_sizes.count(size)
+        duration = size / bandwidth
+        ideal_time += count * duration
+        expected_time += count * expected_transfer_time(duration, failure_rate)
+
+    return {
+        'part_size': part_sizes[0],
+        'requests': len(part_sizes) + FIXED_REQUEST_COUNT,
+        'retry_overhead': expected_time / ideal_time - 1,
+        'retried_bytes': (expected_time - ideal_time) * bandwidth,
+    }
+
+
+def format_size(size: float) -> str:
+    for unit in ['B', 'KB', 'MB', 'GB', 'TB']:
+        if size < 1024:
+            return f'{size:.0f}{unit}'
+        size /= 1024
+    return f'{size:.0f}PB'
+
+
+def main() -> None:
+    header = ['client', 'file size', 'strategy', 'part size', 'requests', 'retry overhead']
+    rows: List[List[str]] = []
+    for profile in CLIENT_PROFILES:
+        for file_size in FILE_SIZES:
+            for strategy_name, planner in STRATEGIES.items():
+                result = simulate(planner, profile, file_size)
+                rows.append(
+                    [
+                        profile.name,
+                        format_size(file_size),
+                        strategy_name,
+                        format_size(result['part_size']),
+                        str(result['requests']),
+                        f'{result["retry_overhead"]:.2%} ({format_size(result["retried_bytes"])})',
+                    ]
+                )
+
+    widths = [max(len(row[i]) for row in [header, *rows]) for i in range(len(header))]
+    for row in [header, *rows]:
+        print('  '.join(cell.ljust(width) for cell, width in zip(row, widths)).rstrip())
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,200 @@
+"""
+Benchmarks of the server-side upload API.
+
+These require pytest-benchmark and an object store, as configured for the tests. Run with:
+    tox -e bench
+Results are saved as JSON in ".benchmarks/", and may be compared with earlier runs, e.g.:
+    tox -e bench -- --benchmark-compare
+"""
+
+from typing import Iterator, List, Tuple
+
+from django.core import signing
+from django.core.files.base import ContentFile
+from django.core.files.storage import default_storage
+from django.urls import reverse
+import pytest
+from rest_framework.test import APIClient
+
+from s3_file_field import _tokens
+from s3_file_field._multipart import (
+    MultipartManager,
+    PartPlan,
+    TransferredPart,
+    TransferredParts,
+)
+from s3_file_field._sizes import gb, kb, mb, tb
+
+FILE_SIZES = [kb(1), mb(64), gb(10), tb(1), tb(5)]
+FILE_SIZE_IDS = ['1KB', '64MB', '10GB', '1TB', '5TB']
+
+file_sizes = pytest.mark.parametrize('file_size', FILE_SIZES, ids=FILE_SIZE_IDS)
+
+
+def transferred_parts(file_size: int, checksum_algorithm=None) -> TransferredParts:
+    plan = MultipartManager._plan_parts(file_size)
+    return TransferredParts(
+        object_key='benchmark/test.bin',
+        upload_id='benchmark-upload-id',
+        parts=[
+            TransferredPart(
+                part_number=part_number,
+                size=size,
+                etag=f'"{part_number:032x}"',
+                checksum=(
+                    'AAAAAAAAAAAAAAAAAAAAAAAAAAAAAAAAAAAAAAAAAAA=' if checksum_algorithm else None
+                ),
+            )
+            for part_number, size in plan
+        ],
+        checksum_algorithm=checksum_algorithm,
+    )
+
+
+@pytest.fixture
+def created_uploads(multipart_manager: MultipartManager) -> Iterator[List[Tuple[str, str]]]:
+    """Record the uploads created by a benchmark, to abort them afterwards."""
+    uploads: List[Tuple[str, str]] = []
+    yield uploads
+    for object_key, upload_id in uploads:
+        multipart_manager._abort_upload_id(object_key, upload_id)
+
+
+@file_sizes
+def test_plan_parts(benchmark, file_size):
+    plan: PartPlan = benchmark(MultipartManager._plan_parts, file_size)
+    assert plan.count <= 10_000
+
+
+@file_sizes
+def test_iter_part_sizes(benchmark, file_size):
+    part_sizes = benchmark(lambda: list(MultipartManager._iter_part_sizes(file_size)))
+    assert sum(size for _, size in part_sizes) == file_size
+
+
+@file_sizes
+def test_initialize_upload(benchmark, multipart_manager, created_uploads, file_size):
+    def initialize_upload():
+        transfer = multipart_manager.initialize_upload('benchmark/test.bin', file_size)
+        created_uploads.append((transfer.object_key, transfer.upload_id))
+        # Presigning is deferred until the parts are serialized, as they are by the view
+        return transfer.parts.to_dicts()
+
+    parts = benchmark(initialize_upload)
+    assert parts
+
+
+@file_sizes
+def test_complete_upload(benchmark, multipart_manager, file_size):
+    completion = benchmark(multipart_manager.complete_upload, transferred_parts(file_size))
+    assert completion.complete_url
+
+
+@file_sizes
+@pytest.mark.parametrize('checksum_algorithm', [None, 'SHA256'], ids=['none', 'sha256'])
+def test_generate_presigned_complete_body(
+    benchmark, multipart_manager, file_size, checksum_algorithm
+):
+    body = benchmark(
+        multipart_manager._generate_presigned_complete_body,
+        transferred_parts(file_size, checksum_algorithm),
+    )
+    assert body.endswith('</CompleteMultipartUpload>')
+
+
+@file_sizes
+def test_view_upload_initialize(benchmark, file_size):
+    api_client = APIClient()
+
+    def upload_initialize():
+        resp = api_client.post(
+            reverse('s3_file_field:upload-initialize'),
+            {'field_id': 'test_app.Resource.blob', 'file_name': 'test.bin', 'file_size': file_size},
+            format='json',
+        )
+        MultipartManager.from_storage(default_storage)._abort_upload_id(
+            resp.data['object_key'], resp.data['upload_id']
+        )
+        return resp
+
+    resp = benchmark(upload_initialize)
+    assert resp.status_code == 200
+
+
+@file_sizes
+def test_view_upload_complete(benchmark, file_size):
+    api_client = APIClient()
+    parts = transferred_parts(file_size)
+    upload_signature = signing.dumps(
+        {
+            'field_id': 'test_app.Resource.blob',
+            'object_key': parts.object_key,
+            'upload_id': parts.upload_id,
+            'file_size': file_size,
+        }
+    )
+    request_data = {
+        'upload_signature': upload_signature,
+        'upload_id': parts.upload_id,
+        'parts': [
+            {'part_number': part.part_number, 'size': part.size, 'etag': part.etag}
+            for part in parts.parts
+        ],
+    }
+
+    resp = benchmark(
+        api_client.post, reverse('s3_file_field:upload-complete'), request_data, format='json'
+    )
+    assert resp.status_code == 200
+
+
+@pytest.fixture
+def stored_object_key() -> Iterator[str]:
+    object_key = default_storage.save('benchmark/test.bin', ContentFile(b'test content'))
+    yield object_key
+    default_storage.delete(object_key)
+
+
+def test_view_finalize(benchmark, stored_object_key):
+    api_client = APIClient()
+    upload_signature = signing.dumps(
+        {'field_id': 'test_app.Resource.blob', 'object_key': stored_object_key, 'file_size': 12}
+    )
+
+    resp = benchmark(
+        api_client.post,
+        reverse('s3_file_field:finalize'),
+        {'upload_signature': upload_signature},
+        format='json',
+    )
+    assert resp.status_code == 200
+
+
+@pytest.fixture
+def signature_data():
+    return {
+        'field_id': 'test_app.Resource.blob',
+        'object_key': '6a1c9f3e-1d2b-4c5d-8e7f-0123456789ab/test.bin',
+        'upload_id': 'VHdHcIJk0zT3DaZ3dIzOQ8bBjbl7XGq1Yaut2HOMXaod597a4uCo0g',
+        'file_size': tb(5),
+        'correlation_id': '0123456789abcdef0123456789abcdef',
+        'checksum_algorithm': 'SHA256',
+    }
+
+
+def test_signing_dumps(benchmark, signature_data):
+    assert benchmark(signing.dumps, signature_data)
+
+
+def test_signing_loads(benchmark, signature_data):
+    upload_signature = signing.dumps(signature_data)
+    assert benchmark(signing.loads, upload_signature) == signature_data
+
+
+def test_token_dumps(benchmark, signature_data):
+    assert benchmark(_tokens.dumps, signature_data)
+
+
+def test_token_loads(benchmark, signature_data):
+    upload_signature = _tokens.dumps(signature_data)
+    assert benchmark(_tokens.loads, upload_signature) == signature_data
@@ -0,0 +1,156 @@
+export type ChecksumAlgorithm = 'CRC32C' | 'SHA256';
+
+interface ChecksumRequest {
+  id: number;
+  algorithm: ChecksumAlgorithm;
+  blob: Blob;
+}
+
+interface ChecksumResponse {
+  id: number;
+  checksum?: string;
+  error?: string;
+}
+
+/**
+ * Compute the base64-encoded checksum of a Blob, as expected by S3.
+ *
+ * This function must be self-contained, as its source is also run inside a Web Worker.
+ */
+async function computeChecksum(algorithm: ChecksumAlgorithm, blob: Blob): Promise<string> {
+  const data = new Uint8Array(await blob.arrayBuffer());
+  let digest: Uint8Array;
+  if (algorithm === 'SHA256') {
+    digest = new Uint8Array(await crypto.subtle.digest('SHA-256', data));
+  } else if (algorithm === 'CRC32C') {
+    // Castagnoli polynomial, reversed
+    const table = new Uint32Array(256);
+    for (let i = 0; i < 256; i += 1) {
+      let value = i;
+      for (let j = 0; j < 8; j += 1) {
+        // eslint-disable-next-line no-bitwise
+        value = (value & 1) ? (0x82F63B78 ^ (value >>> 1)) : (value >>> 1);
+      }
+      table[i] = value;
+    }
+    let crc = 0xFFFFFFFF;
+    for (let i = 0; i < data.length; i += 1) {
+      // eslint-disable-next-line no-bitwise
+      crc = table[(crc ^ data[i]) & 0xFF] ^ (crc >>> 8);
+    }
+    // eslint-disable-next-line no-bitwise
+    crc = (crc ^ 0xFFFFFFFF) >>> 0;
+    digest = new Uint8Array(4);
+    new DataView(digest.buffer).setUint32(0, crc, false);
+  } else {
+    throw new Error(`Unsupported checksum algorithm "${algorithm}".`);
+  }
+  let binary = '';
+  digest.forEach((byte) => { binary += String.fromCharCode(byte); });
+  return btoa(binary);
+}
+
+/**
+ * Computes checksums in a Web Worker, so hashing does not block the thread driving the upload.
+ *
+ * If Web Workers are unavailable (or can't be created), checksums are computed on the current thread
+ * instead. If the worker fails after it is created, all pending checksums are rejected.
+ */
+export default class ChecksumWorker {
+  protected worker: Worker | null = null;
+
+  protected readonly pending = new Map<number, {
+    resolve: (checksum: string) => void,
+    reject: (error: Error) => void,
+  }>();
+
+  protected nextId = 0;
+
+  constructor() {
+    if (typeof Worker === 'undefined' || typeof Blob === 'undefined' || typeof URL === 'undefined') {
+      return;
+    }
+    const source = `const computeChecksum = ${computeChecksum.toString()};
+self.onmessage = async ({ data: { id, algorithm, blob } }) => {
+  try {
+    self.postMessage({ id, checksum: await computeChecksum(algorithm, blob) });
+  } catch (error) {
+    self.postMessage({ id, error: String(error) });
+  }
+};`;
+    const url = URL.createObjectURL(new Blob([source], { type: 'text/javascript' }));
+    let worker: Worker;
+    try {
+      worker = new Worker(url);
+    } catch {
+      // e.g. a Content Security Policy may forbid workers from blob: URLs
+      return;
+    } finally {
+      URL.revokeObjectURL(url);
+    }
+    this.worker = worker;
+    // The worker failed to load, or died, so no pending checksums will ever be computed
+    worker.onerror = (event: ErrorEvent) => {
+      event.preventDefault();
+      this.fail(new Error(`Checksum worker failed: ${event.message || 'unknown error'}`));
+    };
+    worker.onmessageerror = () => {
+      this.fail(new Error('Checksum worker sent a message which could not be deserialized.'));
+    };
+    worker.onmessage = ({ data }: MessageEvent<ChecksumResponse>) => {
+      const callbacks = this.pending.get(data.id);
+      if (!callbacks) {
+        return;
+      }
+      this.pending.delete(data.id);
+      if (data.checksum !== undefined) {
+        callbacks.resolve(data.checksum);
+      } else {
+        callbacks.reject(new Error(data.error));
+      }
+    };
+  }
+
+  /**
+   * Stop the worker, and reject every pending checksum.
+   *
+   * @param error - The reason the checksums can't be computed.
+   */
+  protected fail(error: Error): void {
+    this.worker?.terminate();
+    this.worker = null;
+    const pending = Array.from(this.pending.values());
+    this.pending.clear();
+    pending.forEach(({ reject }) => reject(error));
+  }
+
+  /**
+   * Compute the checksum of a Blob.
+   *
+   * @param algorithm - The checksum algorithm.
+   * @param blob - The data to checksum.
+   */
+  public compute(algorithm: ChecksumAlgorithm, blob: Blob): Promise<string> {
+    if (!this.worker) {
+      return computeChecksum(algorithm, blob);
+    }
+    const id = this.nextId;
+    this.nextId += 1;
+    return new Promise((resolve, reject) => {
+      this.pending.set(id, { resolve, reject });
+      const request: ChecksumRequest = { id, algorithm, blob };
+      // Blobs are passed by reference, so the part is read inside the worker
+      this.worker?.postMessage(request);
+    });
+  }
+
+  /**
+   * Stop the worker.
+   */
+  public terminate(): void {
+    this.worker?.terminate();
+    this.worker = null;
+    // Nothing awaits the checksums which were still pending
+    this.pending.clear();
+  }
+}
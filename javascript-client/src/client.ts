@@ -1,5 +1,18 @@
 import axios, { AxiosInstance, AxiosRequestConfig } from 'axios';
 
+import ChecksumWorker, { ChecksumAlgorithm } from './checksum';
+
+const CORRELATION_ID_HEADER = 'X-S3FF-Correlation-ID';
+
+/**
+ * Generate a random ID, to correlate the requests of an upload.
+ */
+function generateCorrelationId(): string {
+  const bytes = new Uint8Array(16);
+  crypto.getRandomValues(bytes);
+  return Array.from(bytes, (byte) => byte.toString(16).padStart(2, '0')).join('');
+}
+
 // Description of a part from initializeUpload()
 interface PartInfo {
   part_number: number;
@@ -12,12 +25,22 @@ interface MultipartInfo {
   object_key: string;
   upload_id: string;
   parts: PartInfo[];
+  checksum_algorithm: ChecksumAlgorithm | null;
+  correlation_id?: string;
 }
 // Description of a part which has been uploaded by uploadPart()
 interface UploadedPart {
   part_number: number;
   size: number;
   etag: string;
+  checksum?: string;
+  // Time taken to send the part, in seconds
+  duration: number;
+}
+// Description of a part's URL from /upload-part-url/
+interface PartUrlResponse {
+  upload_url: string;
+  headers: Record<string, string>;
 }
 interface CompletionResponse {
   complete_url: string;
@@ -87,12 +110,56 @@ export default class S3FileFieldClient {
    *
    * @param file - The file to upload.
    * @param fieldId - The Django field identifier.
+   * @param correlationId - An ID to correlate the requests of this upload.
    */
-  protected async initializeUpload(file: File, fieldId: string): Promise<MultipartInfo> {
+  protected async initializeUpload(
+    file: File,
+    fieldId: string,
+    correlationId: string,
+  ): Promise<MultipartInfo> {
     const response = await this.api.post<MultipartInfo>('upload-initialize/', {
       field_id: fieldId,
       file_name: file.name,
       file_size: file.size,
+      // A retried request reuses the same upload
+      idempotency_key: correlationId,
+    }, {
+      headers: { [CORRELATION_ID_HEADER]: correlationId },
+    });
+    return response.data;
+  }
+
+  /**
+   * Get the headers which correlate a request with the rest of its upload.
+   *
+   * @param multipartInfo - The information describing the multipart upload.
+   */
+  protected static correlationHeaders(multipartInfo: MultipartInfo): Record<string, string> {
+    // Older servers don't assign a correlation ID
+    return multipartInfo.correlation_id
+      ? { [CORRELATION_ID_HEADER]: multipartInfo.correlation_id }
+      : {};
+  }
+
+  /**
+   * Returns the URL to upload a part with a checksum.
+   *
+   * Object stores reject unsigned checksum headers, so the checksum is signed by the server.
+   *
+   * @param uploadSignature - The signature of the upload.
+   * @param part - The part to upload.
+   * @param checksum - The checksum of the part.
+   */
+  protected async partUrl(
+    uploadSignature: string,
+    part: PartInfo,
+    checksum: string,
+  ): Promise<PartUrlResponse> {
+    const response = await this.api.post<PartUrlResponse>('upload-part-url/', {
+      upload_signature: uploadSignature,
+      part_number: part.part_number,
+      size: part.size,
+      checksum,
     });
     return response.data;
   }
@@ -100,36 +167,81 @@ export default class S3FileFieldClient {
   /**
    * Uploads all the parts in a file directly to an object store in serial.
    *
+   * If checksums are enabled, the checksum of each part is computed in a Web Worker while the
+   * previous part is being sent, so hashing does not reduce upload throughput.
+   *
    * @param file - The file to upload.
    * @param parts - The list of parts describing how to break up the file.
    * @param onProgress - A callback for upload progress.
+   * @param [checksumAlgorithm] - The algorithm used to checksum each part.
+   * @param [signal] - A signal which cancels any part being sent.
+   * @param [uploadSignature] - The signature of the upload, required with checksums.
    */
-  protected async uploadParts( // eslint-disable-line class-methods-use-this
+  protected async uploadParts(
     file: File,
     parts: PartInfo[],
     onProgress: S3FileFieldProgressCallback,
+    checksumAlgorithm: ChecksumAlgorithm | null = null,
+    signal?: AbortSignal,
+    uploadSignature?: string,
   ): Promise<UploadedPart[]> {
     const uploadedParts: UploadedPart[] = [];
-    let fileOffset = 0;
+    const chunks: Blob[] = [];
+    let chunkOffset = 0;
     for (const part of parts) {
-      const chunk = file.slice(fileOffset, fileOffset + part.size);
-      // eslint-disable-next-line no-await-in-loop
-      const response = await axios.put(part.upload_url, chunk, {
-        // eslint-disable-next-line @typescript-eslint/no-loop-func
-        onUploadProgress: (e) => {
-          onProgress({
-            uploaded: fileOffset + e.loaded,
-            total: file.size,
-            state: S3FileFieldProgressState.Sending,
-          });
-        },
-      });
-      uploadedParts.push({
-        part_number: part.part_number,
-        size: part.size,
-        etag: response.headers.etag,
-      });
-      fileOffset += part.size;
+      chunks.push(file.slice(chunkOffset, chunkOffset + part.size));
+      chunkOffset += part.size;
+    }
+
+    const checksumWorker = checksumAlgorithm ? new ChecksumWorker() : null;
+    const computeChecksum = (index: number): Promise<string> | null => (
+      checksumWorker && checksumAlgorithm && index < chunks.length
+        ? checksumWorker.compute(checksumAlgorithm, chunks[index])
+        : null
+    );
+    try {
+      let fileOffset = 0;
+      let nextChecksum = computeChecksum(0);
+      for (const [index, part] of parts.entries()) {
+        // eslint-disable-next-line no-await-in-loop
+        const checksum = nextChecksum ? await nextChecksum : undefined;
+        // Start hashing the next part before sending this one
+        nextChecksum = computeChecksum(index + 1);
+        let uploadUrl = part.upload_url;
+        let headers: Record<string, string> = {};
+        if (checksum) {
+          if (!uploadSignature) {
+            throw new Error('An upload signature is required to upload with checksums.');
+          }
+          // eslint-disable-next-line no-await-in-loop
+          ({ upload_url: uploadUrl, headers } = await this.partUrl(uploadSignature, part, checksum));
+        }
+        const startTime = performance.now();
+        // eslint-disable-next-line no-await-in-loop
+        const response = await axios.put(uploadUrl, chunks[index], {
+          headers,
+          signal,
+          // eslint-disable-next-line @typescript-eslint/no-loop-func
+          onUploadProgress: (e) => {
+            onProgress({
+              uploaded: fileOffset + e.loaded,
+              total: file.size,
+              state: S3FileFieldProgressState.Sending,
+            });
+          },
+        });
+        uploadedParts.push({
+          part_number: part.part_number,
+          size: part.size,
+          etag: response.headers.etag,
+          ...(checksum ? { checksum } : {}),
+          // Reported to the server, for tracing
+          duration: (performance.now() - startTime) / 1000,
+        });
+        fileOffset += part.size;
+      }
+    } finally {
+      checksumWorker?.terminate();
     }
     return uploadedParts;
   }
@@ -150,6 +262,8 @@ export default class S3FileFieldClient {
       upload_signature: multipartInfo.upload_signature,
       upload_id: multipartInfo.upload_id,
       parts,
+    }, {
+      headers: S3FileFieldClient.correlationHeaders(multipartInfo),
     });
     const { complete_url: completeUrl, body } = response.data;
 
@@ -179,26 +293,68 @@ export default class S3FileFieldClient {
   protected async finalize(multipartInfo: MultipartInfo): Promise<string> {
     const response = await this.api.post<FinalizationResponse>('finalize/', {
       upload_signature: multipartInfo.upload_signature,
+    }, {
+      headers: S3FileFieldClient.correlationHeaders(multipartInfo),
     });
     return response.data.field_value;
   }
 
+  /**
+   * Aborts an upload, removing any parts already stored.
+   *
+   * @param multipartInfo - The information describing the multipart upload.
+   */
+  protected async abortUpload(multipartInfo: MultipartInfo): Promise<void> {
+    await this.api.post('upload-abort/', {
+      upload_signature: multipartInfo.upload_signature,
+    }, {
+      headers: S3FileFieldClient.correlationHeaders(multipartInfo),
+    });
+  }
+
   /**
    * Uploads a file using multipart upload.
    *
    * @param file - The file to upload.
    * @param fieldId - The Django field identifier.
    * @param [onProgress] - A callback for upload progress.
+   * @param [signal] - A signal which cancels the upload, until it begins finalizing.
    */
   public async uploadFile(
     file: File,
     fieldId: string,
     onProgress: S3FileFieldProgressCallback = () => { /* no-op */ },
+    signal?: AbortSignal,
   ): Promise<S3FileFieldResult> {
+    const aborted: S3FileFieldResult = { value: '', state: S3FileFieldResultState.Aborted };
+    if (signal?.aborted) {
+      return aborted;
+    }
     onProgress({ state: S3FileFieldProgressState.Initializing });
-    const multipartInfo = await this.initializeUpload(file, fieldId);
+    const multipartInfo = await this.initializeUpload(file, fieldId, generateCorrelationId());
     onProgress({ state: S3FileFieldProgressState.Sending, uploaded: 0, total: file.size });
-    const parts = await this.uploadParts(file, multipartInfo.parts, onProgress);
+    let parts: UploadedPart[];
+    try {
+      parts = await this.uploadParts(
+        file,
+        multipartInfo.parts,
+        onProgress,
+        multipartInfo.checksum_algorithm,
+        signal,
+        multipartInfo.upload_signature,
+      );
+    } catch (error) {
+      if (!axios.isCancel(error)) {
+        throw error;
+      }
+      parts = [];
+    }
+    // Once completed, the upload can no longer be aborted
+    if (signal?.aborted) {
+      // Release the parts which have already been stored
+      await this.abortUpload(multipartInfo);
+      return aborted;
+    }
     onProgress({ state: S3FileFieldProgressState.Finalizing });
     await this.completeUpload(multipartInfo, parts);
     const value = await this.finalize(multipartInfo);
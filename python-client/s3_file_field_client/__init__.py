@@ -1,17 +1,87 @@
 from __future__ import annotations
 
-from dataclasses import dataclass
+import base64
+from concurrent.futures import FIRST_EXCEPTION, ThreadPoolExecutor, wait
+from dataclasses import dataclass, field
+import hashlib
 import io
-from typing import BinaryIO, Dict, List, Optional
+import threading
+import time
+from typing import BinaryIO, Dict, List, Optional, cast
+import uuid
 
 import requests
 
+CORRELATION_ID_HEADER = 'X-S3FF-Correlation-ID'
+
+
+def _checksum(algorithm: str, data: bytes) -> str:
+    """Return the base64-encoded checksum of data, as expected by S3."""
+    if algorithm == 'SHA256':
+        digest = hashlib.sha256(data).digest()
+    elif algorithm == 'CRC32C':
+        try:
+            import crc32c
+        except ImportError:
+            raise Exception('The "crc32c" package must be installed to compute CRC32C checksums.')
+        digest = crc32c.crc32c(data).to_bytes(4, 'big')
+    else:
+        raise Exception(f'Unsupported checksum algorithm "{algorithm}".')
+    return base64.b64encode(digest).decode('ascii')
+
+
+class UploadCancelledError(Exception):
+    pass
+
+
+class CancelToken:
+    """A token which cancels an upload, from any thread."""
+
+    def __init__(self) -> None:
+        self._event = threading.Event()
+        # Cancelling a parent token also cancels the tokens derived from it
+        self._parent: Optional[CancelToken] = None
+
+    def cancel(self) -> None:
+        self._event.set()
+
+    @property
+    def cancelled(self) -> bool:
+        return self._event.is_set() or (self._parent is not None and self._parent.cancelled)
+
+    def _derive(self) -> CancelToken:
+        token = CancelToken()
+        token._parent = self
+        return token
+
+    def raise_if_cancelled(self) -> None:
+        if self.cancelled:
+            raise UploadCancelledError()
+
+
+class _CancellableBody:
+    """A request body which stops being sent as soon as its upload is cancelled."""
+
+    def __init__(self, data: bytes, cancel_token: CancelToken):
+        self._stream = io.BytesIO(data)
+        self._length = len(data)
+        self._cancel_token = cancel_token
+
+    def __len__(self) -> int:
+        return self._length
+
+    def read(self, size: int = -1) -> bytes:
+        self._cancel_token.raise_if_cancelled()
+        return self._stream.read(size)
+
 
 @dataclass
 class _File:
     name: str
     size: int
     stream: BinaryIO
+    # Parts may be read by multiple threads, but the stream has only one position
+    lock: threading.Lock = field(default_factory=threading.Lock)
 
     @classmethod
     def from_stream(cls, stream: BinaryIO, name: str) -> _File:
@@ -24,41 +94,140 @@ class _File:
 
         return cls(name=name, size=size, stream=stream)
 
+    def read_part(self, offset: int, size: int) -> bytes:
+        with self.lock:
+            self.stream.seek(offset, io.SEEK_SET)
+            return self.stream.read(size)
+
 
 class S3FileFieldClient:
-    def __init__(self, base_url: str, api_session: Optional[requests.Session] = None):
+    def __init__(
+        self,
+        base_url: str,
+        api_session: Optional[requests.Session] = None,
+        max_workers: int = 4,
+    ):
         self.base_url = base_url.rstrip('/')
         self.api_session = requests.Session() if api_session is None else api_session
+        # The number of parts to upload concurrently
+        self.max_workers = max_workers
 
-    def _initialize_upload(self, file: _File, field_id: str) -> Dict:
+    def _initialize_upload(self, file: _File, field_id: str, correlation_id: str) -> Dict:
         resp = self.api_session.post(
             f'{self.base_url}/upload-initialize/',
             json={
                 'field_id': field_id,
                 'file_name': file.name,
                 'file_size': file.size,
+                'concurrency': self.max_workers,
+                # A retried request (e.g. by an adapter of api_session) reuses the same upload
+                'idempotency_key': correlation_id,
             },
+            headers={CORRELATION_ID_HEADER: correlation_id},
         )
         resp.raise_for_status()
         return resp.json()
 
-    def _upload_part(self, part_bytes: bytes, part_initialization: Dict):
-        resp = requests.put(part_initialization['upload_url'], data=part_bytes)
+    def _part_url(self, upload_signature: str, part_initialization: Dict, checksum: str) -> Dict:
+        # Object stores reject unsigned checksum headers, so the checksum is signed by the server
+        resp = self.api_session.post(
+            f'{self.base_url}/upload-part-url/',
+            json={
+                'upload_signature': upload_signature,
+                'part_number': part_initialization['part_number'],
+                'size': part_initialization['size'],
+                'checksum': checksum,
+            },
+        )
+        resp.raise_for_status()
+        return resp.json()
+
+    def _upload_part(
+        self,
+        file: _File,
+        offset: int,
+        part_initialization: Dict,
+        checksum_algorithm: Optional[str],
+        cancel_token: CancelToken,
+        upload_signature: Optional[str] = None,
+    ) -> Dict:
+        cancel_token.raise_if_cancelled()
+        # Reading and hashing happen in this worker thread, so they overlap with other parts'
+        # network I/O (hashlib releases the GIL for large inputs)
+        part_bytes = file.read_part(offset, part_initialization['size'])
+        upload_url = part_initialization['upload_url']
+        headers: Dict[str, str] = {}
+        checksum = None
+        if checksum_algorithm is not None:
+            checksum = _checksum(checksum_algorithm, part_bytes)
+            if upload_signature is None:
+                raise ValueError('An upload signature is required to upload with checksums.')
+            part_url = self._part_url(upload_signature, part_initialization, checksum)
+            upload_url = part_url['upload_url']
+            headers = part_url['headers']
+
+        start = time.monotonic()
+        resp = requests.put(
+            upload_url,
+            data=_CancellableBody(part_bytes, cancel_token),
+            headers=headers,
+        )
         resp.raise_for_status()
+        duration = time.monotonic() - start
 
         etag = resp.headers['ETag']
 
-        return {
+        uploaded_part = {
             'part_number': part_initialization['part_number'],
             'size': part_initialization['size'],
             'etag': etag,
+            # Reported to the server, for tracing
+            'duration': duration,
         }
+        if checksum is not None:
+            uploaded_part['checksum'] = checksum
+        return uploaded_part
 
-    def _upload_parts(self, file: _File, part_initializations: List[Dict]) -> List[Dict]:
-        return [
-            self._upload_part(file.stream.read(part_initialization['size']), part_initialization)
-            for part_initialization in part_initializations
-        ]
+    def _upload_parts(
+        self,
+        file: _File,
+        part_initializations: List[Dict],
+        checksum_algorithm: Optional[str] = None,
+        cancel_token: Optional[CancelToken] = None,
+        upload_signature: Optional[str] = None,
+    ) -> List[Dict]:
+        if cancel_token is None:
+            cancel_token = CancelToken()
+        offsets = []
+        offset = 0
+        for part_initialization in part_initializations:
+            offsets.append(offset)
+            offset += part_initialization['size']
+
+        # Cancelled if any part fails, without cancelling the caller's token
+        parts_cancel_token = cancel_token._derive()
+        with ThreadPoolExecutor(max_workers=self.max_workers) as executor:
+            futures = [
+                executor.submit(
+                    self._upload_part,
+                    file,
+                    offset,
+                    part_initialization,
+                    checksum_algorithm,
+                    parts_cancel_token,
+                    upload_signature,
+                )
+                for offset, part_initialization in zip(offsets, part_initializations)
+            ]
+            done, _ = wait(futures, return_when=FIRST_EXCEPTION)
+            for future in futures:
+                if future in done and future.exception() is not None:
+                    # Stop the remaining parts, rather than waiting for all of them to upload
+                    parts_cancel_token.cancel()
+                    for pending_future in futures:
+                        pending_future.cancel()
+                    raise cast(BaseException, future.exception())
+            return [future.result() for future in futures]
 
     def _complete_upload(self, multipart_info: Dict, upload_infos: List[Dict]) -> None:
         resp = self.api_session.post(
@@ -68,6 +237,7 @@ class S3FileFieldClient:
                 'parts': upload_infos,
                 'upload_signature': multipart_info['upload_signature'],
             },
+            headers=self._correlation_headers(multipart_info),
         )
         resp.raise_for_status()
         completion_data = resp.json()
@@ -75,20 +245,58 @@ class S3FileFieldClient:
         complete_resp = requests.post(completion_data['complete_url'], data=completion_data['body'])
         complete_resp.raise_for_status()
 
+    @staticmethod
+    def _correlation_headers(multipart_info: Dict) -> Dict[str, str]:
+        # Older servers don't assign a correlation ID
+        correlation_id = multipart_info.get('correlation_id')
+        return {CORRELATION_ID_HEADER: correlation_id} if correlation_id else {}
+
     def _finalize(self, multipart_info: Dict) -> str:
         resp = self.api_session.post(
             f'{self.base_url}/finalize/',
             json={
                 'upload_signature': multipart_info['upload_signature'],
             },
+            headers=self._correlation_headers(multipart_info),
         )
         resp.raise_for_status()
         return resp.json()['field_value']
 
-    def upload_file(self, file_stream: BinaryIO, file_name: str, field_id: str) -> str:
+    def _abort_upload(self, multipart_info: Dict) -> None:
+        resp = self.api_session.post(
+            f'{self.base_url}/upload-abort/',
+            json={
+                'upload_signature': multipart_info['upload_signature'],
+            },
+            headers=self._correlation_headers(multipart_info),
+        )
+        resp.raise_for_status()
+
+    def upload_file(
+        self,
+        file_stream: BinaryIO,
+        file_name: str,
+        field_id: str,
+        cancel_token: Optional[CancelToken] = None,
+    ) -> str:
+        if cancel_token is None:
+            cancel_token = CancelToken()
         file = _File.from_stream(file_stream, file_name)
-        multipart_info = self._initialize_upload(file, field_id)
-        upload_infos = self._upload_parts(file, multipart_info['parts'])
+        multipart_info = self._initialize_upload(file, field_id, uuid.uuid4().hex)
+        try:
+            upload_infos = self._upload_parts(
+                file,
+                multipart_info['parts'],
+                multipart_info.get('checksum_algorithm'),
+                cancel_token,
+                multipart_info['upload_signature'],
+            )
+            # Once completed, the upload can no longer be aborted
+            cancel_token.raise_if_cancelled()
+        except UploadCancelledError:
+            # Release the parts which have already been stored
+            self._abort_upload(multipart_info)
+            raise
         self._complete_upload(multipart_info, upload_infos)
         field_value = self._finalize(multipart_info)
         return field_value
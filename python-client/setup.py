@@ -36,6 +36,10 @@ setup(
     ],
     python_requires='>=3.8',
     install_requires=['requests'],
+    extras_require={
+        # Required to upload to fields which use CRC32C checksums
+        'crc32c': ['crc32c'],
+    },
     packages=find_packages(),
     # Package data is required for the py.typed file
     include_package_data=True,
@@ -0,0 +1,138 @@
+"""
+Replay of upload initializations.
+
+A client which loses the response to an initialization request may retry it with the same
+idempotency key, and receive the original response, rather than creating a second (orphaned)
+multipart upload.
+
+Responses are kept in the Django cache named by the "S3FF_IDEMPOTENCY_CACHE" setting (by default,
+"default") for "S3FF_IDEMPOTENCY_TTL" (by default, 1 hour). Since the response contains presigned
+URLs, it is never kept for longer than they remain valid.
+
+A key is reserved (with an atomic cache "add") before the upload is initialized, so concurrent
+requests with the same key can't both initialize uploads; those made while the first is still in
+progress are rejected, and may be retried. Keys are scoped to the authenticated user, or to the
+session of an anonymous user.
+
+The entry of a key is signed into the upload signature, so it can be forgotten once its upload is
+aborted or finalized; a retry with the same key then initializes a new upload, rather than
+replaying one which can no longer be used.
+"""
+
+from __future__ import annotations
+
+from datetime import timedelta
+import hashlib
+import json
+from typing import Any, Dict, Optional
+
+from django.conf import settings
+from django.core.cache import caches
+from django.http import HttpRequest
+
+from ._multipart import MultipartManager
+
+
+def get_ttl() -> timedelta:
+    ttl: timedelta = getattr(settings, 'S3FF_IDEMPOTENCY_TTL', timedelta(hours=1))
+    return min(ttl, MultipartManager._url_expiration)
+
+
+def _cache():
+    return caches[getattr(settings, 'S3FF_IDEMPOTENCY_CACHE', 'default')]
+
+
+# The number of seconds for which a key is reserved while its upload is initialized; this only
+# matters if the process initializing it dies before recording its response
+RESERVATION_TIMEOUT = 60
+
+
+def get_scope(request: HttpRequest) -> Optional[str]:
+    """
+    Return the scope of idempotency keys sent by the request's client, if it can be identified.
+
+    Keys are scoped, so one client can never receive another's upload signature.
+    """
+    user = getattr(request, 'user', None)
+    if user is not None and user.is_authenticated:
+        return f'user:{user.pk}'
+    session = getattr(request, 'session', None)
+    if session is not None and session.session_key:
+        return f'session:{session.session_key}'
+    return None
+
+
+def _cache_key(idempotency_key: str, scope: str) -> str:
+    digest = hashlib.sha256(f'{scope}:{idempotency_key}'.encode()).hexdigest()
+    return f's3ff:idempotency:{digest}'
+
+
+# The fields which identify the file being uploaded; the others are advisory hints (e.g. the
+# client's bandwidth), which a retry may measure differently
+FINGERPRINT_FIELDS = ('field_id', 'file_name', 'file_size', 'content_type')
+
+
+def _fingerprint(upload_request: Dict[str, Any]) -> str:
+    identity = {name: upload_request.get(name) for name in FINGERPRINT_FIELDS}
+    return hashlib.sha256(json.dumps(identity, sort_keys=True, default=str).encode()).hexdigest()
+
+
+class IdempotencyKeyReusedError(Exception):
+    """The idempotency key was previously used with a different request."""
+
+
+class IdempotencyKeyInProgressError(Exception):
+    """The idempotency key is reserved by a request which is still in progress."""
+
+
+def reserve(
+    idempotency_key: str, scope: str, upload_request: Dict[str, Any]
+) -> Optional[Dict[str, Any]]:
+    """
+    Reserve a key for an initialization, or return the response to an earlier one with the same key.
+
+    If the key is reserved (and None is returned), either set_response or release must be called.
+    """
+    cache = _cache()
+    cache_key = _cache_key(idempotency_key, scope)
+    fingerprint = _fingerprint(upload_request)
+    if cache.add(cache_key, {'fingerprint': fingerprint, 'response': None}, RESERVATION_TIMEOUT):
+        return None
+    entry = cache.get(cache_key)
+    if entry is None:
+        # The reservation expired in the meantime
+        raise IdempotencyKeyInProgressError
+    if entry['fingerprint'] != fingerprint:
+        raise IdempotencyKeyReusedError
+    if entry['response'] is None:
+        raise IdempotencyKeyInProgressError
+    return entry['response']
+
+
+def release(idempotency_key: str, scope: str) -> None:
+    """Release the reservation of a key, whose initialization failed."""
+    _cache().delete(_cache_key(idempotency_key, scope))
+
+
+def get_entry(idempotency_key: str, scope: str) -> str:
+    """Return the identifier of a key's entry, which reveals neither the key nor its scope."""
+    return _cache_key(idempotency_key, scope)
+
+
+def forget(entry: str) -> None:
+    """Forget the response to an initialization, whose upload has been aborted or finalized."""
+    _cache().delete(entry)
+
+
+def set_response(
+    idempotency_key: str,
+    scope: str,
+    upload_request: Dict[str, Any],
+    response: Dict[str, Any],
+) -> None:
+    """Record the response to an initialization, so it may be replayed."""
+    _cache().set(
+        _cache_key(idempotency_key, scope),
+        {'fingerprint': _fingerprint(upload_request), 'response': response},
+        get_ttl().total_seconds(),
+    )
@@ -1,34 +1,183 @@
 from __future__ import annotations
 
+from concurrent.futures import ThreadPoolExecutor
 from dataclasses import dataclass
 from datetime import timedelta
+import functools
 import math
-from typing import Iterator, List, Optional, Tuple
+import posixpath
+from typing import (
+    TYPE_CHECKING,
+    Any,
+    Callable,
+    Dict,
+    Iterable,
+    Iterator,
+    List,
+    Optional,
+    Sequence,
+    Tuple,
+    TypeVar,
+    overload,
+)
+from xml.sax.saxutils import escape as xml_escape
+
+from django.conf import settings
+from django.core.files.storage import FileSystemStorage, Storage
+
+from s3_file_field import metrics, tracing
+from s3_file_field._sizes import gb, mb, tb
+from s3_file_field.planning import ClientHints
 
-from django.core.files.storage import Storage
+if TYPE_CHECKING:
+    # Avoid circular imports
+    from .fields import S3FileField
 
-from s3_file_field._sizes import gb, mb, tb
+# Checksum algorithms which S3 can verify for each uploaded part
+CHECKSUM_ALGORITHMS = ['CRC32C', 'SHA256']
+
+# The ID of lifecycle rules installed by put_abort_incomplete_rule, followed by a key prefix
+ABORT_INCOMPLETE_RULE_ID = 's3-file-field-abort-incomplete-uploads'
+DEFAULT_ABORT_INCOMPLETE_DAYS = 7
+
+# A listing returns up to 1,000 objects per request, so listing up to 10 objects for each key costs
+# at most 1% of the requests needed to fetch the metadata of each key separately
+_LISTING_BUDGET_PER_KEY = 10
+
+_T = TypeVar('_T')
 
 
 @dataclass
 class PresignedPartTransfer:
+    __slots__ = ['part_number', 'size', 'upload_url']
+
     part_number: int
     size: int
     upload_url: str
 
 
+@dataclass(frozen=True)
+class PartPlan:
+    """The division of a file into parts, which are all the same size, except the last."""
+
+    part_size: int
+    count: int
+    last_part_size: int
+
+    @classmethod
+    def from_file_size(cls, file_size: int, part_size: int) -> PartPlan:
+        count = math.ceil(file_size / part_size)
+        return cls(
+            part_size=part_size,
+            count=count,
+            last_part_size=file_size - (count - 1) * part_size if count else 0,
+        )
+
+    def size_of(self, part_number: int) -> int:
+        if not 1 <= part_number <= self.count:
+            raise IndexError('Part number out of range.')
+        return self.last_part_size if part_number == self.count else self.part_size
+
+    def __iter__(self) -> Iterator[Tuple[int, int]]:
+        """Iterate over the part number and size of each part."""
+        for part_number in range(1, self.count):
+            yield part_number, self.part_size
+        if self.count:
+            yield self.count, self.last_part_size
+
+
+class PresignedParts(Sequence[PresignedPartTransfer]):
+    """A sequence of presigned parts, where each upload URL is only generated when accessed."""
+
+    __slots__ = ['plan', '_presign']
+
+    def __init__(self, plan: PartPlan, presign: Callable[[int, int], str]):
+        self.plan = plan
+        # Called with the part number and part size
+        self._presign = presign
+
+    def __len__(self) -> int:
+        return self.plan.count
+
+    @overload
+    def __getitem__(self, index: int) -> PresignedPartTransfer:
+        ...
+
+    @overload
+    def __getitem__(self, index: slice) -> Sequence[PresignedPartTransfer]:
+        ...
+
+    def __getitem__(self, index):
+        if isinstance(index, slice):
+            return [self[i] for i in range(*index.indices(len(self)))]
+        if index < 0:
+            index += len(self)
+        part_number = index + 1
+        part_size = self.plan.size_of(part_number)
+        return PresignedPartTransfer(
+            part_number=part_number,
+            size=part_size,
+            upload_url=self._presign(part_number, part_size),
+        )
+
+    def __iter__(self) -> Iterator[PresignedPartTransfer]:
+        for part_number, part_size in self.plan:
+            yield PresignedPartTransfer(
+                part_number=part_number,
+                size=part_size,
+                upload_url=self._presign(part_number, part_size),
+            )
+
+    @metrics.timed('multipart.presign_parts')
+    def to_dicts(self) -> List[Dict[str, Any]]:
+        """Return a serializable representation, without creating intermediate objects."""
+        presign = self._presign
+        return [
+            {
+                'part_number': part_number,
+                'size': part_size,
+                'upload_url': presign(part_number, part_size),
+            }
+            for part_number, part_size in self.plan
+        ]
+
+
 @dataclass
 class PresignedTransfer:
     object_key: str
     upload_id: str
-    parts: List[PresignedPartTransfer]
+    parts: Sequence[PresignedPartTransfer]
+    checksum_algorithm: Optional[str] = None
 
 
-@dataclass
+# Slots conflict with dataclass field defaults (before Python 3.10's "slots" option), so __init__
+# provides the defaults
+@dataclass(init=False)
 class TransferredPart:
+    # An upload may have up to 10,000 parts
+    __slots__ = ['part_number', 'size', 'etag', 'checksum', 'duration']
+
     part_number: int
     size: int
     etag: str
+    # The base64-encoded checksum of the part, if checksums are enabled
+    checksum: Optional[str]
+    # The time taken to transfer the part, in seconds, as reported by the client
+    duration: Optional[float]
+
+    def __init__(
+        self,
+        part_number: int,
+        size: int,
+        etag: str,
+        checksum: Optional[str] = None,
+        duration: Optional[float] = None,
+    ):
+        self.part_number = part_number
+        self.size = size
+        self.etag = etag
+        self.checksum = checksum
+        self.duration = duration
 
 
 @dataclass
@@ -36,6 +185,7 @@ class TransferredParts:
     object_key: str
     upload_id: str
     parts: List[TransferredPart]
+    checksum_algorithm: Optional[str] = None
 
 
 @dataclass
@@ -44,6 +194,39 @@ class PresignedUploadCompletion:
     body: str
 
 
+@dataclass
+class ObjectMetadata:
+    size: int
+    # The checksum of the full object, if it was uploaded with checksums
+    checksum: Optional[str] = None
+    content_type: Optional[str] = None
+    # The object's entity tag, without quotes
+    etag: Optional[str] = None
+
+
+@dataclass
+class LifecycleRule:
+    """A rule of a bucket's lifecycle configuration, as relevant to multipart uploads."""
+
+    id: Optional[str]
+    # None if the rule filters objects by something other than a key prefix
+    prefix: Optional[str]
+    enabled: bool
+    # The number of days after which incomplete multipart uploads are aborted, if any
+    abort_incomplete_days: Optional[int] = None
+    # The backend's original representation, so unrelated rules can be rewritten unchanged
+    raw: Any = None
+
+    def aborts_incomplete_uploads(self, key_prefix: str) -> bool:
+        """Return whether this rule aborts all incomplete uploads with the given key prefix."""
+        return (
+            self.enabled
+            and self.abort_incomplete_days is not None
+            and self.prefix is not None
+            and key_prefix.startswith(self.prefix)
+        )
+
+
 class UnsupportedStorageError(Exception):
     """Raised when MultipartManager does not support the given Storage."""
 
@@ -56,33 +239,73 @@ class ObjectNotFoundError(Exception):
     pass
 
 
+class UploadNotFoundError(Exception):
+    """Raised when a multipart upload does not exist, because it was completed or aborted."""
+
+    pass
+
+
 class MultipartManager:
     """A facade providing management of S3 multipart uploads to multiple Storages."""
 
     part_size = mb(64)
 
+    # Backend methods which communicate with the object store, to be timed and traced in every
+    # subclass
+    _timed_methods = [
+        '_create_upload_id',
+        '_abort_upload_id',
+        '_generate_presigned_complete_url',
+        'get_object_metadata',
+        '_get_lifecycle_rules',
+        '_put_lifecycle_rules',
+    ]
+
+    def __init_subclass__(cls, **kwargs):
+        super().__init_subclass__(**kwargs)
+        for method_name in cls._timed_methods:
+            if method_name in cls.__dict__:
+                operation = method_name.lstrip('_')
+                timer = metrics.timed(f'multipart.{operation}', tags={'manager': cls.__name__})
+                tracer = tracing.traced(
+                    f's3ff.multipart.{operation}', attributes={'s3ff.manager': cls.__name__}
+                )
+                setattr(cls, method_name, timer(tracer(cls.__dict__[method_name])))
+
+    @metrics.timed('multipart.initialize_upload')
     def initialize_upload(
         self,
         object_key: str,
         file_size: int,
         content_type: Optional[str] = None,
+        part_size: Optional[int] = None,
+        *,
+        field: Optional[S3FileField] = None,
+        hints: Optional[ClientHints] = None,
+        checksum_algorithm: Optional[str] = None,
     ) -> PresignedTransfer:
         upload_id = self._create_upload_id(
             object_key,
             content_type=content_type,
+            checksum_algorithm=checksum_algorithm,
+        )
+        parts = PresignedParts(
+            self._plan_parts(file_size, part_size, field=field, hints=hints),
+            functools.partial(
+                self._generate_presigned_part_url,
+                object_key,
+                upload_id,
+                checksum_algorithm=checksum_algorithm,
+            ),
+        )
+        return PresignedTransfer(
+            object_key=object_key,
+            upload_id=upload_id,
+            parts=parts,
+            checksum_algorithm=checksum_algorithm,
         )
-        parts = [
-            PresignedPartTransfer(
-                part_number=part_number,
-                size=part_size,
-                upload_url=self._generate_presigned_part_url(
-                    object_key, upload_id, part_number, part_size
-                ),
-            )
-            for part_number, part_size in self._iter_part_sizes(file_size)
-        ]
-        return PresignedTransfer(object_key=object_key, upload_id=upload_id, parts=parts)
 
+    @metrics.timed('multipart.complete_upload')
     def complete_upload(self, transferred_parts: TransferredParts) -> PresignedUploadCompletion:
         complete_url = self._generate_presigned_complete_url(transferred_parts)
         body = self._generate_presigned_complete_body(transferred_parts)
@@ -94,15 +317,56 @@ class MultipartManager:
 
         See https://docs.aws.amazon.com/AmazonS3/latest/API/API_CompleteMultipartUpload.html
         """
-        body = '<?xml version="1.0" encoding="UTF-8"?>'
-        body += '<CompleteMultipartUpload xmlns="http://s3.amazonaws.com/doc/2006-03-01/">'
-        for part in transferred_parts.parts:
-            body += '<Part>'
-            body += f'<PartNumber>{part.part_number}</PartNumber>'
-            body += f'<ETag>{part.etag}</ETag>'
-            body += '</Part>'
-        body += '</CompleteMultipartUpload>'
-        return body
+        checksum_tag = (
+            f'Checksum{transferred_parts.checksum_algorithm}'
+            if transferred_parts.checksum_algorithm
+            else None
+        )
+        return ''.join(
+            [
+                '<?xml version="1.0" encoding="UTF-8"?>',
+                '<CompleteMultipartUpload xmlns="http://s3.amazonaws.com/doc/2006-03-01/">',
+                *(
+                    f'<Part><PartNumber>{part.part_number}</PartNumber>'
+                    f'<ETag>{xml_escape(part.etag)}</ETag>'
+                    + (
+                        f'<{checksum_tag}>{xml_escape(part.checksum)}</{checksum_tag}>'
+                        if checksum_tag and part.checksum
+                        else ''
+                    )
+                    + '</Part>'
+                    for part in transferred_parts.parts
+                ),
+                '</CompleteMultipartUpload>',
+            ]
+        )
+
+    def get_abort_incomplete_rule(self, key_prefix: str = '') -> Optional[LifecycleRule]:
+        """Return the bucket lifecycle rule which aborts incomplete uploads under a prefix."""
+        for rule in self._get_lifecycle_rules():
+            if rule.aborts_incomplete_uploads(key_prefix):
+                return rule
+        return None
+
+    def put_abort_incomplete_rule(
+        self, key_prefix: str = '', days: int = DEFAULT_ABORT_INCOMPLETE_DAYS
+    ) -> bool:
+        """
+        Ensure that incomplete uploads under a prefix are aborted by a bucket lifecycle rule.
+
+        Any existing lifecycle rules are preserved. Return whether the configuration was changed.
+        """
+        rules = self._get_lifecycle_rules()
+        if any(rule.aborts_incomplete_uploads(key_prefix) for rule in rules):
+            return False
+        # Replace a previously installed rule for this prefix, which must have been disabled
+        rule_id = f'{ABORT_INCOMPLETE_RULE_ID}/{key_prefix}'[:255]
+        rules = [rule for rule in rules if rule.id != rule_id]
+        rules.append(
+            LifecycleRule(id=rule_id, prefix=key_prefix, enabled=True, abort_incomplete_days=days)
+        )
+        self._put_lifecycle_rules(rules)
+        return True
 
     def test_upload(self):
         object_key = '.s3-file-field-test-file'
@@ -136,10 +400,28 @@ class MultipartManager:
 
                 return MinioMultipartManager(storage)
 
+        if isinstance(storage, FileSystemStorage):
+            from ._multipart_filesystem import FileSystemMultipartManager
+
+            return FileSystemMultipartManager(storage)
+
+        from .memory import MemoryStorage
+
+        if isinstance(storage, MemoryStorage):
+            from ._multipart_memory import MemoryMultipartManager
+
+            return MemoryMultipartManager(storage)
+
         raise UnsupportedStorageError('Unsupported storage provider.')
 
     @classmethod
     def supported_storage(cls, storage: Storage) -> bool:
+        from .sharding import iter_concrete_storages
+
+        # Uploads to a sharded storage are made directly to one of its shards
+        shards = [shard for _, shard in iter_concrete_storages(storage)]
+        if shards != [storage]:
+            return all(cls.supported_storage(shard) for shard in shards)
         try:
             cls.from_storage(storage)
         except UnsupportedStorageError:
@@ -151,31 +433,183 @@ class MultipartManager:
     # The AWS default expiration of 1 hour may not be enough for large uploads to complete
     _url_expiration = timedelta(hours=24)
 
+    @staticmethod
+    def _use_transfer_endpoint(storage: Storage, option: str) -> bool:
+        """
+        Return whether part URLs should be signed for an alternative S3 endpoint.
+
+        "option" is "transfer_acceleration" or "dualstack_endpoint". Each may be enabled globally by
+        a setting (e.g. "S3FF_TRANSFER_ACCELERATION"), or for a single storage by an attribute
+        (e.g. "s3ff_transfer_acceleration").
+        """
+        return bool(
+            getattr(storage, f's3ff_{option}', getattr(settings, f'S3FF_{option.upper()}', False))
+        )
+
     def _create_upload_id(
         self,
         object_key: str,
         content_type: Optional[str] = None,
+        checksum_algorithm: Optional[str] = None,
     ) -> str:
         # Require content headers here
         raise NotImplementedError
 
     def _abort_upload_id(self, object_key: str, upload_id: str) -> None:
+        """Abort a multipart upload, or raise UploadNotFoundError if it does not exist."""
         raise NotImplementedError
 
     def _generate_presigned_part_url(
-        self, object_key: str, upload_id: str, part_number: int, part_size: int
+        self,
+        object_key: str,
+        upload_id: str,
+        part_number: int,
+        part_size: int,
+        checksum_algorithm: Optional[str] = None,
+        checksum: Optional[str] = None,
     ) -> str:
+        """
+        Return a URL to upload a part.
+
+        If "checksum" is given, it is signed into the URL (since object stores reject unsigned
+        "x-amz-checksum-*" headers), and the object store verifies the part against it. The headers
+        which must then be sent with the part are returned by _presigned_part_headers.
+        """
         raise NotImplementedError
 
+    def _presigned_part_headers(
+        self, upload_url: str, checksum_algorithm: str, checksum: str
+    ) -> Dict[str, str]:
+        # By default, the checksum is signed as a query parameter, so no headers are required
+        return {}
+
     def _generate_presigned_complete_url(self, transferred_parts: TransferredParts) -> str:
         raise NotImplementedError
 
+    def _get_lifecycle_rules(self) -> List[LifecycleRule]:
+        raise NotImplementedError
+
+    def _put_lifecycle_rules(self, rules: List[LifecycleRule]) -> None:
+        # Rules with a "raw" value must be written unchanged
+        raise NotImplementedError
+
     def get_object_size(self, object_key: str) -> int:
+        return self.get_object_metadata(object_key).size
+
+    def get_object_metadata(
+        self, object_key: str, checksum_algorithm: Optional[str] = None
+    ) -> ObjectMetadata:
+        raise NotImplementedError
+
+    def read_object_range(self, object_key: str, offset: int, length: int) -> bytes:
+        """Return "length" bytes of an object, starting at "offset", which must be within it."""
+        raise NotImplementedError
+
+    def get_objects_metadata(
+        self, object_keys: Iterable[str], checksum_algorithm: Optional[str] = None
+    ) -> Dict[str, ObjectMetadata]:
+        """
+        Return the metadata of many objects, by key; keys of objects which don't exist are omitted.
+
+        The metadata of each object is fetched concurrently.
+        """
+        return self._fetch_concurrently(
+            functools.partial(self.get_object_metadata, checksum_algorithm=checksum_algorithm),
+            set(object_keys),
+        )
+
+    @staticmethod
+    def _fetch_concurrently(
+        fetch: Callable[[str], _T], object_keys: Iterable[str]
+    ) -> Dict[str, _T]:
+        # Requests to the object store are mostly spent waiting, so are made by up to
+        # "S3FF_METADATA_MAX_WORKERS" threads, which share the manager's pooled client
+        remaining = sorted(object_keys)
+        if not remaining:
+            return {}
+
+        def fetch_or_none(object_key: str) -> Optional[_T]:
+            try:
+                return fetch(object_key)
+            except ObjectNotFoundError:
+                return None
+
+        results: Dict[str, _T] = {}
+        max_workers = getattr(settings, 'S3FF_METADATA_MAX_WORKERS', 16)
+        with ThreadPoolExecutor(
+            max_workers=min(max_workers, len(remaining)), thread_name_prefix='s3ff-metadata'
+        ) as executor:
+            for object_key, result in zip(remaining, executor.map(fetch_or_none, remaining)):
+                if result is not None:
+                    results[object_key] = result
+        return results
+
+    def _iter_object_sizes(self, prefix: str) -> Iterator[Tuple[str, int]]:
+        # Yield the key and size of each object with a prefix, in key order
         raise NotImplementedError
 
+    def get_object_sizes(self, object_keys: Iterable[str]) -> Dict[str, int]:
+        """
+        Return the sizes of many objects, by key; keys of objects which don't exist are omitted.
+
+        If the keys share a prefix, it is listed, until every key has been found or the listing
+        becomes more expensive than fetching the metadata of each key. The metadata of any keys
+        which remain are fetched concurrently.
+        """
+        pending = set(object_keys)
+        sizes: Dict[str, int] = {}
+
+        prefix = posixpath.commonprefix(list(pending))
+        if len(pending) > 1 and prefix:
+            last_key = max(pending)
+            listed_through: Optional[str] = None
+            try:
+                for listed, (object_key, size) in enumerate(self._iter_object_sizes(prefix)):
+                    if object_key > last_key:
+                        listed_through = last_key
+                        break
+                    if listed >= len(pending) * _LISTING_BUDGET_PER_KEY:
+                        break
+                    listed_through = object_key
+                    if object_key in pending:
+                        sizes[object_key] = size
+                else:
+                    # Every key under the prefix was listed, so any others don't exist
+                    listed_through = last_key
+            except NotImplementedError:
+                pass
+            if listed_through is not None:
+                pending = {object_key for object_key in pending if object_key > listed_through}
+
+        sizes.update(self._fetch_concurrently(self.get_object_size, pending))
+        return sizes
+
+    @classmethod
+    def _iter_part_sizes(
+        cls,
+        file_size: int,
+        part_size: Optional[int] = None,
+        *,
+        field: Optional[S3FileField] = None,
+        hints: Optional[ClientHints] = None,
+    ) -> Iterator[Tuple[int, int]]:
+        return iter(cls._plan_parts(file_size, part_size, field=field, hints=hints))
+
     @classmethod
-    def _iter_part_sizes(cls, file_size: int) -> Iterator[Tuple[int, int]]:
-        part_size = cls.part_size
+    def _plan_parts(
+        cls,
+        file_size: int,
+        part_size: Optional[int] = None,
+        *,
+        field: Optional[S3FileField] = None,
+        hints: Optional[ClientHints] = None,
+    ) -> PartPlan:
+        if part_size is None and field is not None:
+            part_size = field.part_size_planner(
+                file_size, field, hints if hints is not None else ClientHints()
+            )
+        if part_size is None:
+            part_size = cls.part_size
 
         # S3 multipart limits: https://docs.aws.amazon.com/AmazonS3/latest/dev/qfacts.html
 
@@ -197,16 +631,6 @@ class MultipartManager:
         if part_size > max_part_size:
             part_size = max_part_size
 
-        remaining_file_size = file_size
-        part_num = 1
-        while remaining_file_size > 0:
-            current_part_size = (
-                part_size if remaining_file_size - part_size > 0 else remaining_file_size
-            )
-
-            yield part_num, current_part_size
-
-            part_num += 1
-            remaining_file_size -= part_size
+        return PartPlan.from_file_size(file_size, part_size)
 
     # TODO: key name encoding...
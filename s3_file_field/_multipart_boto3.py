@@ -1,29 +1,172 @@
-from typing import TYPE_CHECKING, Optional, cast
+from dataclasses import dataclass
+import functools
+import threading
+import time
+from typing import TYPE_CHECKING, Any, Dict, Iterator, List, Optional, Tuple, cast
+from urllib.parse import parse_qs, urlparse
 
+from botocore.config import Config
 from botocore.exceptions import ClientError
+from django.conf import settings
+from django.core.signals import setting_changed
 from storages.backends.s3boto3 import S3Boto3Storage
 
 if TYPE_CHECKING:
     # mypy_boto3_s3 only provides types
     import mypy_boto3_s3 as s3
 
-from ._multipart import MultipartManager, ObjectNotFoundError, TransferredParts
+from . import metrics
+from ._multipart import (
+    LifecycleRule,
+    MultipartManager,
+    ObjectMetadata,
+    ObjectNotFoundError,
+    TransferredParts,
+    UploadNotFoundError,
+)
+
+# Options of the botocore Config of clients used for uploads, which may be overridden by the
+# "S3FF_BOTO3_CLIENT_CONFIG" setting; botocore's default pool of 10 connections is too small for
+# threaded servers
+DEFAULT_CLIENT_CONFIG: Dict[str, Any] = {
+    'max_pool_connections': 50,
+    'retries': {'mode': 'standard'},
+}
+
+_client_lock = threading.Lock()
+
+# The minimum number of seconds between observations of the connection pool's utilization
+POOL_SAMPLE_INTERVAL = 1.0
+_pool_observed_at = float('-inf')
+
+
+@functools.lru_cache(maxsize=1)
+def get_client_config() -> Config:
+    """Return the configured options of clients used for uploads."""
+    return Config(**{**DEFAULT_CLIENT_CONFIG, **getattr(settings, 'S3FF_BOTO3_CLIENT_CONFIG', {})})
+
+
+def _reset_client_config(*, setting: str, **kwargs) -> None:
+    if setting == 'S3FF_BOTO3_CLIENT_CONFIG':
+        get_client_config.cache_clear()
+
+
+setting_changed.connect(_reset_client_config)
+
+
+@dataclass
+class ConnectionPoolStats:
+    # The maximum number of connections, summed over the pool of each host
+    max_connections: int
+    # The number of connections currently checked out by requests
+    in_use: int
+
+    @property
+    def utilization(self) -> float:
+        return self.in_use / self.max_connections if self.max_connections else 0.0
 
 
 class Boto3MultipartManager(MultipartManager):
     def __init__(self, storage: 'S3Boto3Storage'):
-        resource: s3.ServiceResource = storage.connection
-        self._client: s3.Client = cast('s3.Client', resource.meta.client)
+        # The storage's own resource is thread-local, so a low-level client (which is thread-safe)
+        # is shared by all threads instead, with a connection pool sized for concurrent requests
+        self._client: s3.Client = self._get_client(storage)
         self._bucket_name: str = storage.bucket_name
+        # Parts may be uploaded through an alternative endpoint, while all other requests use the
+        # storage's own endpoint
+        self._signing_client: s3.Client = self._get_client(
+            storage,
+            accelerate=self._use_transfer_endpoint(storage, 'transfer_acceleration'),
+            dualstack=self._use_transfer_endpoint(storage, 'dualstack_endpoint'),
+        )
+
+    @classmethod
+    def _get_client(
+        cls, storage: 'S3Boto3Storage', accelerate: bool = False, dualstack: bool = False
+    ) -> 's3.Client':
+        config = get_client_config()
+        key = (accelerate, dualstack)
+        # Creating a client is slow, so keep it with the storage, like the storage's own connection
+        # (attributes are set through any LazyObject, such as "default_storage")
+        cached = getattr(storage, '_s3ff_clients', {}).get(key)
+        if cached is not None and cached[0] is config:
+            return cached[1]
+
+        with _client_lock:
+            clients = getattr(storage, '_s3ff_clients', None)
+            if clients is None:
+                clients = {}
+                storage._s3ff_clients = clients  # type: ignore[attr-defined]
+            cached = clients.get(key)
+            if cached is None or cached[0] is not config:
+                client_config = storage.client_config.merge(config)
+                if accelerate or dualstack:
+                    client_config = client_config.merge(
+                        Config(
+                            s3={
+                                **(client_config.s3 or {}),
+                                'use_accelerate_endpoint': accelerate,
+                            },
+                            use_dualstack_endpoint=dualstack,
+                        )
+                    )
+                client = storage._create_session().client(
+                    's3',
+                    region_name=storage.region_name,
+                    use_ssl=storage.use_ssl,
+                    # Accelerated and dual-stack endpoints are specific to AWS, so any custom
+                    # endpoint can't be used
+                    endpoint_url=None if accelerate or dualstack else storage.endpoint_url,
+                    config=client_config,
+                    verify=storage.verify,
+                )
+                cached = clients[key] = (config, client)
+        return cached[1]
+
+    def connection_pool_stats(self) -> Optional[ConnectionPoolStats]:
+        """Return the utilization of the client's connection pool, if it can be determined."""
+        # These are private internals of botocore and urllib3, which may change in any release, or
+        # be mutated by other threads while being read, so any failure is treated as unknown
+        try:
+            pool_manager = self._client._endpoint.http_session._manager  # type: ignore
+            # A pool may be evicted or closed concurrently
+            pools = [pool_manager.pools.get(key) for key in pool_manager.pools.keys()]
+            queues = [pool.pool for pool in pools if pool is not None and pool.pool is not None]
+            # Each pool's queue holds its idle connections (and unused slots)
+            return ConnectionPoolStats(
+                max_connections=sum(queue.maxsize for queue in queues),
+                in_use=sum(queue.maxsize - queue.qsize() for queue in queues),
+            )
+        except Exception:
+            return None
+
+    def _observe_connection_pool(self) -> None:
+        global _pool_observed_at
+        sink = metrics.get_sink()
+        if not sink.enabled:
+            return
+        # Sample the pool, rather than reading it before every request
+        now = time.monotonic()
+        if now - _pool_observed_at < POOL_SAMPLE_INTERVAL:
+            return
+        _pool_observed_at = now
+        stats = self.connection_pool_stats()
+        if stats is not None:
+            sink.observe('boto3.connection_pool.in_use', stats.in_use)
+            sink.observe('boto3.connection_pool.utilization', stats.utilization)
 
     def _create_upload_id(
         self,
         object_key: str,
         content_type: Optional[str] = None,
+        checksum_algorithm: Optional[str] = None,
     ) -> str:
         boto3_kwargs = {}
         if content_type is not None:
             boto3_kwargs['ContentType'] = content_type
+        if checksum_algorithm is not None:
+            boto3_kwargs['ChecksumAlgorithm'] = checksum_algorithm
+        self._observe_connection_pool()
         resp = self._client.create_multipart_upload(
             Bucket=self._bucket_name,
             Key=object_key,
@@ -35,27 +178,58 @@ class Boto3MultipartManager(MultipartManager):
         return resp['UploadId']
 
     def _abort_upload_id(self, object_key: str, upload_id: str) -> None:
-        self._client.abort_multipart_upload(
-            Bucket=self._bucket_name,
-            Key=object_key,
-            UploadId=upload_id,
-        )
+        self._observe_connection_pool()
+        try:
+            self._client.abort_multipart_upload(
+                Bucket=self._bucket_name,
+                Key=object_key,
+                UploadId=upload_id,
+            )
+        except ClientError as e:
+            if e.response.get('Error', {}).get('Code') == 'NoSuchUpload':
+                raise UploadNotFoundError()
+            raise
 
     def _generate_presigned_part_url(
-        self, object_key: str, upload_id: str, part_number: int, part_size: int
+        self,
+        object_key: str,
+        upload_id: str,
+        part_number: int,
+        part_size: int,
+        checksum_algorithm: Optional[str] = None,
+        checksum: Optional[str] = None,
     ) -> str:
-        return self._client.generate_presigned_url(
+        params = {
+            'Bucket': self._bucket_name,
+            'Key': object_key,
+            'UploadId': upload_id,
+            'PartNumber': part_number,
+            'ContentLength': part_size,
+        }
+        if checksum_algorithm is not None:
+            params['ChecksumAlgorithm'] = checksum_algorithm
+            if checksum is not None:
+                # SigV2 presigning moves the checksum headers into the signed query string, but
+                # SigV4 signs them as headers, which the client must then send (see below)
+                params[f'Checksum{checksum_algorithm}'] = checksum
+        return self._signing_client.generate_presigned_url(
             ClientMethod='upload_part',
-            Params={
-                'Bucket': self._bucket_name,
-                'Key': object_key,
-                'UploadId': upload_id,
-                'PartNumber': part_number,
-                'ContentLength': part_size,
-            },
+            Params=params,
             ExpiresIn=int(self._url_expiration.total_seconds()),
         )
 
+    def _presigned_part_headers(
+        self, upload_url: str, checksum_algorithm: str, checksum: str
+    ) -> Dict[str, str]:
+        signed_headers = parse_qs(urlparse(upload_url).query).get('X-Amz-SignedHeaders', [''])
+        headers = {
+            f'x-amz-checksum-{checksum_algorithm.lower()}': checksum,
+            'x-amz-sdk-checksum-algorithm': checksum_algorithm,
+        }
+        return {
+            name: value for name, value in headers.items() if name in signed_headers[0].split(';')
+        }
+
     def _generate_presigned_complete_url(self, transferred_parts: TransferredParts) -> str:
         return self._client.generate_presigned_url(
             ClientMethod='complete_multipart_upload',
@@ -67,12 +241,100 @@ class Boto3MultipartManager(MultipartManager):
             ExpiresIn=int(self._url_expiration.total_seconds()),
         )
 
-    def get_object_size(self, object_key: str) -> int:
+    def get_object_metadata(
+        self, object_key: str, checksum_algorithm: Optional[str] = None
+    ) -> ObjectMetadata:
+        boto3_kwargs = {}
+        if checksum_algorithm is not None:
+            boto3_kwargs['ChecksumMode'] = 'ENABLED'
+        self._observe_connection_pool()
         try:
             stats = self._client.head_object(
                 Bucket=self._bucket_name,
                 Key=object_key,
+                **boto3_kwargs,  # type: ignore[arg-type]
             )
-            return stats['ContentLength']
         except ClientError:
             raise ObjectNotFoundError()
+        return ObjectMetadata(
+            size=stats['ContentLength'],
+            checksum=(
+                cast(Optional[str], stats.get(f'Checksum{checksum_algorithm}'))
+                if checksum_algorithm is not None
+                else None
+            ),
+            content_type=stats.get('ContentType'),
+            etag=stats['ETag'].strip('"'),
+        )
+
+    def read_object_range(self, object_key: str, offset: int, length: int) -> bytes:
+        self._observe_connection_pool()
+        try:
+            resp = self._client.get_object(
+                Bucket=self._bucket_name,
+                Key=object_key,
+                Range=f'bytes={offset}-{offset + length - 1}',
+            )
+        except ClientError:
+            raise ObjectNotFoundError()
+        return resp['Body'].read()
+
+    def _iter_object_sizes(self, prefix: str) -> Iterator[Tuple[str, int]]:
+        paginator = self._client.get_paginator('list_objects_v2')
+        self._observe_connection_pool()
+        for page in paginator.paginate(Bucket=self._bucket_name, Prefix=prefix):
+            for obj in page.get('Contents', []):
+                yield obj['Key'], obj['Size']
+
+    def _get_lifecycle_rules(self) -> List[LifecycleRule]:
+        self._observe_connection_pool()
+        try:
+            resp = self._client.get_bucket_lifecycle_configuration(Bucket=self._bucket_name)
+        except ClientError as e:
+            if e.response.get('Error', {}).get('Code') == 'NoSuchLifecycleConfiguration':
+                return []
+            raise
+        return [self._parse_lifecycle_rule(cast(Dict[str, Any], rule)) for rule in resp['Rules']]
+
+    @staticmethod
+    def _parse_lifecycle_rule(rule: Dict[str, Any]) -> LifecycleRule:
+        prefix: Optional[str]
+        if 'Filter' in rule:
+            rule_filter = rule['Filter']
+            # An empty filter applies to all objects
+            prefix = rule_filter.get('Prefix', '') if set(rule_filter) <= {'Prefix'} else None
+        else:
+            # Deprecated, but still valid
+            prefix = rule.get('Prefix', '')
+        abort_incomplete = rule.get('AbortIncompleteMultipartUpload')
+        return LifecycleRule(
+            id=rule.get('ID'),
+            prefix=prefix,
+            enabled=rule['Status'] == 'Enabled',
+            abort_incomplete_days=(
+                abort_incomplete['DaysAfterInitiation'] if abort_incomplete else None
+            ),
+            raw=rule,
+        )
+
+    def _put_lifecycle_rules(self, rules: List[LifecycleRule]) -> None:
+        # Existing rules are passed through unchanged, to preserve any unsupported actions
+        rule_dicts: List[Any] = [
+            (
+                rule.raw
+                if rule.raw is not None
+                else {
+                    'ID': rule.id,
+                    'Filter': {'Prefix': rule.prefix},
+                    'Status': 'Enabled' if rule.enabled else 'Disabled',
+                    'AbortIncompleteMultipartUpload': {
+                        'DaysAfterInitiation': rule.abort_incomplete_days
+                    },
+                }
+            )
+            for rule in rules
+        ]
+        self._observe_connection_pool()
+        self._client.put_bucket_lifecycle_configuration(
+            Bucket=self._bucket_name, LifecycleConfiguration={'Rules': rule_dicts}
+        )
@@ -0,0 +1,412 @@
+"""
+A MultipartManager for FileSystemStorage, so local deployments use the same upload flow as S3.
+
+Rather than to an object store, "presigned" part and completion URLs point to a view of this app,
+authorized by a token signed by Django. When an upload is initialized, a sparse staging file is
+preallocated to the size of the whole file, and each part is written directly at its offset within
+it, as it is streamed from the request. Completion verifies the parts, then atomically renames the
+staging file into place, so no data is ever buffered in memory, concatenated or copied.
+
+Staging files are kept in a ".s3ff-uploads" directory, within the storage's location, to ensure that
+they are on the same filesystem. Those of uploads which are never completed or aborted are removed
+by the "s3ff_clean_staging" management command, once they have expired.
+
+Part and completion URLs are relative to the current host, unless the "S3FF_FILESYSTEM_BASE_URL"
+setting (e.g. "https://example.com") is set.
+"""
+
+import base64
+import contextlib
+import hashlib
+import json
+import os
+import re
+import shutil
+import time
+from typing import Any, BinaryIO, Dict, Iterable, Optional, Tuple, cast
+from uuid import uuid4
+
+from django.conf import settings
+from django.core import signing
+from django.core.files.storage import FileSystemStorage
+from django.urls import reverse
+
+from . import _tokens
+from ._multipart import (
+    MultipartManager,
+    ObjectMetadata,
+    ObjectNotFoundError,
+    PartPlan,
+    PresignedParts,
+    PresignedTransfer,
+    TransferredParts,
+    UploadNotFoundError,
+)
+from ._registry import iter_storages
+from ._sizes import mb
+
+STAGING_DIRECTORY = '.s3ff-uploads'
+
+_SIGNING_SALT = 's3_file_field.filesystem'
+_CHUNK_SIZE = mb(1)
+_UPLOAD_ID_RE = re.compile(r'[0-9a-f]{32}')
+
+
+class FileSystemUploadError(Exception):
+    """An error in a request to upload to a FileSystemStorage, in the form of an S3 error."""
+
+    def __init__(self, status: int, code: str, message: str):
+        super().__init__(status, code, message)
+        self.status = status
+        self.code = code
+        self.message = message
+
+    def __str__(self) -> str:
+        return f'{self.code}: {self.message}'
+
+
+def _location_id(storage: FileSystemStorage) -> str:
+    # Identify a storage in tokens, without revealing its path to clients
+    return hashlib.sha256(str(storage.location).encode()).hexdigest()[:16]
+
+
+class _Crc32cHasher:
+    def __init__(self, crc32c: Any):
+        self._crc32c = crc32c
+        self._value = 0
+
+    def update(self, data: bytes) -> None:
+        self._value = self._crc32c(data, self._value)
+
+    def digest(self) -> bytes:
+        return self._value.to_bytes(4, 'big')
+
+
+def _checksum_hasher(algorithm: str) -> Any:
+    if algorithm == 'SHA256':
+        return hashlib.sha256()
+    if algorithm == 'CRC32C':
+        try:
+            import crc32c
+        except ImportError:
+            raise FileSystemUploadError(
+                400,
+                'InvalidRequest',
+                'The "crc32c" package is required to verify CRC32C checksums.',
+            )
+        return _Crc32cHasher(crc32c.crc32c)
+    raise FileSystemUploadError(
+        400, 'InvalidRequest', f'Unsupported checksum algorithm "{algorithm}".'
+    )
+
+
+class FileSystemMultipartManager(MultipartManager):
+    def __init__(self, storage: FileSystemStorage):
+        self._storage = storage
+        self._staging_root = os.path.join(storage.location, STAGING_DIRECTORY)
+
+    @classmethod
+    def from_token(cls, token: str) -> Tuple['FileSystemMultipartManager', Dict[str, Any]]:
+        """Return the manager which signed a part or completion URL, and the URL's signed data."""
+        try:
+            data = _tokens.loads(token, salt=_SIGNING_SALT, max_age=cls._url_expiration)
+        except signing.SignatureExpired:
+            raise FileSystemUploadError(403, 'AccessDenied', 'Request has expired.')
+        except signing.BadSignature:
+            raise FileSystemUploadError(
+                403, 'SignatureDoesNotMatch', 'The request signature does not match.'
+            )
+        # Only storages to which S3FileFields upload may be written to
+        for storage in iter_storages():
+            if isinstance(storage, FileSystemStorage) and _location_id(storage) == data['storage']:
+                return cls(storage), data
+        raise FileSystemUploadError(404, 'NoSuchBucket', 'The storage does not exist.')
+
+    def _staging_path(self, upload_id: str, *names: str) -> str:
+        if not _UPLOAD_ID_RE.fullmatch(upload_id):
+            raise FileSystemUploadError(404, 'NoSuchUpload', 'The specified upload does not exist.')
+        return os.path.join(self._staging_root, upload_id, *names)
+
+    def _read_manifest(self, upload_id: str) -> Dict[str, Any]:
+        try:
+            with open(self._staging_path(upload_id, 'manifest.json')) as manifest_stream:
+                return json.load(manifest_stream)
+        except FileNotFoundError:
+            raise FileSystemUploadError(404, 'NoSuchUpload', 'The specified upload does not exist.')
+
+    def _write_manifest(self, upload_id: str, manifest: Dict[str, Any]) -> None:
+        with open(self._staging_path(upload_id, 'manifest.json'), 'w') as manifest_stream:
+            json.dump(manifest, manifest_stream)
+
+    def _presign(self, **data: Any) -> str:
+        token = _tokens.dumps({'storage': _location_id(self._storage), **data}, salt=_SIGNING_SALT)
+        path = reverse('s3_file_field:filesystem-upload', kwargs={'token': token})
+        return f'{getattr(settings, "S3FF_FILESYSTEM_BASE_URL", "").rstrip("/")}{path}'
+
+    def initialize_upload(
+        self,
+        object_key: str,
+        file_size: int,
+        content_type: Optional[str] = None,
+        part_size: Optional[int] = None,
+        **kwargs,
+    ) -> PresignedTransfer:
+        transfer = super().initialize_upload(
+            object_key, file_size, content_type=content_type, part_size=part_size, **kwargs
+        )
+        # Parts are written at offsets determined by the plan
+        plan = cast(PresignedParts, transfer.parts).plan
+        manifest = self._read_manifest(transfer.upload_id)
+        manifest.update(file_size=file_size, part_size=plan.part_size)
+        self._write_manifest(transfer.upload_id, manifest)
+        # No space is actually allocated until parts are written
+        os.truncate(self._staging_path(transfer.upload_id, 'data'), file_size)
+        return transfer
+
+    def _create_upload_id(
+        self,
+        object_key: str,
+        content_type: Optional[str] = None,
+        checksum_algorithm: Optional[str] = None,
+    ) -> str:
+        upload_id = uuid4().hex
+        os.makedirs(self._staging_path(upload_id, 'parts'))
+        open(self._staging_path(upload_id, 'data'), 'wb').close()
+        self._write_manifest(
+            upload_id,
+            {
+                'object_key': object_key,
+                'content_type': content_type,
+                'checksum_algorithm': checksum_algorithm,
+            },
+        )
+        return upload_id
+
+    def _abort_upload_id(self, object_key: str, upload_id: str) -> None:
+        try:
+            if self._read_manifest(upload_id)['object_key'] != object_key:
+                raise UploadNotFoundError()
+        except FileSystemUploadError:
+            raise UploadNotFoundError()
+        # A concurrent abort may have already removed the staging directory
+        shutil.rmtree(self._staging_path(upload_id), ignore_errors=True)
+
+    def _generate_presigned_part_url(
+        self,
+        object_key: str,
+        upload_id: str,
+        part_number: int,
+        part_size: int,
+        checksum_algorithm: Optional[str] = None,
+        checksum: Optional[str] = None,
+    ) -> str:
+        if checksum_algorithm is not None and checksum is not None:
+            return self._presign(
+                method='PUT',
+                upload_id=upload_id,
+                part_number=part_number,
+                checksums={checksum_algorithm: checksum},
+            )
+        return self._presign(method='PUT', upload_id=upload_id, part_number=part_number)
+
+    def _generate_presigned_complete_url(self, transferred_parts: TransferredParts) -> str:
+        return self._presign(method='POST', upload_id=transferred_parts.upload_id)
+
+    def write_part(
+        self,
+        upload_id: str,
+        part_number: int,
+        stream: BinaryIO,
+        content_length: int,
+        checksums: Optional[Dict[str, str]] = None,
+    ) -> str:
+        """
+        Write a part at its offset, verifying any checksums (by algorithm) sent with it.
+
+        Return the part's ETag.
+        """
+        manifest = self._read_manifest(upload_id)
+        if 'file_size' not in manifest:
+            raise FileSystemUploadError(404, 'NoSuchUpload', 'The specified upload does not exist.')
+        plan = PartPlan.from_file_size(manifest['file_size'], manifest['part_size'])
+        try:
+            part_size = plan.size_of(part_number)
+        except IndexError:
+            raise FileSystemUploadError(400, 'InvalidArgument', 'Part number is out of range.')
+        if content_length != part_size:
+            raise FileSystemUploadError(
+                400, 'InvalidArgument', f'Part {part_number} must be {part_size} bytes.'
+            )
+
+        checksums = checksums or {}
+        if manifest['checksum_algorithm'] is not None:
+            if manifest['checksum_algorithm'] not in checksums:
+                raise FileSystemUploadError(
+                    400,
+                    'InvalidRequest',
+                    f'A {manifest["checksum_algorithm"]} checksum is required.',
+                )
+        hashers = {algorithm: _checksum_hasher(algorithm) for algorithm in checksums}
+        md5 = hashlib.md5()
+
+        offset = (part_number - 1) * plan.part_size
+        remaining = part_size
+        fd = os.open(self._staging_path(upload_id, 'data'), os.O_WRONLY)
+        try:
+            while remaining:
+                chunk = stream.read(min(remaining, _CHUNK_SIZE))
+                if not chunk:
+                    raise FileSystemUploadError(
+                        400, 'IncompleteBody', 'The request body is shorter than the part.'
+                    )
+                md5.update(chunk)
+                for hasher in hashers.values():
+                    hasher.update(chunk)
+                # Concurrent requests write disjoint ranges of the same file
+                os.pwrite(fd, chunk, offset)
+                offset += len(chunk)
+                remaining -= len(chunk)
+        finally:
+            os.close(fd)
+
+        part: Dict[str, Any] = {'etag': f'"{md5.hexdigest()}"'}
+        for algorithm, hasher in hashers.items():
+            checksum = base64.b64encode(hasher.digest()).decode('ascii')
+            if checksum != checksums[algorithm]:
+                raise FileSystemUploadError(
+                    400, 'BadDigest', f'The {algorithm} checksum did not match the part.'
+                )
+            if algorithm == manifest['checksum_algorithm']:
+                part['checksum'] = checksum
+        with open(self._staging_path(upload_id, 'parts', str(part_number)), 'w') as part_stream:
+            json.dump(part, part_stream)
+        return part['etag']
+
+    def complete_parts(
+        self, upload_id: str, parts: Iterable[Tuple[int, str, Optional[str]]]
+    ) -> Tuple[str, str]:
+        """
+        Verify all parts (by number, ETag and checksum) of an upload, and move it into place.
+
+        Return the key and ETag of the object.
+        """
+        manifest = self._read_manifest(upload_id)
+        if 'file_size' not in manifest:
+            raise FileSystemUploadError(404, 'NoSuchUpload', 'The specified upload does not exist.')
+
+        # Serialize concurrent completions, so only one moves the staging file into place
+        lock_path = self._staging_path(upload_id, 'complete.lock')
+        try:
+            os.close(os.open(lock_path, os.O_CREAT | os.O_EXCL | os.O_WRONLY))
+        except (FileExistsError, FileNotFoundError):
+            # The upload is being, or has been, completed or aborted by another request
+            raise FileSystemUploadError(404, 'NoSuchUpload', 'The specified upload does not exist.')
+        try:
+            object_key, etag = self._complete_parts(upload_id, manifest, parts)
+        except BaseException:
+            # Allow the completion to be retried (e.g. with the correct parts)
+            with contextlib.suppress(FileNotFoundError):
+                os.remove(lock_path)
+            raise
+        shutil.rmtree(self._staging_path(upload_id), ignore_errors=True)
+        return object_key, etag
+
+    def _complete_parts(
+        self,
+        upload_id: str,
+        manifest: Dict[str, Any],
+        parts: Iterable[Tuple[int, str, Optional[str]]],
+    ) -> Tuple[str, str]:
+        plan = PartPlan.from_file_size(manifest['file_size'], manifest['part_size'])
+        part_md5s = []
+        expected_part_number = 1
+        for part_number, etag, checksum in parts:
+            # Since the staging file is preallocated, every part must be present
+            if part_number != expected_part_number:
+                raise FileSystemUploadError(
+                    400, 'InvalidPart', f'Part {expected_part_number} was not specified.'
+                )
+            expected_part_number += 1
+            try:
+                with open(self._staging_path(upload_id, 'parts', str(part_number))) as part_stream:
+                    part = json.load(part_stream)
+            except FileNotFoundError:
+                raise FileSystemUploadError(
+                    400, 'InvalidPart', f'Part {part_number} could not be found.'
+                )
+            if part['etag'].strip('"') != etag.strip('"') or part.get('checksum') not in [
+                None,
+                checksum,
+            ]:
+                raise FileSystemUploadError(
+                    400, 'InvalidPart', f'Part {part_number} did not match.'
+                )
+            part_md5s.append(bytes.fromhex(part['etag'].strip('"')))
+        if expected_part_number != plan.count + 1:
+            raise FileSystemUploadError(
+                400, 'InvalidPart', f'Part {expected_part_number} was not specified.'
+            )
+
+        object_key = manifest['object_key']
+        object_path = self._storage.path(object_key)
+        os.makedirs(os.path.dirname(object_path), exist_ok=True)
+        data_path = self._staging_path(upload_id, 'data')
+        try:
+            if self._storage.file_permissions_mode is not None:
+                os.chmod(data_path, self._storage.file_permissions_mode)
+            # Unlike a rename, linking never replaces an existing file (which may have been saved
+            # since the upload was initialized), like FileSystemStorage itself
+            os.link(data_path, object_path)
+        except FileNotFoundError:
+            # The upload was aborted concurrently
+            raise FileSystemUploadError(404, 'NoSuchUpload', 'The specified upload does not exist.')
+        except FileExistsError:
+            raise FileSystemUploadError(
+                412, 'PreconditionFailed', 'An object with the specified key already exists.'
+            )
+        os.remove(data_path)
+        return object_key, f'"{hashlib.md5(b"".join(part_md5s)).hexdigest()}-{plan.count}"'
+
+    def abort_expired_uploads(self) -> int:
+        """
+        Remove the staging files of uploads which can no longer be completed.
+
+        Return the number of uploads removed.
+        """
+        try:
+            upload_ids = os.listdir(self._staging_root)
+        except FileNotFoundError:
+            return 0
+        # Parts and completions may be signed until the upload's signature expires, and are then
+        # valid for as long again
+        expired_before = time.time() - 2 * self._url_expiration.total_seconds()
+        aborted = 0
+        for upload_id in upload_ids:
+            if not _UPLOAD_ID_RE.fullmatch(upload_id):
+                continue
+            try:
+                initialized_at = os.path.getmtime(self._staging_path(upload_id))
+            except FileNotFoundError:
+                continue
+            if initialized_at < expired_before:
+                shutil.rmtree(self._staging_path(upload_id), ignore_errors=True)
+                aborted += 1
+        return aborted
+
+    def read_object_range(self, object_key: str, offset: int, length: int) -> bytes:
+        try:
+            with open(self._storage.path(object_key), 'rb') as object_stream:
+                object_stream.seek(offset)
+                return object_stream.read(length)
+        except FileNotFoundError:
+            raise ObjectNotFoundError()
+
+    def get_object_metadata(
+        self, object_key: str, checksum_algorithm: Optional[str] = None
+    ) -> ObjectMetadata:
+        try:
+            size = os.path.getsize(self._storage.path(object_key))
+        except FileNotFoundError:
+            raise ObjectNotFoundError()
+        # Only part checksums are verified; full object checksums are not recorded
+        return ObjectMetadata(size=size)
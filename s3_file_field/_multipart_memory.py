@@ -0,0 +1,102 @@
+from typing import Iterator, List, Optional, Tuple
+
+from ._multipart import (
+    LifecycleRule,
+    MultipartManager,
+    ObjectMetadata,
+    ObjectNotFoundError,
+    TransferredParts,
+    UploadNotFoundError,
+)
+from .memory import MemoryObjectStore, MemoryStorage, MemoryStoreError
+
+
+class MemoryMultipartManager(MultipartManager):
+    def __init__(self, storage: MemoryStorage):
+        self._store: MemoryObjectStore = storage.store
+        self._bucket_name: str = storage.bucket_name
+
+    def _create_upload_id(
+        self,
+        object_key: str,
+        content_type: Optional[str] = None,
+        checksum_algorithm: Optional[str] = None,
+    ) -> str:
+        return self._store.create_upload(
+            self._bucket_name, object_key, content_type, checksum_algorithm
+        )
+
+    def _abort_upload_id(self, object_key: str, upload_id: str) -> None:
+        try:
+            self._store.abort_upload(self._bucket_name, object_key, upload_id)
+        except MemoryStoreError:
+            raise UploadNotFoundError()
+
+    def _generate_presigned_part_url(
+        self,
+        object_key: str,
+        upload_id: str,
+        part_number: int,
+        part_size: int,
+        checksum_algorithm: Optional[str] = None,
+        checksum: Optional[str] = None,
+    ) -> str:
+        params = {
+            'uploadId': upload_id,
+            'partNumber': str(part_number),
+        }
+        if checksum_algorithm is not None:
+            params['x-amz-sdk-checksum-algorithm'] = checksum_algorithm
+            if checksum is not None:
+                params[f'x-amz-checksum-{checksum_algorithm.lower()}'] = checksum
+        return self._store.presign(
+            'PUT', self._bucket_name, object_key, params, expires_in=self._url_expiration
+        )
+
+    def _generate_presigned_complete_url(self, transferred_parts: TransferredParts) -> str:
+        return self._store.presign(
+            'POST',
+            self._bucket_name,
+            transferred_parts.object_key,
+            {'uploadId': transferred_parts.upload_id},
+            expires_in=self._url_expiration,
+        )
+
+    def get_object_metadata(
+        self, object_key: str, checksum_algorithm: Optional[str] = None
+    ) -> ObjectMetadata:
+        try:
+            obj = self._store.get_object(self._bucket_name, object_key)
+        except MemoryStoreError:
+            raise ObjectNotFoundError()
+        return ObjectMetadata(
+            size=len(obj.data),
+            checksum=(
+                obj.checksum
+                if checksum_algorithm is not None and checksum_algorithm == obj.checksum_algorithm
+                else None
+            ),
+            content_type=obj.content_type,
+            etag=obj.etag.strip('"'),
+        )
+
+    def read_object_range(self, object_key: str, offset: int, length: int) -> bytes:
+        try:
+            obj = self._store.get_object(self._bucket_name, object_key)
+        except MemoryStoreError:
+            raise ObjectNotFoundError()
+        return obj.data[offset : offset + length]
+
+    def _iter_object_sizes(self, prefix: str) -> Iterator[Tuple[str, int]]:
+        for object_key in self._store.list_keys(self._bucket_name, prefix):
+            try:
+                yield object_key, len(self._store.get_object(self._bucket_name, object_key).data)
+            except MemoryStoreError:
+                # Deleted since it was listed
+                pass
+
+    def _get_lifecycle_rules(self) -> List[LifecycleRule]:
+        return self._store.get_lifecycle_rules(self._bucket_name)
+
+    def _put_lifecycle_rules(self, rules: List[LifecycleRule]) -> None:
+        self._store.put_lifecycle_rules(self._bucket_name, rules)
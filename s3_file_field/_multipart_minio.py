@@ -1,9 +1,21 @@
-from typing import Optional
+import base64
+import copy
+import hashlib
+from typing import Iterator, List, Optional, Tuple
+from xml.etree import ElementTree
 
+from django.core.exceptions import ImproperlyConfigured
 import minio
 from minio_storage.storage import MinioStorage
 
-from ._multipart import MultipartManager, ObjectNotFoundError, TransferredParts
+from ._multipart import (
+    LifecycleRule,
+    MultipartManager,
+    ObjectMetadata,
+    ObjectNotFoundError,
+    TransferredParts,
+    UploadNotFoundError,
+)
 
 
 class MinioMultipartManager(MultipartManager):
@@ -13,32 +25,61 @@ class MinioMultipartManager(MultipartManager):
         # To support MinioStorage's "base_url" functionality, an alternative client must be used
         # for pre-signing URLs when it exists
         self._signing_client: minio.Minio = getattr(storage, 'base_url_client', storage.client)
+        if self._use_transfer_endpoint(storage, 'dualstack_endpoint'):
+            raise ImproperlyConfigured('Dual-stack endpoints are not supported by MinioStorage.')
+        if self._use_transfer_endpoint(storage, 'transfer_acceleration'):
+            # Only part URLs should use the accelerated endpoint; this has no effect unless the
+            # client's endpoint is AWS S3
+            self._signing_client = copy.copy(self._signing_client)
+            self._signing_client.use_s3_accelerate(True)
 
     def _create_upload_id(
         self,
         object_key: str,
         content_type: Optional[str] = None,
+        checksum_algorithm: Optional[str] = None,
     ) -> str:
         metadata = {}
         if content_type is not None:
             metadata['Content-Type'] = content_type
+        if checksum_algorithm is not None:
+            metadata['x-amz-checksum-algorithm'] = checksum_algorithm
         return self._client._new_multipart_upload(
             bucket_name=self._bucket_name,
             object_name=object_key,
-            metadata=metadata
+            metadata=metadata,
             # TODO: filename in Metadata
         )
 
     def _abort_upload_id(self, object_key: str, upload_id: str) -> None:
-        self._client._remove_incomplete_upload(
-            bucket_name=self._bucket_name,
-            object_name=object_key,
-            upload_id=upload_id,
-        )
+        try:
+            self._client._remove_incomplete_upload(
+                bucket_name=self._bucket_name,
+                object_name=object_key,
+                upload_id=upload_id,
+            )
+        except minio.error.NoSuchUpload:
+            raise UploadNotFoundError()
 
     def _generate_presigned_part_url(
-        self, object_key: str, upload_id: str, part_number: int, part_size: int
+        self,
+        object_key: str,
+        upload_id: str,
+        part_number: int,
+        part_size: int,
+        checksum_algorithm: Optional[str] = None,
+        checksum: Optional[str] = None,
     ) -> str:
+        query_params = {
+            'uploadId': upload_id,
+            'partNumber': str(part_number),
+        }
+        if checksum_algorithm is not None:
+            query_params['x-amz-sdk-checksum-algorithm'] = checksum_algorithm
+            if checksum is not None:
+                # This version of the MinIO client can't sign headers, so the checksum is signed
+                # as a query parameter instead
+                query_params[f'x-amz-checksum-{checksum_algorithm.lower()}'] = checksum
         return self._signing_client.presigned_url(
             method='PUT',
             bucket_name=self._bucket_name,
@@ -46,10 +87,7 @@ class MinioMultipartManager(MultipartManager):
             expires=self._url_expiration,
             # Both "extra_query_params" and "response_headers" add a query string, but
             # "extra_query_params" does not sign them properly and results in incorrect URL syntax
-            response_headers={
-                'uploadId': upload_id,
-                'partNumber': str(part_number),
-            },
+            response_headers=query_params,
             # TODO: presigned_url does not allow arbitrary headers, but presign_v4 within it does
             # headers={
             #     'Content-Length': str(part_size)
@@ -67,9 +105,119 @@ class MinioMultipartManager(MultipartManager):
             },
         )
 
-    def get_object_size(self, object_key: str) -> int:
+    def get_object_metadata(
+        self, object_key: str, checksum_algorithm: Optional[str] = None
+    ) -> ObjectMetadata:
+        if checksum_algorithm is None:
+            try:
+                stats = self._client.stat_object(
+                    bucket_name=self._bucket_name, object_name=object_key
+                )
+            except minio.error.NoSuchKey:
+                raise ObjectNotFoundError()
+            return ObjectMetadata(
+                size=stats.size, content_type=stats.content_type, etag=stats.etag.strip('"')
+            )
+
+        # This version of the MinIO client can't request object checksums, which are only
+        # returned in response to a "x-amz-checksum-mode" header
+        try:
+            response = self._client._url_open(
+                'HEAD',
+                bucket_name=self._bucket_name,
+                object_name=object_key,
+                headers={'x-amz-checksum-mode': 'ENABLED'},
+            )
+        except minio.error.NoSuchKey:
+            raise ObjectNotFoundError()
+        return ObjectMetadata(
+            size=int(response.headers.get('content-length', '0')),
+            checksum=response.headers.get(f'x-amz-checksum-{checksum_algorithm.lower()}'),
+            content_type=response.headers.get('content-type'),
+            etag=response.headers.get('etag', '').strip('"'),
+        )
+
+    def read_object_range(self, object_key: str, offset: int, length: int) -> bytes:
         try:
-            stats = self._client.stat_object(bucket_name=self._bucket_name, object_name=object_key)
-            return stats.size
+            response = self._client.get_partial_object(
+                self._bucket_name, object_key, offset=offset, length=length
+            )
         except minio.error.NoSuchKey:
             raise ObjectNotFoundError()
+        try:
+            return response.read()
+        finally:
+            response.release_conn()
+
+    def _iter_object_sizes(self, prefix: str) -> Iterator[Tuple[str, int]]:
+        for obj in self._client.list_objects_v2(self._bucket_name, prefix=prefix, recursive=True):
+            yield obj.object_name, obj.size
+
+    # This version of the MinIO client has no lifecycle API, so the XML is handled directly
+    def _get_lifecycle_rules(self) -> List[LifecycleRule]:
+        try:
+            response = self._client._url_open(
+                'GET', bucket_name=self._bucket_name, query={'lifecycle': ''}
+            )
+        except minio.error.NoSuchLifecycleConfiguration:
+            return []
+        root = ElementTree.fromstring(response.data)
+        # Remove namespaces, so rules can be found and rewritten simply
+        for element in root.iter():
+            element.tag = element.tag.rpartition('}')[2]
+        return [self._parse_lifecycle_rule(rule) for rule in root.findall('Rule')]
+
+    @staticmethod
+    def _parse_lifecycle_rule(rule: ElementTree.Element) -> LifecycleRule:
+        prefix: Optional[str]
+        rule_filter = rule.find('Filter')
+        if rule_filter is not None:
+            # An empty filter applies to all objects
+            prefix = (
+                rule_filter.findtext('Prefix', '')
+                if all(child.tag == 'Prefix' for child in rule_filter)
+                else None
+            )
+        else:
+            # Deprecated, but still valid
+            prefix = rule.findtext('Prefix', '')
+        days = rule.findtext('AbortIncompleteMultipartUpload/DaysAfterInitiation')
+        return LifecycleRule(
+            id=rule.findtext('ID'),
+            prefix=prefix,
+            enabled=rule.findtext('Status') == 'Enabled',
+            abort_incomplete_days=int(days) if days is not None else None,
+            raw=rule,
+        )
+
+    def _put_lifecycle_rules(self, rules: List[LifecycleRule]) -> None:
+        root = ElementTree.Element('LifecycleConfiguration')
+        for rule in rules:
+            if rule.raw is not None:
+                root.append(rule.raw)
+                continue
+            element = ElementTree.SubElement(root, 'Rule')
+            if rule.id is not None:
+                ElementTree.SubElement(element, 'ID').text = rule.id
+            rule_filter = ElementTree.SubElement(element, 'Filter')
+            ElementTree.SubElement(rule_filter, 'Prefix').text = rule.prefix
+            ElementTree.SubElement(element, 'Status').text = (
+                'Enabled' if rule.enabled else 'Disabled'
+            )
+            abort_incomplete = ElementTree.SubElement(element, 'AbortIncompleteMultipartUpload')
+            ElementTree.SubElement(abort_incomplete, 'DaysAfterInitiation').text = str(
+                rule.abort_incomplete_days
+            )
+        content = ElementTree.tostring(root, encoding='utf-8')
+        self._client._url_open(
+            'PUT',
+            bucket_name=self._bucket_name,
+            query={'lifecycle': ''},
+            headers={
+                'Content-Length': str(len(content)),
+                # Required by S3 for this operation
+                'Content-Md5': base64.b64encode(hashlib.md5(content).digest()).decode(),
+            },
+            body=content,
+            content_sha256=hashlib.sha256(content).hexdigest(),
+        )
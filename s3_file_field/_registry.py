@@ -1,8 +1,11 @@
+import os
 from typing import TYPE_CHECKING, Iterator
 from weakref import WeakValueDictionary
 
 from django.core.files.storage import Storage
 
+from .sharding import iter_concrete_storages
+
 if TYPE_CHECKING:
     # Avoid circular imports
     from .fields import S3FileField
@@ -22,9 +25,9 @@ def register_field(field: 'S3FileField') -> None:
         raise Exception(f'Cannot overwrite existing S3FileField declaration for {field_id}')
     _fields[field_id] = field
 
-    storage = field.storage
-    storage_label = id(storage)
-    _storages[storage_label] = storage
+    # Only track the storages to which objects are actually uploaded
+    for _, storage in iter_concrete_storages(field.storage):
+        _storages[id(storage)] = storage
 
 
 def get_field(field_id: str) -> 'S3FileField':
@@ -40,3 +43,15 @@ def iter_fields() -> Iterator['S3FileField']:
 def iter_storages() -> Iterator[Storage]:
     """Iterate over the unique Storage instances used by S3FileFields."""
     return _storages.values()
+
+
+def get_storage_key_prefix(storage: Storage) -> str:
+    """Return a prefix shared by all object keys which S3FileFields may upload to a Storage."""
+    return os.path.commonprefix(
+        [
+            f'{shard_prefix}{field.key_prefix}'
+            for field in iter_fields()
+            for shard_prefix, shard in iter_concrete_storages(field.storage)
+            if shard is storage
+        ]
+    )
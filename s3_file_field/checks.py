@@ -1,11 +1,16 @@
 import logging
 from typing import Iterable, List, Optional
 
-from django.apps import AppConfig
+from django.apps import AppConfig, apps
+from django.conf import settings
 from django.core import checks
+from django.core.cache.backends.dummy import DummyCache
+from django.core.cache.backends.locmem import LocMemCache
 
 from ._multipart import MultipartManager
-from ._registry import iter_storages
+from ._registry import get_storage_key_prefix, iter_fields, iter_storages
+from .pipeline import get_cache as get_pipeline_cache
+from .sessions import DatabaseSessionStore, get_session_store
 
 logger = logging.getLogger(__name__)
 
@@ -25,3 +30,91 @@ def test_bucket_access(
             logger.exception(msg)
             return [checks.Error(msg, obj=storage, id='s3_file_field.E002')]
     return []
+
+
+@checks.register()
+def check_upload_limit(
+    app_configs: Optional[Iterable[AppConfig]], **kwargs
+) -> List[checks.CheckMessage]:
+    if (
+        getattr(settings, 'S3FF_MAX_CONCURRENT_UPLOADS_PER_USER', None) is not None
+        and not get_session_store().enabled
+    ):
+        return [
+            checks.Warning(
+                'S3FF_MAX_CONCURRENT_UPLOADS_PER_USER has no effect without a session store.',
+                hint='Set S3FF_SESSION_STORE.',
+                id='s3_file_field.W002',
+            )
+        ]
+    return []
+
+
+@checks.register()
+def check_session_store(
+    app_configs: Optional[Iterable[AppConfig]], **kwargs
+) -> List[checks.CheckMessage]:
+    if isinstance(get_session_store(), DatabaseSessionStore) and not apps.is_installed(
+        's3_file_field.upload_sessions'
+    ):
+        return [
+            checks.Error(
+                'DatabaseSessionStore requires the "s3_file_field.upload_sessions" app.',
+                hint='Add "s3_file_field.upload_sessions" to INSTALLED_APPS.',
+                id='s3_file_field.E003',
+            )
+        ]
+    return []
+
+
+# Cache backends whose entries are not shared by all processes
+_LOCAL_CACHE_BACKENDS = (LocMemCache, DummyCache)
+
+
+@checks.register()
+def check_pipeline_cache(
+    app_configs: Optional[Iterable[AppConfig]], **kwargs
+) -> List[checks.CheckMessage]:
+    if any(field.processors for field in iter_fields()) and isinstance(
+        get_pipeline_cache(), _LOCAL_CACHE_BACKENDS
+    ):
+        return [
+            checks.Warning(
+                'S3FF_PIPELINE_CACHE is not shared by all processes, so processing results may '
+                'be lost.',
+                hint='Set S3FF_PIPELINE_CACHE to a shared cache, such as a database cache.',
+                id='s3_file_field.W005',
+            )
+        ]
+    return []
+
+
+@checks.register()
+def check_lifecycle_rules(
+    app_configs: Optional[Iterable[AppConfig]], **kwargs
+) -> List[checks.CheckMessage]:
+    # This requires a request to the bucket, so it's opt-in
+    if not getattr(settings, 'S3FF_CHECK_LIFECYCLE_RULES', False):
+        return []
+    messages: List[checks.CheckMessage] = []
+    for storage in iter_storages():
+        if not MultipartManager.supported_storage(storage):
+            continue
+        multipart = MultipartManager.from_storage(storage)
+        try:
+            rule = multipart.get_abort_incomplete_rule(get_storage_key_prefix(storage))
+        except Exception:
+            msg = 'Unable to read the storage bucket lifecycle configuration.'
+            logger.exception(msg)
+            messages.append(checks.Warning(msg, obj=storage, id='s3_file_field.W003'))
+            continue
+        if rule is None:
+            messages.append(
+                checks.Warning(
+                    'Incomplete multipart uploads are not aborted by a bucket lifecycle rule.',
+                    hint='Run "manage.py s3ff_lifecycle --install".',
+                    obj=storage,
+                    id='s3_file_field.W004',
+                )
+            )
+    return messages
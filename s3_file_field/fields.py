@@ -1,21 +1,85 @@
 import logging
-from typing import Any, List, Optional
+from typing import Any, Dict, List, Mapping, Optional, Sequence, Tuple, Union, cast
 from uuid import uuid4
 
 from django.core import checks
 from django.core.checks import CheckMessage
+from django.core.files.storage import Storage
 from django.db import models
-from django.db.models.fields.files import FileField
+from django.db.models.fields.files import FieldFile, FileField
 from django.forms import Field as FormField
 
-from ._multipart import MultipartManager
+from ._multipart import (
+    CHECKSUM_ALGORITHMS,
+    MultipartManager,
+    ObjectMetadata,
+    UnsupportedStorageError,
+)
 from ._registry import register_field
 from .forms import S3FormFileField
+from .pipeline import ProcessorCallable, clear_results, get_results
+from .planning import FixedPartSizePlanner, PartSizePlanner
+from .policy import UploadPolicy
+from .sharding import ShardedStorage, ShardSelector, resolve_storage
 from .widgets import S3PlaceholderFile
 
 logger = logging.getLogger(__name__)
 
 
+class S3FieldFile(FieldFile):
+    """A FieldFile which caches the metadata of its stored object, once it has been fetched."""
+
+    # The name of the object which the metadata describes, and the metadata
+    _s3ff_metadata: Optional[Tuple[str, ObjectMetadata]] = None
+
+    def _cached_metadata(self) -> Optional[ObjectMetadata]:
+        # The metadata is stale if another object has been saved or assigned since
+        if self._s3ff_metadata is not None and self._s3ff_metadata[0] == self.name:
+            return self._s3ff_metadata[1]
+        return None
+
+    @property
+    def metadata(self) -> ObjectMetadata:
+        """
+        Return the metadata of the stored object, including its size and content type.
+
+        For storages which MultipartManager does not support, only the size is known.
+        """
+        self._require_file()  # type: ignore[attr-defined]
+        name = cast(str, self.name)
+        metadata = self._cached_metadata()
+        if metadata is None:
+            storage = resolve_storage(self.storage, name)
+            try:
+                manager = MultipartManager.from_storage(storage)
+            except UnsupportedStorageError:
+                metadata = ObjectMetadata(size=storage.size(name))
+            else:
+                metadata = manager.get_object_metadata(name)
+            self._s3ff_metadata = (name, metadata)
+        return metadata
+
+    @property
+    def processing_results(self) -> Dict[str, Any]:
+        """Return the results of the field's processors for the stored object, by processor name."""
+        self._require_file()  # type: ignore[attr-defined]
+        return get_results(cast(str, self.name))
+
+    @property
+    def size(self) -> int:
+        metadata = self._cached_metadata()
+        if self._committed and metadata is not None:  # type: ignore[attr-defined]
+            return metadata.size
+        return super().size
+
+    def delete(self, save: bool = True) -> None:
+        name = self.name
+        super().delete(save=save)
+        # The results describe the deleted object, so would otherwise be kept forever
+        if name and cast('S3FileField', self.field).processors:
+            clear_results(name)
+
+
 class S3FileField(FileField):
     """
     A django model field that is similar to a file field.
@@ -27,18 +91,87 @@ class S3FileField(FileField):
         'A file field which is supports direct uploads to S3 via the '
         'UI and fallsback to uploaded to <randomuuid>/filename.'
     )
-
-    def __init__(self, *args, **kwargs):
+    attr_class = S3FieldFile
+
+    def __init__(
+        self,
+        *args,
+        upload_policy: Optional[UploadPolicy] = None,
+        min_size: Optional[int] = None,
+        max_size: Optional[int] = None,
+        allowed_content_types: Optional[Sequence[str]] = None,
+        allowed_extensions: Optional[Sequence[str]] = None,
+        part_size: Optional[int] = None,
+        part_size_planner: Optional[PartSizePlanner] = None,
+        checksum_algorithm: Optional[str] = None,
+        storage_shards: Optional[Union[Mapping[str, Storage], Sequence[Storage]]] = None,
+        shard_selector: Optional[ShardSelector] = None,
+        storage_regions: Optional[Mapping[str, Storage]] = None,
+        processors: Optional[Sequence[ProcessorCallable]] = None,
+        **kwargs,
+    ):
         kwargs.setdefault('max_length', 2000)
         kwargs.setdefault('upload_to', self.uuid_prefix_filename)
+        if storage_shards is not None and storage_regions is not None:
+            raise TypeError('Cannot specify both "storage_shards" and "storage_regions".')
+        if shard_selector is not None and storage_shards is None:
+            raise TypeError('Cannot specify "shard_selector" without "storage_shards".')
+        self._sharded = storage_shards is not None or storage_regions is not None
+        # If set, each upload is routed to the region nearest to its client
+        self.routes_regions = storage_regions is not None
+        if self._sharded and kwargs.get('storage') is not None:
+            raise TypeError('Cannot specify "storage" with "storage_shards" or "storage_regions".')
+        if storage_shards is not None:
+            kwargs['storage'] = ShardedStorage(storage_shards, selector=shard_selector)
+        elif storage_regions is not None:
+            # Uploads without any hint of their client's region go to the first region
+            home_region = next(iter(storage_regions), '')
+            kwargs['storage'] = ShardedStorage(storage_regions, selector=lambda name: home_region)
         super().__init__(*args, **kwargs)
 
+        policy_kwargs: Dict[str, Any] = {
+            'min_size': min_size,
+            'max_size': max_size,
+            'allowed_content_types': allowed_content_types,
+            'allowed_extensions': allowed_extensions,
+            'part_size': part_size,
+        }
+        if upload_policy is None:
+            upload_policy = UploadPolicy(**policy_kwargs)
+        elif any(value is not None for value in policy_kwargs.values()):
+            raise TypeError(
+                f'Cannot specify both "upload_policy" and any of: {", ".join(policy_kwargs)}.'
+            )
+        self.upload_policy = upload_policy
+
+        if part_size_planner is None:
+            part_size_planner = FixedPartSizePlanner(upload_policy.part_size)
+        elif upload_policy.part_size is not None:
+            raise TypeError('Cannot specify both "part_size_planner" and "part_size".')
+        self.part_size_planner = part_size_planner
+
+        if checksum_algorithm is not None and checksum_algorithm not in CHECKSUM_ALGORITHMS:
+            raise ValueError(
+                f'Unsupported checksum algorithm "{checksum_algorithm}", '
+                f'must be one of: {", ".join(CHECKSUM_ALGORITHMS)}.'
+            )
+        # If set, clients must compute a checksum of each part, which the object store verifies
+        self.checksum_algorithm = checksum_algorithm
+
+        # Run on each upload after it is finalized
+        self.processors: List[ProcessorCallable] = list(processors or [])
+
     def deconstruct(self):
         name, path, args, kwargs = super().deconstruct()
         if kwargs.get('max_length') == 2000:
             del kwargs['max_length']
         if kwargs.get('upload_to') is self.uuid_prefix_filename:
             del kwargs['upload_to']
+        if self._sharded:
+            del kwargs['storage']
+        # The upload policy, part size planner, checksum algorithm, storage shards and processors do
+        # not affect the database schema, so they are intentionally omitted, to avoid generating
+        # migrations (and requiring them to be serializable)
         return name, path, args, kwargs
 
     @property
@@ -49,6 +182,15 @@ class S3FileField(FileField):
             raise Exception('contribute_to_class has not been called yet on this field.')
         return str(self)
 
+    @property
+    def key_prefix(self) -> str:
+        """Return a prefix shared by all object keys which this field generates."""
+        if callable(self.upload_to):
+            # Arbitrary functions could return anything
+            return ''
+        # Keys are formatted with strftime, so only the part before any placeholders is constant
+        return str(self.upload_to).partition('%')[0]
+
     def contribute_to_class(self, cls, name, **kwargs):
         # This is executed when the Field is formally added to its containing class.
         # As a side effect, self.name is set and self.__str__ becomes usable as a unique
@@ -1,13 +1,15 @@
 # This module shouldn't be imported explicitly, as it will be loaded by pytest via entry point.
 
-from typing import Callable, Generator
+from typing import Callable, Generator, Iterator
 
-from django.core import signing
 from django.core.files import File
 from django.core.files.base import ContentFile
 from django.core.files.storage import default_storage
 import pytest
 
+from s3_file_field import _tokens, notifications
+from s3_file_field.memory import MemoryObjectStore, MemoryStorage, default_store
+
 
 @pytest.fixture
 def stored_file_object() -> Generator[File, None, None]:
@@ -27,7 +29,7 @@ def s3ff_field_value_factory() -> Callable[[File], str]:
     """Return a function to produce a valid field_value from a File object."""
 
     def s3ff_field_value_factory(file_object: File) -> str:
-        return signing.dumps(
+        return _tokens.dumps(
             {
                 'object_key': file_object.name,
                 'file_size': file_object.size,
@@ -41,3 +43,29 @@ def s3ff_field_value_factory() -> Callable[[File], str]:
 def s3ff_field_value(s3ff_field_value_factory, stored_file_object: File) -> str:
     """Return a valid field_value for an existent File in the default Storage."""
     return s3ff_field_value_factory(stored_file_object)
+
+
+@pytest.fixture(scope='session')
+def s3ff_memory_store() -> Iterator[MemoryObjectStore]:
+    """Return the default in-memory object store, served over HTTP for the whole session."""
+    with default_store.serve():
+        yield default_store
+
+
+@pytest.fixture
+def s3ff_memory_storage(s3ff_memory_store: MemoryObjectStore, settings) -> MemoryStorage:
+    """Replace the default Storage with an empty in-memory store (this requires pytest-django)."""
+    s3ff_memory_store.clear()
+    # Changing the setting resets the "default_storage" object
+    settings.DEFAULT_FILE_STORAGE = 's3_file_field.memory.MemoryStorage'
+    return MemoryStorage(store=s3ff_memory_store)
+
+
+@pytest.fixture
+def s3ff_notifications(s3ff_memory_storage: MemoryStorage, settings) -> Iterator[MemoryObjectStore]:
+    """Deliver the bucket notifications of the in-memory object store, to confirm uploads."""
+    settings.S3FF_NOTIFICATIONS = True
+    store = s3ff_memory_storage.store
+    store.subscribe(notifications.ingest)
+    yield store
+    store.unsubscribe(notifications.ingest)
@@ -0,0 +1,22 @@
+from django.core.files.storage import FileSystemStorage
+from django.core.management.base import BaseCommand
+
+from s3_file_field._multipart_filesystem import FileSystemMultipartManager
+from s3_file_field._registry import iter_storages
+
+
+class Command(BaseCommand):
+    help = (
+        'Remove the staging files of expired uploads, which were never completed or aborted, from '
+        'each FileSystemStorage used by S3FileFields.'
+    )
+
+    def handle(self, *args, **options):
+        for storage in iter_storages():
+            if not isinstance(storage, FileSystemStorage):
+                continue
+            aborted = FileSystemMultipartManager(storage).abort_expired_uploads()
+            self.stdout.write(
+                f'{storage.__class__.__name__} ("{storage.location}"): '
+                f'removed {aborted} expired upload(s)'
+            )
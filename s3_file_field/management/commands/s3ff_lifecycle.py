@@ -0,0 +1,64 @@
+from django.conf import settings
+from django.core.management.base import BaseCommand, CommandError
+
+from s3_file_field._multipart import DEFAULT_ABORT_INCOMPLETE_DAYS, MultipartManager
+from s3_file_field._registry import get_storage_key_prefix, iter_storages
+
+
+class Command(BaseCommand):
+    help = (
+        'Report whether incomplete multipart uploads are aborted by a lifecycle rule on the bucket '
+        'of each storage used by S3FileFields, and optionally install such rules.'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--install',
+            action='store_true',
+            help='Add a rule to each bucket which lacks one, preserving any existing rules.',
+        )
+        parser.add_argument(
+            '--days',
+            type=int,
+            default=getattr(settings, 'S3FF_ABORT_INCOMPLETE_DAYS', DEFAULT_ABORT_INCOMPLETE_DAYS),
+            help='The number of days after which incomplete uploads are aborted by new rules.',
+        )
+
+    def handle(self, *args, install: bool, days: int, **options):
+        if days < 1:
+            raise CommandError('"--days" must be a positive integer.')
+
+        missing = False
+        for storage in iter_storages():
+            if not MultipartManager.supported_storage(storage):
+                continue
+            multipart = MultipartManager.from_storage(storage)
+            key_prefix = get_storage_key_prefix(storage)
+            description = f'{storage.__class__.__name__} (prefix "{key_prefix}")'
+
+            try:
+                rule = multipart.get_abort_incomplete_rule(key_prefix)
+            except NotImplementedError:
+                self.stdout.write(f'{description}: lifecycle rules are not supported')
+                continue
+            if rule is not None:
+                self.stdout.write(
+                    f'{description}: incomplete uploads are aborted after '
+                    f'{rule.abort_incomplete_days} day(s), by rule "{rule.id}"'
+                )
+            elif install:
+                multipart.put_abort_incomplete_rule(key_prefix, days)
+                self.stdout.write(
+                    self.style.SUCCESS(
+                        f'{description}: installed a rule to abort incomplete uploads after '
+                        f'{days} day(s)'
+                    )
+                )
+            else:
+                missing = True
+                self.stdout.write(
+                    self.style.WARNING(f'{description}: incomplete uploads are never aborted')
+                )
+
+        if missing:
+            raise CommandError('Some buckets lack a rule; run again with "--install" to add them.')
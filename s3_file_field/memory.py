@@ -0,0 +1,608 @@
+"""
+An in-memory stand-in for S3, for fast tests and benchmarks.
+
+A MemoryObjectStore keeps buckets of objects and multipart uploads in memory. It is also a WSGI app,
+which accepts the presigned requests that clients send directly to S3: part uploads (PUT),
+upload completions (POST), and downloads (GET or HEAD). As with S3, each request must carry a valid,
+unexpired signature, part ETags and checksums are verified upon completion, and only the last part
+of an upload may be smaller than 5 MiB.
+
+A MemoryStorage is a Django Storage backed by a MemoryObjectStore, which S3FileFields may upload to.
+For clients to reach its presigned URLs, the store must be served over HTTP:
+
+    store = MemoryObjectStore()
+    with store.serve():
+        storage = MemoryStorage(store=store)
+
+The "s3ff_memory_storage" pytest fixture (in "s3_file_field.fixtures") does this, and replaces the
+default Storage.
+
+Callbacks may subscribe to a store's bucket notifications, which are sent synchronously, in the
+same format as S3's, as each object is created or removed.
+"""
+
+from __future__ import annotations
+
+import base64
+from collections import defaultdict
+import contextlib
+from dataclasses import dataclass, field
+from datetime import datetime, timedelta, timezone
+import hashlib
+import hmac
+import io
+import mimetypes
+import secrets
+import threading
+import time
+from typing import Any, Callable, Dict, Iterable, Iterator, List, Optional, Tuple
+from urllib.parse import parse_qsl, quote, quote_plus, urlencode
+from wsgiref.simple_server import WSGIRequestHandler, WSGIServer, make_server
+from xml.etree import ElementTree
+from xml.sax.saxutils import escape as xml_escape
+
+from django.core.files import File
+from django.core.files.storage import Storage
+from django.utils.deconstruct import deconstructible
+
+from ._multipart import LifecycleRule
+from ._sizes import mb
+
+_S3_NAMESPACE = 'http://s3.amazonaws.com/doc/2006-03-01/'
+_DEFAULT_EXPIRATION = timedelta(hours=1)
+_HTTP_STATUSES = {
+    200: '200 OK',
+    204: '204 No Content',
+    400: '400 Bad Request',
+    403: '403 Forbidden',
+    404: '404 Not Found',
+    405: '405 Method Not Allowed',
+}
+
+
+class MemoryStoreError(Exception):
+    """An error response from a MemoryObjectStore, in the form of an S3 error."""
+
+    def __init__(self, status: int, code: str, message: str):
+        super().__init__(status, code, message)
+        self.status = status
+        self.code = code
+        self.message = message
+
+    def __str__(self) -> str:
+        return f'{self.code}: {self.message}'
+
+
+def _checksum_digest(algorithm: str, data: bytes) -> bytes:
+    if algorithm == 'SHA256':
+        return hashlib.sha256(data).digest()
+    if algorithm == 'CRC32C':
+        try:
+            import crc32c
+        except ImportError:
+            raise MemoryStoreError(
+                400,
+                'InvalidRequest',
+                'The "crc32c" package is required to verify CRC32C checksums.',
+            )
+        return crc32c.crc32c(data).to_bytes(4, 'big')
+    raise MemoryStoreError(400, 'InvalidRequest', f'Unsupported checksum algorithm "{algorithm}".')
+
+
+@dataclass
+class _Object:
+    data: bytes
+    etag: str
+    content_type: Optional[str] = None
+    checksum: Optional[str] = None
+    checksum_algorithm: Optional[str] = None
+    modified: datetime = field(default_factory=lambda: datetime.now(timezone.utc))
+
+
+@dataclass
+class _Part:
+    data: bytes
+    etag: str
+    # The raw digest, from which the checksum of the whole object is computed
+    checksum_digest: Optional[bytes] = None
+
+
+@dataclass
+class _Upload:
+    bucket_name: str
+    object_key: str
+    content_type: Optional[str]
+    checksum_algorithm: Optional[str]
+    parts: Dict[int, _Part] = field(default_factory=dict)
+
+
+class MemoryObjectStore:
+    """An S3-compatible object store, which keeps everything in memory."""
+
+    def __init__(self) -> None:
+        self._lock = threading.Lock()
+        self._buckets: Dict[str, Dict[str, _Object]] = defaultdict(dict)
+        self._uploads: Dict[str, _Upload] = {}
+        self._lifecycle_rules: Dict[str, List[LifecycleRule]] = {}
+        # Presigned URLs are only valid for the store which signed them
+        self._secret = secrets.token_bytes(32)
+        # Set while the store is being served
+        self.endpoint_url: Optional[str] = None
+        self._subscribers: List[Callable[[Dict[str, Any]], Any]] = []
+
+    def clear(self) -> None:
+        """Remove all objects, uploads and lifecycle rules."""
+        with self._lock:
+            self._buckets.clear()
+            self._uploads.clear()
+            self._lifecycle_rules.clear()
+
+    # Notifications
+
+    def subscribe(self, callback: Callable[[Dict[str, Any]], Any]) -> None:
+        """Call a function with each bucket notification, until it is unsubscribed."""
+        self._subscribers.append(callback)
+
+    def unsubscribe(self, callback: Callable[[Dict[str, Any]], Any]) -> None:
+        self._subscribers.remove(callback)
+
+    def _notify(self, event_name: str, bucket_name: str, object_key: str, obj: _Object) -> None:
+        if not self._subscribers:
+            return
+        notification = {
+            'Records': [
+                {
+                    'eventVersion': '2.1',
+                    'eventSource': 'aws:s3',
+                    'eventTime': datetime.now(timezone.utc).isoformat(timespec='milliseconds'),
+                    'eventName': event_name,
+                    's3': {
+                        's3SchemaVersion': '1.0',
+                        'bucket': {'name': bucket_name},
+                        'object': {
+                            # As with S3, keys are URL-encoded
+                            'key': quote_plus(object_key, safe='/'),
+                            'size': len(obj.data),
+                            'eTag': obj.etag.strip('"'),
+                            'sequencer': f'{time.time_ns():016X}',
+                        },
+                    },
+                }
+            ]
+        }
+        for callback in list(self._subscribers):
+            callback(notification)
+
+    # Objects
+
+    def put_object(
+        self, bucket_name: str, object_key: str, data: bytes, content_type: Optional[str] = None
+    ) -> None:
+        obj = _Object(
+            data=data, etag=f'"{hashlib.md5(data).hexdigest()}"', content_type=content_type
+        )
+        with self._lock:
+            self._buckets[bucket_name][object_key] = obj
+        self._notify('ObjectCreated:Put', bucket_name, object_key, obj)
+
+    def get_object(self, bucket_name: str, object_key: str) -> _Object:
+        with self._lock:
+            try:
+                return self._buckets[bucket_name][object_key]
+            except KeyError:
+                raise MemoryStoreError(404, 'NoSuchKey', 'The specified key does not exist.')
+
+    def delete_object(self, bucket_name: str, object_key: str) -> None:
+        with self._lock:
+            obj = self._buckets[bucket_name].pop(object_key, None)
+        if obj is not None:
+            self._notify('ObjectRemoved:Delete', bucket_name, object_key, obj)
+
+    def list_keys(self, bucket_name: str, prefix: str = '') -> List[str]:
+        with self._lock:
+            return sorted(key for key in self._buckets[bucket_name] if key.startswith(prefix))
+
+    # Multipart uploads
+
+    def create_upload(
+        self,
+        bucket_name: str,
+        object_key: str,
+        content_type: Optional[str] = None,
+        checksum_algorithm: Optional[str] = None,
+    ) -> str:
+        upload_id = secrets.token_urlsafe(32)
+        with self._lock:
+            self._uploads[upload_id] = _Upload(
+                bucket_name, object_key, content_type, checksum_algorithm
+            )
+        return upload_id
+
+    def _get_upload(self, bucket_name: str, object_key: str, upload_id: str) -> _Upload:
+        upload = self._uploads.get(upload_id)
+        if upload is None or (upload.bucket_name, upload.object_key) != (bucket_name, object_key):
+            raise MemoryStoreError(404, 'NoSuchUpload', 'The specified upload does not exist.')
+        return upload
+
+    def list_uploads(self, bucket_name: str) -> List[Tuple[str, str]]:
+        """Return the object key and ID of each incomplete upload in a bucket."""
+        with self._lock:
+            return [
+                (upload.object_key, upload_id)
+                for upload_id, upload in self._uploads.items()
+                if upload.bucket_name == bucket_name
+            ]
+
+    def abort_upload(self, bucket_name: str, object_key: str, upload_id: str) -> None:
+        with self._lock:
+            self._get_upload(bucket_name, object_key, upload_id)
+            del self._uploads[upload_id]
+
+    def upload_part(
+        self,
+        bucket_name: str,
+        object_key: str,
+        upload_id: str,
+        part_number: int,
+        data: bytes,
+        checksums: Optional[Dict[str, str]] = None,
+    ) -> str:
+        """Store a part, verifying any checksums (by algorithm) sent with it; return its ETag."""
+        with self._lock:
+            upload = self._get_upload(bucket_name, object_key, upload_id)
+        if not 1 <= part_number <= 10_000:
+            raise MemoryStoreError(400, 'InvalidArgument', 'Part number must be from 1 to 10000.')
+
+        checksums = checksums or {}
+        if upload.checksum_algorithm is not None and upload.checksum_algorithm not in checksums:
+            raise MemoryStoreError(
+                400, 'InvalidRequest', f'A {upload.checksum_algorithm} checksum is required.'
+            )
+        checksum_digest = None
+        for algorithm, checksum in checksums.items():
+            digest = _checksum_digest(algorithm, data)
+            if base64.b64encode(digest).decode('ascii') != checksum:
+                raise MemoryStoreError(
+                    400, 'BadDigest', f'The {algorithm} checksum did not match the part.'
+                )
+            if algorithm == upload.checksum_algorithm:
+                checksum_digest = digest
+
+        etag = f'"{hashlib.md5(data).hexdigest()}"'
+        with self._lock:
+            upload.parts[part_number] = _Part(data, etag, checksum_digest)
+        return etag
+
+    def complete_upload(
+        self,
+        bucket_name: str,
+        object_key: str,
+        upload_id: str,
+        parts: Iterable[Tuple[int, str, Optional[str]]],
+    ) -> str:
+        """
+        Assemble the parts of an upload, and return the object's ETag.
+
+        Each part is given by its number, ETag, and checksum (if the upload has a checksum
+        algorithm), as reported by the client.
+        """
+        with self._lock:
+            upload = self._get_upload(bucket_name, object_key, upload_id)
+            selected_parts: List[_Part] = []
+            previous_part_number = 0
+            for part_number, etag, checksum in parts:
+                if part_number <= previous_part_number:
+                    raise MemoryStoreError(
+                        400, 'InvalidPartOrder', 'Parts must be in ascending order.'
+                    )
+                previous_part_number = part_number
+                part = upload.parts.get(part_number)
+                if part is None or part.etag.strip('"') != etag.strip('"'):
+                    raise MemoryStoreError(
+                        400, 'InvalidPart', f'Part {part_number} could not be found.'
+                    )
+                if part.checksum_digest is not None and checksum != base64.b64encode(
+                    part.checksum_digest
+                ).decode('ascii'):
+                    raise MemoryStoreError(
+                        400, 'InvalidPart', f'The checksum of part {part_number} did not match.'
+                    )
+                selected_parts.append(part)
+            if not selected_parts:
+                raise MemoryStoreError(400, 'MalformedXML', 'At least one part must be specified.')
+            if any(len(part.data) < mb(5) for part in selected_parts[:-1]):
+                raise MemoryStoreError(
+                    400, 'EntityTooSmall', 'Each part but the last must be at least 5 MiB.'
+                )
+
+            part_md5s = b''.join(bytes.fromhex(part.etag.strip('"')) for part in selected_parts)
+            obj = _Object(
+                data=b''.join(part.data for part in selected_parts),
+                etag=f'"{hashlib.md5(part_md5s).hexdigest()}-{len(selected_parts)}"',
+                content_type=upload.content_type,
+            )
+            if upload.checksum_algorithm is not None:
+                # As with S3, this is a checksum of the part checksums
+                part_digests = b''.join(
+                    part.checksum_digest for part in selected_parts if part.checksum_digest
+                )
+                digest = _checksum_digest(upload.checksum_algorithm, part_digests)
+                obj.checksum_algorithm = upload.checksum_algorithm
+                obj.checksum = f'{base64.b64encode(digest).decode("ascii")}-{len(selected_parts)}'
+            self._buckets[bucket_name][object_key] = obj
+            del self._uploads[upload_id]
+        self._notify('ObjectCreated:CompleteMultipartUpload', bucket_name, object_key, obj)
+        return obj.etag
+
+    # Lifecycle configuration
+
+    def get_lifecycle_rules(self, bucket_name: str) -> List[LifecycleRule]:
+        with self._lock:
+            return list(self._lifecycle_rules.get(bucket_name, []))
+
+    def put_lifecycle_rules(self, bucket_name: str, rules: List[LifecycleRule]) -> None:
+        with self._lock:
+            self._lifecycle_rules[bucket_name] = list(rules)
+
+    # Presigned requests
+
+    def _signature(self, method: str, bucket_name: str, object_key: str, params: Dict) -> str:
+        canonical_query = urlencode(sorted(params.items()))
+        message = f'{method}\n/{bucket_name}/{object_key}\n{canonical_query}'.encode()
+        return hmac.new(self._secret, message, hashlib.sha256).hexdigest()
+
+    def presign(
+        self,
+        method: str,
+        bucket_name: str,
+        object_key: str,
+        params: Optional[Dict[str, str]] = None,
+        expires_in: timedelta = _DEFAULT_EXPIRATION,
+    ) -> str:
+        """Return a URL, which permits a single type of request to be made to this store."""
+        if self.endpoint_url is None:
+            raise RuntimeError('The store must be served to presign URLs.')
+        params = {**(params or {}), 'Expires': str(int(time.time() + expires_in.total_seconds()))}
+        params['Signature'] = self._signature(method, bucket_name, object_key, params)
+        return f'{self.endpoint_url}/{quote(bucket_name)}/{quote(object_key)}?{urlencode(params)}'
+
+    def _verify(self, method: str, bucket_name: str, object_key: str, params: Dict) -> None:
+        params = dict(params)
+        signature = params.pop('Signature', '')
+        expected = self._signature(method, bucket_name, object_key, params)
+        if not hmac.compare_digest(signature, expected):
+            raise MemoryStoreError(
+                403, 'SignatureDoesNotMatch', 'The request signature does not match.'
+            )
+        if int(params.get('Expires', 0)) < time.time():
+            raise MemoryStoreError(403, 'AccessDenied', 'Request has expired.')
+
+    def __call__(self, environ: Dict[str, Any], start_response: Callable) -> Iterable[bytes]:
+        """Handle a presigned request, as a WSGI app."""
+        headers: List[Tuple[str, str]] = [
+            # Allow browser clients, from any origin, to read part ETags
+            ('Access-Control-Allow-Origin', '*'),
+            ('Access-Control-Expose-Headers', 'ETag'),
+        ]
+        method = environ['REQUEST_METHOD']
+        if method == 'OPTIONS':
+            headers += [
+                ('Access-Control-Allow-Methods', 'GET, HEAD, PUT, POST'),
+                ('Access-Control-Allow-Headers', '*'),
+            ]
+            start_response(_HTTP_STATUSES[204], headers)
+            return []
+
+        # WSGI decodes the path as Latin-1
+        path = environ.get('PATH_INFO', '').encode('latin-1').decode('utf-8')
+        bucket_name, _, object_key = path.lstrip('/').partition('/')
+        params = dict(parse_qsl(environ.get('QUERY_STRING', ''), keep_blank_values=True))
+        content_length = int(environ.get('CONTENT_LENGTH') or 0)
+        body = environ['wsgi.input'].read(content_length) if content_length else b''
+
+        try:
+            # A URL presigned for GET may also be used for HEAD
+            self._verify('GET' if method == 'HEAD' else method, bucket_name, object_key, params)
+            status, response_headers, response_body = self._handle(
+                method, bucket_name, object_key, params, environ, body
+            )
+        except MemoryStoreError as e:
+            status = e.status
+            response_headers = [('Content-Type', 'application/xml')]
+            response_body = (
+                f'<?xml version="1.0" encoding="UTF-8"?><Error><Code>{e.code}</Code>'
+                f'<Message>{xml_escape(e.message)}</Message></Error>'
+            ).encode()
+
+        headers += response_headers
+        headers.append(('Content-Length', str(len(response_body))))
+        start_response(_HTTP_STATUSES[status], headers)
+        return [] if method == 'HEAD' else [response_body]
+
+    def _handle(
+        self,
+        method: str,
+        bucket_name: str,
+        object_key: str,
+        params: Dict[str, str],
+        environ: Dict[str, Any],
+        body: bytes,
+    ) -> Tuple[int, List[Tuple[str, str]], bytes]:
+        if method == 'PUT' and 'uploadId' in params:
+            # As with S3, "x-amz-*" headers must be signed, which presigned URLs can only do as
+            # query parameters
+            if any(header.startswith('HTTP_X_AMZ_CHECKSUM_') for header in environ):
+                raise MemoryStoreError(
+                    403,
+                    'HeadersNotSigned',
+                    'There were headers present in the request which were not signed.',
+                )
+            checksums = {
+                param[len('x-amz-checksum-') :].upper(): value
+                for param, value in params.items()
+                if param.startswith('x-amz-checksum-')
+            }
+            try:
+                part_number = int(params.get('partNumber', 0))
+            except ValueError:
+                raise MemoryStoreError(400, 'InvalidArgument', 'Part number must be an integer.')
+            etag = self.upload_part(
+                bucket_name, object_key, params['uploadId'], part_number, body, checksums
+            )
+            return 200, [('ETag', etag)], b''
+
+        if method == 'POST' and 'uploadId' in params:
+            try:
+                root = ElementTree.fromstring(body)
+            except ElementTree.ParseError:
+                raise MemoryStoreError(400, 'MalformedXML', 'The XML is not well-formed.')
+            with self._lock:
+                checksum_algorithm = self._get_upload(
+                    bucket_name, object_key, params['uploadId']
+                ).checksum_algorithm
+            try:
+                parts = [
+                    (
+                        int(part.findtext(f'{{{_S3_NAMESPACE}}}PartNumber', '0')),
+                        part.findtext(f'{{{_S3_NAMESPACE}}}ETag', ''),
+                        (
+                            part.findtext(f'{{{_S3_NAMESPACE}}}Checksum{checksum_algorithm}')
+                            if checksum_algorithm
+                            else None
+                        ),
+                    )
+                    for part in root.iter(f'{{{_S3_NAMESPACE}}}Part')
+                ]
+            except ValueError:
+                raise MemoryStoreError(400, 'MalformedXML', 'The XML is not well-formed.')
+            etag = self.complete_upload(bucket_name, object_key, params['uploadId'], parts)
+            result = (
+                '<?xml version="1.0" encoding="UTF-8"?>'
+                f'<CompleteMultipartUploadResult xmlns="{_S3_NAMESPACE}">'
+                f'<Bucket>{xml_escape(bucket_name)}</Bucket><Key>{xml_escape(object_key)}</Key>'
+                f'<ETag>{xml_escape(etag)}</ETag></CompleteMultipartUploadResult>'
+            )
+            return 200, [('Content-Type', 'application/xml')], result.encode()
+
+        if method in ['GET', 'HEAD']:
+            obj = self.get_object(bucket_name, object_key)
+            headers = [
+                ('Content-Type', obj.content_type or 'binary/octet-stream'),
+                ('ETag', obj.etag),
+            ]
+            return 200, headers, obj.data
+
+        raise MemoryStoreError(405, 'MethodNotAllowed', 'The method is not allowed.')
+
+    @contextlib.contextmanager
+    def serve(self, host: str = '127.0.0.1', port: int = 0) -> Iterator[str]:
+        """Serve this store over HTTP, in a background thread, yielding its endpoint URL."""
+        server = make_server(
+            host, port, self, server_class=_ThreadingWSGIServer, handler_class=_QuietHandler
+        )
+        thread = threading.Thread(target=server.serve_forever, daemon=True)
+        thread.start()
+        self.endpoint_url = f'http://{host}:{server.server_port}'
+        try:
+            yield self.endpoint_url
+        finally:
+            self.endpoint_url = None
+            server.shutdown()
+            server.server_close()
+            thread.join()
+
+
+class _ThreadingWSGIServer(WSGIServer):
+    # Clients upload parts concurrently
+    daemon_threads = True
+
+    def process_request(self, request, client_address):
+        thread = threading.Thread(
+            target=self._process_request_thread, args=(request, client_address), daemon=True
+        )
+        thread.start()
+
+    def _process_request_thread(self, request, client_address):
+        try:
+            self.finish_request(request, client_address)
+        except Exception:
+            self.handle_error(request, client_address)
+        finally:
+            self.shutdown_request(request)
+
+
+class _QuietHandler(WSGIRequestHandler):
+    # Support keep-alive connections from clients
+    protocol_version = 'HTTP/1.1'
+
+    def log_message(self, format, *args):
+        pass
+
+
+# Used by MemoryStorage instances which are not given a store, e.g. by DEFAULT_FILE_STORAGE
+default_store = MemoryObjectStore()
+
+
+@deconstructible
+class MemoryStorage(Storage):
+    """A Storage, whose objects are kept in a MemoryObjectStore."""
+
+    def __init__(
+        self,
+        bucket_name: str = 's3ff',
+        store: Optional[MemoryObjectStore] = None,
+        url_expiration: timedelta = _DEFAULT_EXPIRATION,
+    ):
+        self.bucket_name = bucket_name
+        self.store = store if store is not None else default_store
+        self.url_expiration = url_expiration
+
+    def _open(self, name: str, mode: str = 'rb') -> File:
+        obj = self.store.get_object(self.bucket_name, name)
+        return File(io.BytesIO(obj.data), name=name)
+
+    def _save(self, name: str, content) -> str:
+        content.seek(0)
+        data = content.read()
+        if isinstance(data, str):
+            data = data.encode()
+        content_type = getattr(content, 'content_type', None) or mimetypes.guess_type(name)[0]
+        self.store.put_object(self.bucket_name, name, data, content_type)
+        return name
+
+    def get_available_name(self, name: str, max_length: Optional[int] = None) -> str:
+        # As with other object stores, existing objects are overwritten
+        return name
+
+    def delete(self, name: str) -> None:
+        self.store.delete_object(self.bucket_name, name)
+
+    def exists(self, name: str) -> bool:
+        try:
+            self.store.get_object(self.bucket_name, name)
+        except MemoryStoreError:
+            return False
+        return True
+
+    def listdir(self, path: str) -> Tuple[List[str], List[str]]:
+        prefix = f'{path.rstrip("/")}/' if path else ''
+        directories = set()
+        files = []
+        for key in self.store.list_keys(self.bucket_name, prefix):
+            directory, sep, file_name = key[len(prefix) :].partition('/')
+            if sep:
+                directories.add(directory)
+            else:
+                files.append(directory)
+        return sorted(directories), files
+
+    def size(self, name: str) -> int:
+        return len(self.store.get_object(self.bucket_name, name).data)
+
+    def url(self, name: Optional[str]) -> str:
+        return self.store.presign(
+            'GET', self.bucket_name, name or '', expires_in=self.url_expiration
+        )
+
+    def get_modified_time(self, name: str) -> datetime:
+        return self.store.get_object(self.bucket_name, name).modified
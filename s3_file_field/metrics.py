@@ -0,0 +1,236 @@
+"""
+Instrumentation of the upload API.
+
+Metrics are emitted to a sink, which is configured by the "S3FF_METRICS_SINK" setting, as either a
+MetricsSink instance or the dotted path of a MetricsSink subclass (which is instantiated with the
+keyword arguments in the "S3FF_METRICS_SINK_OPTIONS" setting). By default, metrics are discarded.
+
+The number of uploads in flight is the difference between the "uploads.initialized" and
+"uploads.finalized" + "uploads.failed" counters.
+"""
+
+from __future__ import annotations
+
+import bisect
+import functools
+import logging
+import socket
+import threading
+import time
+from typing import Any, Callable, Dict, List, Optional, Sequence, Set, Tuple, TypeVar, cast
+
+from django.conf import settings
+from django.core.signals import setting_changed
+from django.http import HttpRequest, HttpResponse, HttpResponseNotFound
+from django.utils.module_loading import import_string
+
+logger = logging.getLogger(__name__)
+
+Tags = Optional[Dict[str, str]]
+F = TypeVar('F', bound=Callable[..., Any])
+
+
+class MetricsSink:
+    """A destination for metrics, which discards everything."""
+
+    # Disabled sinks allow instrumentation to be skipped entirely
+    enabled = False
+
+    def increment(self, name: str, value: float = 1, tags: Tags = None) -> None:
+        """Add to a counter."""
+        pass
+
+    def observe(self, name: str, value: float, tags: Tags = None) -> None:
+        """Record a value in a histogram."""
+        pass
+
+    def timing(self, name: str, seconds: float, tags: Tags = None) -> None:
+        """Record a duration in a histogram."""
+        self.observe(name, seconds, tags)
+
+
+class LoggingMetricsSink(MetricsSink):
+    """Write each metric to the log, at DEBUG level."""
+
+    enabled = True
+
+    def increment(self, name: str, value: float = 1, tags: Tags = None) -> None:
+        logger.debug('counter %s %s %s', name, value, tags or {})
+
+    def observe(self, name: str, value: float, tags: Tags = None) -> None:
+        logger.debug('histogram %s %s %s', name, value, tags or {})
+
+    def timing(self, name: str, seconds: float, tags: Tags = None) -> None:
+        logger.debug('timing %s %.6fs %s', name, seconds, tags or {})
+
+
+class StatsdMetricsSink(MetricsSink):
+    """Send metrics to a StatsD server over UDP, with DogStatsD-style tags."""
+
+    enabled = True
+
+    def __init__(self, host: str = 'localhost', port: int = 8125, prefix: str = 's3ff'):
+        self.address = (host, port)
+        self.prefix = prefix
+        self._socket = socket.socket(socket.AF_INET, socket.SOCK_DGRAM)
+
+    def _send(self, name: str, value: str, metric_type: str, tags: Tags) -> None:
+        packet = f'{self.prefix}.{name}:{value}|{metric_type}'
+        if tags:
+            packet += '|#' + ','.join(f'{key}:{tag_value}' for key, tag_value in tags.items())
+        try:
+            self._socket.sendto(packet.encode(), self.address)
+        except OSError:
+            # Metrics should never break uploads
+            logger.debug('Failed to send metric to StatsD.', exc_info=True)
+
+    def increment(self, name: str, value: float = 1, tags: Tags = None) -> None:
+        self._send(name, f'{value:g}', 'c', tags)
+
+    def observe(self, name: str, value: float, tags: Tags = None) -> None:
+        self._send(name, f'{value:g}', 'h', tags)
+
+    def timing(self, name: str, seconds: float, tags: Tags = None) -> None:
+        self._send(name, f'{seconds * 1000:.3f}', 'ms', tags)
+
+
+def _escape_label(value: Any) -> str:
+    # Values (e.g. processor names) may contain any characters, which must not end the label
+    return str(value).replace('\\', '\\\\').replace('"', '\\"').replace('\n', '\\n')
+
+
+class PrometheusMetricsSink(MetricsSink):
+    """Aggregate metrics in-process, for scraping from "prometheus_metrics_view"."""
+
+    enabled = True
+
+    # Histogram buckets, by metric name suffix
+    duration_buckets = [0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10]
+    size_buckets = [2**10, 2**20, 2**24, 2**27, 2**30, 2**33, 2**36, 2**40]
+    count_buckets = [1, 2, 5, 10, 50, 100, 500, 1_000, 5_000, 10_000]
+
+    def __init__(self, namespace: str = 's3ff'):
+        self.namespace = namespace
+        self._lock = threading.Lock()
+        self._counters: Dict[Tuple[str, Tuple], float] = {}
+        # Each histogram is a list of bucket counts (including an overflow bucket), followed by the
+        # sum and total count
+        self._histograms: Dict[Tuple[str, Tuple], List[float]] = {}
+
+    def _buckets(self, name: str) -> Sequence[float]:
+        if name.endswith('file_size') or name.endswith('bytes'):
+            return self.size_buckets
+        if name.endswith('part_count'):
+            return self.count_buckets
+        return self.duration_buckets
+
+    def increment(self, name: str, value: float = 1, tags: Tags = None) -> None:
+        key = (name, tuple(sorted(tags.items())) if tags else ())
+        with self._lock:
+            self._counters[key] = self._counters.get(key, 0) + value
+
+    def observe(self, name: str, value: float, tags: Tags = None) -> None:
+        key = (name, tuple(sorted(tags.items())) if tags else ())
+        buckets = self._buckets(name)
+        with self._lock:
+            histogram = self._histograms.setdefault(key, [0.0] * (len(buckets) + 3))
+            histogram[bisect.bisect_left(buckets, value)] += 1
+            histogram[-2] += value
+            histogram[-1] += 1
+
+    def _metric_name(self, name: str) -> str:
+        return f'{self.namespace}_{name}'.replace('.', '_')
+
+    @staticmethod
+    def _labels(tags: Tuple, **extra: str) -> str:
+        pairs = [*tags, *extra.items()]
+        if not pairs:
+            return ''
+        return '{' + ','.join(f'{key}="{_escape_label(value)}"' for key, value in pairs) + '}'
+
+    def render(self) -> str:
+        """Return all metrics in the Prometheus text exposition format."""
+        lines: List[str] = []
+        typed_names: Set[str] = set()
+
+        def add_type(metric_name: str, metric_type: str) -> None:
+            # Each metric may have several sets of labels, but must only be typed once
+            if metric_name not in typed_names:
+                typed_names.add(metric_name)
+                lines.append(f'# TYPE {metric_name} {metric_type}')
+
+        with self._lock:
+            counters = dict(self._counters)
+            histograms = {key: list(value) for key, value in self._histograms.items()}
+
+        for (name, tags), value in sorted(counters.items()):
+            metric_name = self._metric_name(name) + '_total'
+            add_type(metric_name, 'counter')
+            lines.append(f'{metric_name}{self._labels(tags)} {value:g}')
+
+        for (name, tags), histogram in sorted(histograms.items()):
+            metric_name = self._metric_name(name)
+            buckets = self._buckets(name)
+            add_type(metric_name, 'histogram')
+            cumulative = 0.0
+            bounds = [f'{bound:g}' for bound in buckets] + ['+Inf']
+            for bound_label, count in zip(bounds, histogram):
+                cumulative += count
+                bucket_labels = self._labels(tags, le=bound_label)
+                lines.append(f'{metric_name}_bucket{bucket_labels} {cumulative:g}')
+            lines.append(f'{metric_name}_sum{self._labels(tags)} {histogram[-2]:g}')
+            lines.append(f'{metric_name}_count{self._labels(tags)} {histogram[-1]:g}')
+
+        return '\n'.join(lines) + '\n'
+
+
+@functools.lru_cache(maxsize=1)
+def get_sink() -> MetricsSink:
+    """Return the configured metrics sink."""
+    sink = getattr(settings, 'S3FF_METRICS_SINK', None)
+    if sink is None:
+        return MetricsSink()
+    if isinstance(sink, str):
+        sink_class = import_string(sink)
+        sink = sink_class(**getattr(settings, 'S3FF_METRICS_SINK_OPTIONS', {}))
+    return sink
+
+
+def _reset_sink(*, setting: str, **kwargs) -> None:
+    if setting.startswith('S3FF_METRICS_SINK'):
+        get_sink.cache_clear()
+
+
+setting_changed.connect(_reset_sink)
+
+
+def timed(name: str, tags: Tags = None) -> Callable[[F], F]:
+    """Decorate a function, to record the duration of each call."""
+
+    def decorator(func: F) -> F:
+        @functools.wraps(func)
+        def wrapper(*args, **kwargs):
+            sink = get_sink()
+            if not sink.enabled:
+                return func(*args, **kwargs)
+            start = time.perf_counter()
+            try:
+                return func(*args, **kwargs)
+            finally:
+                sink.timing(name, time.perf_counter() - start, tags)
+
+        return cast(F, wrapper)
+
+    return decorator
+
+
+def prometheus_metrics_view(request: HttpRequest) -> HttpResponse:
+    """
+    Export metrics for scraping by Prometheus.
+
+    This view must be added to a URLconf explicitly, and only works with a PrometheusMetricsSink.
+    """
+    sink = get_sink()
+    if not isinstance(sink, PrometheusMetricsSink):
+        return HttpResponseNotFound('Prometheus metrics are not enabled.')
+    return HttpResponse(sink.render(), content_type='text/plain; version=0.0.4; charset=utf-8')
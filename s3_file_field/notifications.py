@@ -0,0 +1,91 @@
+"""
+Confirmation of uploads from the object store's bucket notifications.
+
+Finalizing an upload normally confirms that the object exists, and reads its size, with a HEAD
+request. Instead, if the "S3FF_NOTIFICATIONS" setting is True, the "s3:ObjectCreated:*" event
+notifications of an S3 or MinIO bucket may be ingested, to record the size and ETag of each object
+as it is created; finalization then uses that record, if one has been received, and only falls back
+to a HEAD request if it has not.
+
+Notifications may be delivered to the "notifications" view (by a MinIO webhook target, or an SNS
+HTTPS subscription), which requires the "S3FF_NOTIFICATION_TOKEN" setting, sent by the notifier as
+its "Authorization" header. Alternatively, a consumer of a queue (e.g. SQS) may pass each message
+to ingest. Records are stored in the cache configured by the "S3FF_NOTIFICATION_CACHE" setting (by
+default, "default"), for "S3FF_NOTIFICATION_TIMEOUT" seconds (by default, as long as an upload may
+take to finalize); ideally, this cache is shared by all processes.
+"""
+
+import hashlib
+import json
+from typing import Any, Dict, Optional
+from urllib.parse import unquote_plus
+
+from django.conf import settings
+from django.core.cache import caches
+from django.core.files.storage import Storage
+
+from ._multipart import MultipartManager, ObjectMetadata
+
+
+def enabled() -> bool:
+    return getattr(settings, 'S3FF_NOTIFICATIONS', False)
+
+
+def _confirmation_key(bucket_name: str, object_key: str) -> str:
+    # Object keys may contain characters which are invalid in some cache backends' keys
+    return 's3ff:confirmation:' + hashlib.sha256(f'{bucket_name}/{object_key}'.encode()).hexdigest()
+
+
+def _get_cache():
+    return caches[getattr(settings, 'S3FF_NOTIFICATION_CACHE', 'default')]
+
+
+def get_confirmation(storage: Storage, object_key: str) -> Optional[ObjectMetadata]:
+    """Return the metadata of an object, if a notification of its creation has been received."""
+    bucket_name = getattr(storage, 'bucket_name', None)
+    if not enabled() or bucket_name is None:
+        return None
+    return _get_cache().get(_confirmation_key(bucket_name, object_key))
+
+
+def _ingest_record(record: Dict[str, Any]) -> bool:
+    # Event names are prefixed with "s3:" in bucket configurations, but not always in records
+    event_name = record['eventName']
+    event_name = event_name[len('s3:') :] if event_name.startswith('s3:') else event_name
+    bucket_name = record['s3']['bucket']['name']
+    # Keys are URL-encoded, with spaces as "+"
+    object_key = unquote_plus(record['s3']['object']['key'])
+    cache_key = _confirmation_key(bucket_name, object_key)
+
+    if event_name.startswith('ObjectCreated:'):
+        metadata = ObjectMetadata(
+            size=int(record['s3']['object']['size']),
+            etag=record['s3']['object'].get('eTag'),
+        )
+        timeout = getattr(
+            settings,
+            'S3FF_NOTIFICATION_TIMEOUT',
+            MultipartManager._url_expiration.total_seconds(),
+        )
+        _get_cache().set(cache_key, metadata, timeout)
+    elif event_name.startswith('ObjectRemoved:'):
+        _get_cache().delete(cache_key)
+    else:
+        return False
+    return True
+
+
+def ingest(notification: Dict[str, Any]) -> int:
+    """
+    Record the objects created or removed in a bucket notification, returning how many there were.
+
+    Notifications may be in the format sent by S3 or MinIO, or wrapped in an SNS message. Other
+    events (e.g. the "s3:TestEvent" sent when notifications are configured) are ignored. Raise
+    ValueError if the notification is malformed.
+    """
+    try:
+        if notification.get('Type') == 'Notification':
+            notification = json.loads(notification['Message'])
+        return sum(_ingest_record(record) for record in notification.get('Records', []))
+    except (AttributeError, KeyError, TypeError, ValueError) as e:
+        raise ValueError(f'Malformed bucket notification: {e!r}.') from e
@@ -0,0 +1,323 @@
+"""
+Processing of uploaded files, after their uploads are finalized.
+
+Each S3FileField may be given a sequence of "processors" (e.g. to sniff content types, extract
+metadata or scan for viruses). Once an upload is finalized, the pipeline of its field's processors
+is scheduled to run after the response, by the scheduler configured by the "S3FF_PIPELINE_SCHEDULER"
+setting, as either a Scheduler instance or the dotted path of a Scheduler subclass (which is
+instantiated with the keyword arguments in the "S3FF_PIPELINE_SCHEDULER_OPTIONS" setting). By
+default, pipelines run in a background thread pool. To run them on a task queue instead, a
+Scheduler may enqueue a task which calls run_pipeline with the same (serializable) arguments.
+
+Processors are called in order, with a StoredObject, which reads only the ranges of the object
+which are requested. The result of each processor must be serializable; results are stored, by
+processor name, in the cache configured by the "S3FF_PIPELINE_CACHE" setting (by default,
+"default"), and may be read with get_results or from the field's "processing_results". Since
+pipelines run in other threads or processes, this cache must be shared by all processes, and must
+not evict entries (e.g. a database cache, or Redis without an eviction policy). Results are kept
+until the file is deleted through its FieldFile (or clear_results is called).
+
+The pipeline of an object is only scheduled once, however many times its upload is finalized: it
+is not scheduled again once its results are stored, and the object is claimed until its pipeline
+finishes (or for at most "S3FF_PIPELINE_CLAIM_TIMEOUT" seconds, by default 1 hour, in case its
+process exits). If a pipeline fails before storing its results, it is scheduled again by the next
+finalization; rerun schedules it again regardless.
+
+Each stage is timed as "pipeline.stage" (tagged with the field and processor) and traced as a span.
+"""
+
+from __future__ import annotations
+
+from concurrent.futures import ThreadPoolExecutor
+import functools
+import hashlib
+import logging
+import threading
+import time
+from typing import TYPE_CHECKING, Any, Callable, Dict, Optional, Union
+
+from django.conf import settings
+from django.core.cache import caches
+from django.core.cache.backends.base import BaseCache
+from django.core.signals import setting_changed
+from django.db import connections
+from django.utils.module_loading import import_string
+
+from . import _registry, metrics, tracing
+from ._multipart import MultipartManager, ObjectMetadata
+from .sharding import resolve_storage
+
+if TYPE_CHECKING:
+    # Avoid circular imports
+    from .fields import S3FileField
+
+logger = logging.getLogger(__name__)
+
+
+class StoredObject:
+    """An uploaded object, whose content is read in ranges, as processors request it."""
+
+    def __init__(
+        self,
+        field: S3FileField,
+        object_key: str,
+        metadata: ObjectMetadata,
+        manager: MultipartManager,
+    ):
+        self.field = field
+        self.object_key = object_key
+        self.metadata = metadata
+        self._manager = manager
+        # The longest prefix of the object read so far, which most processors share
+        self._head = b''
+        self.bytes_read = 0
+        # The results of earlier processors, by name
+        self.results: Dict[str, Any] = {}
+
+    @property
+    def size(self) -> int:
+        return self.metadata.size
+
+    def read(self, offset: int = 0, length: Optional[int] = None) -> bytes:
+        """Return up to "length" bytes (by default, all remaining bytes) from "offset"."""
+        end = self.size if length is None else min(offset + length, self.size)
+        if offset >= end:
+            return b''
+        if end <= len(self._head):
+            return self._head[offset:end]
+        data = self._manager.read_object_range(self.object_key, offset, end - offset)
+        self.bytes_read += len(data)
+        if offset == 0:
+            self._head = data
+        return data
+
+    def head(self, length: int) -> bytes:
+        """Return up to the first "length" bytes."""
+        return self.read(0, length)
+
+
+class Processor:
+    """
+    A stage of a pipeline.
+
+    Any callable which accepts a StoredObject may be used as a processor; its result is stored under
+    its "name" attribute, if it has one, or else its "__name__".
+    """
+
+    name = ''
+
+    def __call__(self, stored_object: StoredObject) -> Any:
+        raise NotImplementedError
+
+
+ProcessorCallable = Union[Processor, Callable[[StoredObject], Any]]
+
+
+def get_processor_name(processor: ProcessorCallable) -> str:
+    return getattr(processor, 'name', '') or getattr(
+        processor, '__name__', type(processor).__name__
+    )
+
+
+class ContentTypeSniffer(Processor):
+    """Identify the content type of an object by its leading bytes, regardless of its name."""
+
+    name = 'content_type'
+
+    # Content types, by their signature bytes and the offset of those bytes
+    SIGNATURES = [
+        (0, b'\x89PNG\r\n\x1a\n', 'image/png'),
+        (0, b'\xff\xd8\xff', 'image/jpeg'),
+        (0, b'GIF87a', 'image/gif'),
+        (0, b'GIF89a', 'image/gif'),
+        (0, b'%PDF-', 'application/pdf'),
+        (0, b'PK\x03\x04', 'application/zip'),
+        (0, b'\x1f\x8b', 'application/gzip'),
+        (0, b'II*\x00', 'image/tiff'),
+        (0, b'MM\x00*', 'image/tiff'),
+        (128, b'DICM', 'application/dicom'),
+    ]
+
+    def __call__(self, stored_object: StoredObject) -> Optional[str]:
+        head = stored_object.head(max(offset + len(magic) for offset, magic, _ in self.SIGNATURES))
+        for offset, magic, content_type in self.SIGNATURES:
+            if head[offset : offset + len(magic)] == magic:
+                return content_type
+        if head[:4] == b'RIFF' and head[8:12] == b'WEBP':
+            return 'image/webp'
+        return None
+
+
+def _results_key(object_key: str) -> str:
+    # Object keys may contain characters which are invalid in some cache backends' keys
+    return f's3ff:results:{hashlib.sha256(object_key.encode()).hexdigest()}'
+
+
+def _scheduled_key(object_key: str) -> str:
+    return f's3ff:scheduled:{hashlib.sha256(object_key.encode()).hexdigest()}'
+
+
+def get_cache() -> BaseCache:
+    """Return the cache in which results are stored."""
+    return caches[getattr(settings, 'S3FF_PIPELINE_CACHE', 'default')]
+
+
+def get_results(object_key: str) -> Dict[str, Any]:
+    """Return the stored results of processing an object, by processor name."""
+    return get_cache().get(_results_key(object_key), {})
+
+
+def _store_results(object_key: str, results: Dict[str, Any]) -> None:
+    # Results describe the object, so should persist as long as it does
+    get_cache().set(_results_key(object_key), results, None)
+
+
+def clear_results(object_key: str) -> None:
+    """Remove the stored results of processing an object, e.g. once it has been deleted."""
+    get_cache().delete_many([_results_key(object_key), _scheduled_key(object_key)])
+
+
+def run_pipeline(field_id: str, object_key: str) -> Dict[str, Any]:
+    """
+    Run the processors of a field on an uploaded object, storing and returning their results.
+
+    Exceptions raised by processors are logged, and their results are omitted.
+    """
+    field = _registry.get_field(field_id)
+    if not field.processors:
+        return {}
+    try:
+        manager = MultipartManager.from_storage(resolve_storage(field.storage, object_key))
+        stored_object = StoredObject(
+            field, object_key, manager.get_object_metadata(object_key), manager
+        )
+
+        sink = metrics.get_sink()
+        with tracing.span(
+            's3ff.pipeline', attributes={'s3ff.field_id': field_id, 's3ff.object_key': object_key}
+        ):
+            for processor in field.processors:
+                name = get_processor_name(processor)
+                tags = {'field': field.id, 'processor': name}
+                start = time.perf_counter()
+                try:
+                    with tracing.span(f's3ff.pipeline.{name}'):
+                        stored_object.results[name] = processor(stored_object)
+                except Exception:
+                    logger.exception('Error in processor "%s" of %s.', name, field.id)
+                    sink.increment('pipeline.stage_failed', tags=tags)
+                finally:
+                    sink.timing('pipeline.stage', time.perf_counter() - start, tags)
+        sink.increment('pipeline.bytes_read', stored_object.bytes_read, tags={'field': field.id})
+
+        _store_results(object_key, stored_object.results)
+        return stored_object.results
+    finally:
+        # Once stored, the results record that the pipeline has run; if it failed, it may be
+        # scheduled again
+        get_cache().delete(_scheduled_key(object_key))
+
+
+class Scheduler:
+    """Run the pipelines of uploaded objects."""
+
+    def schedule(self, field_id: str, object_key: str) -> None:
+        """Arrange for run_pipeline to be called, without delaying the caller."""
+        raise NotImplementedError
+
+
+class ImmediateScheduler(Scheduler):
+    """Run pipelines synchronously, which is mostly useful for tests."""
+
+    def schedule(self, field_id: str, object_key: str) -> None:
+        run_pipeline(field_id, object_key)
+
+
+class ThreadPoolScheduler(Scheduler):
+    """Run pipelines in a background thread pool."""
+
+    def __init__(self, max_workers: int = 4):
+        self.max_workers = max_workers
+        self._executor: Optional[ThreadPoolExecutor] = None
+        self._lock = threading.Lock()
+
+    def _run(self, field_id: str, object_key: str) -> None:
+        try:
+            run_pipeline(field_id, object_key)
+        except Exception:
+            logger.exception('Error in pipeline of %s, for "%s".', field_id, object_key)
+        finally:
+            # Processors may have opened database connections, which belong to this worker thread
+            connections.close_all()
+
+    def schedule(self, field_id: str, object_key: str) -> None:
+        with self._lock:
+            if self._executor is None:
+                self._executor = ThreadPoolExecutor(
+                    max_workers=self.max_workers, thread_name_prefix='s3ff-pipeline'
+                )
+            self._executor.submit(self._run, field_id, object_key)
+
+    def shutdown(self) -> None:
+        """Wait for all scheduled pipelines to finish."""
+        with self._lock:
+            executor, self._executor = self._executor, None
+        if executor is not None:
+            executor.shutdown(wait=True)
+
+
+@functools.lru_cache(maxsize=1)
+def get_scheduler() -> Scheduler:
+    """Return the configured scheduler."""
+    scheduler = getattr(settings, 'S3FF_PIPELINE_SCHEDULER', None)
+    if scheduler is None:
+        return ThreadPoolScheduler()
+    if isinstance(scheduler, str):
+        scheduler_class = import_string(scheduler)
+        scheduler = scheduler_class(**getattr(settings, 'S3FF_PIPELINE_SCHEDULER_OPTIONS', {}))
+    return scheduler
+
+
+def _reset_scheduler(*, setting: str, **kwargs) -> None:
+    if setting.startswith('S3FF_PIPELINE_SCHEDULER'):
+        get_scheduler.cache_clear()
+
+
+setting_changed.connect(_reset_scheduler)
+
+
+def schedule(field: S3FileField, object_key: str) -> bool:
+    """
+    Schedule the pipeline of a field, if it has any processors.
+
+    Return whether it was scheduled; it is not, if it was already scheduled for the object.
+    """
+    if not field.processors or _results_key(object_key) in get_cache():
+        return False
+    return _claim_and_schedule(field, object_key)
+
+
+def rerun(field: S3FileField, object_key: str) -> bool:
+    """
+    Schedule the pipeline of a field again, even if it has already run for the object.
+
+    Return whether it was scheduled; it is not, if the field has no processors.
+    """
+    if not field.processors:
+        return False
+    get_cache().delete(_scheduled_key(object_key))
+    return _claim_and_schedule(field, object_key)
+
+
+def _claim_and_schedule(field: S3FileField, object_key: str) -> bool:
+    # Finalization may be repeated (e.g. by a retrying client), so claim the object atomically
+    scheduled_key = _scheduled_key(object_key)
+    claim_timeout = getattr(settings, 'S3FF_PIPELINE_CLAIM_TIMEOUT', 60 * 60)
+    if not get_cache().add(scheduled_key, True, claim_timeout):
+        return False
+    try:
+        get_scheduler().schedule(field.id, object_key)
+    except BaseException:
+        get_cache().delete(scheduled_key)
+        raise
+    return True
@@ -0,0 +1,92 @@
+from __future__ import annotations
+
+from dataclasses import dataclass
+from datetime import timedelta
+import math
+from typing import TYPE_CHECKING, Optional
+
+from s3_file_field._sizes import gb, mb
+
+if TYPE_CHECKING:
+    # Avoid circular imports
+    from .fields import S3FileField
+
+DEFAULT_PART_SIZE = mb(64)
+DEFAULT_TARGET_PART_DURATION = timedelta(seconds=30)
+
+
+@dataclass(frozen=True)
+class ClientHints:
+    """Capabilities declared by an upload client, which may inform how an upload is planned."""
+
+    # The expected upload bandwidth, in bytes per second
+    bandwidth: Optional[int] = None
+    # The number of parts which will be uploaded concurrently
+    concurrency: Optional[int] = None
+
+
+class PartSizePlanner:
+    """
+    Choose the part size of a multipart upload.
+
+    The chosen part size is only a preference; it will be adjusted as necessary to conform to S3's
+    limits on part size and part count.
+    """
+
+    def __call__(
+        self, file_size: int, field: Optional[S3FileField], hints: ClientHints
+    ) -> Optional[int]:
+        """Return the preferred part size, or None to use the default."""
+        raise NotImplementedError
+
+
+class FixedPartSizePlanner(PartSizePlanner):
+    """Always use the same part size."""
+
+    def __init__(self, part_size: Optional[int] = None):
+        self.part_size = part_size
+
+    def __call__(
+        self, file_size: int, field: Optional[S3FileField], hints: ClientHints
+    ) -> Optional[int]:
+        return self.part_size
+
+
+class AdaptivePartSizePlanner(PartSizePlanner):
+    """
+    Choose a part size based on the file size and the client's declared capabilities.
+
+    Large files are split into large parts, so the number of requests remains small. Clients which
+    declare a low bandwidth receive smaller parts, so a failed part is cheaper to retry. Clients
+    which declare concurrency receive enough parts to keep each of their connections busy.
+    """
+
+    def __init__(
+        self,
+        *,
+        default_part_size: int = DEFAULT_PART_SIZE,
+        preferred_max_part_count: int = 1_000,
+        target_part_duration: timedelta = DEFAULT_TARGET_PART_DURATION,
+    ):
+        self.default_part_size = default_part_size
+        self.preferred_max_part_count = preferred_max_part_count
+        self.target_part_duration = target_part_duration
+
+    def __call__(
+        self, file_size: int, field: Optional[S3FileField], hints: ClientHints
+    ) -> Optional[int]:
+        part_size = max(
+            self.default_part_size, math.ceil(file_size / self.preferred_max_part_count)
+        )
+
+        if hints.bandwidth is not None:
+            part_size = min(
+                part_size, int(hints.bandwidth * self.target_part_duration.total_seconds())
+            )
+
+        if hints.concurrency is not None:
+            # Give each connection at least a couple of parts, so the work is well balanced
+            part_size = min(part_size, math.ceil(file_size / (hints.concurrency * 2)))
+
+        # Round up to a whole MiB, which is friendlier to clients' read buffers
+        return min(math.ceil(part_size / mb(1)) * mb(1), gb(5))
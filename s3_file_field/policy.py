@@ -0,0 +1,101 @@
+from __future__ import annotations
+
+from dataclasses import dataclass
+import fnmatch
+import posixpath
+from typing import Optional, Sequence
+
+from django.core.exceptions import ValidationError
+from django.template.defaultfilters import filesizeformat
+
+
+@dataclass(frozen=True)
+class UploadPolicy:
+    """
+    Restrictions on the files which may be uploaded to an S3FileField.
+
+    The policy is checked when an upload is initialized, before any request is made to the object
+    store. The size of the uploaded object is checked again when the upload is finalized.
+
+    Subclasses may override "validate" to implement additional checks.
+    """
+
+    min_size: Optional[int] = None
+    max_size: Optional[int] = None
+    # Content type patterns, which may contain wildcards (e.g. "image/*")
+    allowed_content_types: Optional[Sequence[str]] = None
+    # File name extensions, with or without a leading "."
+    allowed_extensions: Optional[Sequence[str]] = None
+    # The preferred part size for multipart uploads; this is still subject to S3's limits
+    part_size: Optional[int] = None
+
+    def validate(self, file_name: str, file_size: int, content_type: Optional[str]) -> None:
+        """Raise a ValidationError if a file may not be uploaded."""
+        self.validate_size(file_size)
+        self.validate_file_name(file_name)
+        self.validate_content_type(content_type)
+
+    def validate_size(self, file_size: int) -> None:
+        if self.min_size is not None and file_size < self.min_size:
+            raise ValidationError(
+                {
+                    'file_size': ValidationError(
+                        'File must be at least %(min_size)s.',
+                        code='file_too_small',
+                        params={'min_size': filesizeformat(self.min_size)},
+                    )
+                }
+            )
+        if self.max_size is not None and file_size > self.max_size:
+            raise ValidationError(
+                {
+                    'file_size': ValidationError(
+                        'File must be at most %(max_size)s.',
+                        code='file_too_large',
+                        params={'max_size': filesizeformat(self.max_size)},
+                    )
+                }
+            )
+
+    def validate_file_name(self, file_name: str) -> None:
+        if self.allowed_extensions is None:
+            return
+        extension = posixpath.splitext(file_name)[1].lstrip('.').lower()
+        allowed_extensions = {
+            allowed_extension.lstrip('.').lower() for allowed_extension in self.allowed_extensions
+        }
+        if extension not in allowed_extensions:
+            raise ValidationError(
+                {
+                    'file_name': ValidationError(
+                        'File extension "%(extension)s" is not allowed.',
+                        code='invalid_extension',
+                        params={'extension': extension},
+                    )
+                }
+            )
+
+    def validate_content_type(self, content_type: Optional[str]) -> None:
+        if self.allowed_content_types is None:
+            return
+        if content_type is None:
+            raise ValidationError(
+                {
+                    'content_type': ValidationError(
+                        'A content type is required.', code='content_type_required'
+                    )
+                }
+            )
+        if not any(
+            fnmatch.fnmatchcase(content_type.lower(), allowed_content_type.lower())
+            for allowed_content_type in self.allowed_content_types
+        ):
+            raise ValidationError(
+                {
+                    'content_type': ValidationError(
+                        'Content type "%(content_type)s" is not allowed.',
+                        code='invalid_content_type',
+                        params={'content_type': content_type},
+                    )
+                }
+            )
@@ -0,0 +1,94 @@
+"""
+Concurrent prefetching of the metadata of objects stored in S3FileFields.
+
+Reading the size of each of a page of files would otherwise make a blocking request to the object
+store for each, in series. Instead, the metadata of all of them may be fetched at once, in one
+concurrent burst of requests (of up to "S3FF_METADATA_MAX_WORKERS" at a time), and cached on each
+FieldFile:
+    resources = Resource.objects.prefetch_s3_metadata('blob')[:100]
+or, for model instances which have already been loaded:
+    prefetch_s3_metadata(resources, 'blob')
+
+To add the "prefetch_s3_metadata" method to a model's QuerySets, use S3FileQuerySet as its manager:
+    objects = S3FileQuerySet.as_manager()
+"""
+
+from __future__ import annotations
+
+from typing import Dict, Iterable, List, Tuple
+
+from django.db import models
+
+from ._multipart import MultipartManager, ObjectMetadata, UnsupportedStorageError
+from .fields import S3FieldFile, S3FileField
+from .sharding import group_by_storage
+
+
+def prefetch_s3_metadata(instances: Iterable[models.Model], *field_names: str) -> None:
+    """Fetch and cache the metadata of the objects stored in S3FileFields of model instances."""
+    instances = list(instances)
+    if not instances:
+        return
+    for field_name in field_names:
+        field = instances[0]._meta.get_field(field_name)
+        if not isinstance(field, S3FileField):
+            raise TypeError(f'"{field_name}" is not an S3FileField.')
+
+        # Uncommitted files have not been stored yet
+        field_files: List[S3FieldFile] = [
+            field_file
+            for field_file in (getattr(instance, field_name) for instance in instances)
+            if field_file and field_file._committed
+        ]
+        object_keys = {field_file.name for field_file in field_files if field_file.name}
+        metadata: Dict[str, ObjectMetadata] = {}
+        for storage, storage_object_keys in group_by_storage(field.storage, object_keys):
+            try:
+                manager = MultipartManager.from_storage(storage)
+            except UnsupportedStorageError:
+                # The metadata of these objects is read as usual, when it is accessed
+                continue
+            metadata.update(manager.get_objects_metadata(storage_object_keys))
+
+        for field_file in field_files:
+            if field_file.name in metadata:
+                field_file._s3ff_metadata = (field_file.name, metadata[field_file.name])
+
+
+class S3FileQuerySet(models.QuerySet):
+    """A QuerySet which may prefetch the metadata of objects stored in S3FileFields."""
+
+    def __init__(self, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        self._s3ff_prefetch_fields: Tuple[str, ...] = ()
+        self._s3ff_prefetch_done = False
+
+    def prefetch_s3_metadata(self, *field_names: str) -> S3FileQuerySet:
+        """
+        Return a new QuerySet, which prefetches the metadata of objects in fields when evaluated.
+
+        As with prefetch_related, the metadata is not prefetched if the QuerySet is evaluated with
+        iterator().
+        """
+        clone = self._chain()  # type: ignore[attr-defined]
+        clone._s3ff_prefetch_fields = (*self._s3ff_prefetch_fields, *field_names)
+        return clone
+
+    def _clone(self):
+        clone = super()._clone()
+        clone._s3ff_prefetch_fields = self._s3ff_prefetch_fields
+        return clone
+
+    def _fetch_all(self) -> None:
+        super()._fetch_all()
+        if self._s3ff_prefetch_fields and not self._s3ff_prefetch_done:
+            # Querysets of values() yield dicts or tuples, which have no files
+            prefetch_s3_metadata(
+                [
+                    instance
+                    for instance in self._result_cache or []
+                    if isinstance(instance, models.Model)
+                ],
+                *self._s3ff_prefetch_fields,
+            )
+            self._s3ff_prefetch_done = True
@@ -0,0 +1,89 @@
+"""
+Routing of uploads to the storage nearest to each client.
+
+An S3FileField with "storage_regions" has a storage in each of several regions (implemented as a
+ShardedStorage, with each region's name as its alias). Each upload is routed to a region when it is
+initialized, using the first available of these hints:
+* The "X-S3FF-Region" header of the initialization request, naming a region.
+* The "region_latencies" of the initialization request, as measured by the client (in milliseconds,
+  for any of the regions); the region with the lowest latency is chosen.
+* The result of the "S3FF_REGION_RESOLVER" setting, which may be a callable or its dotted path.
+  It is called with the request, and returns the name of a region or None (e.g. by a GeoIP lookup
+  of the client's address).
+Otherwise, uploads are routed to the first region.
+
+Since the region is the first component of the object key, all subsequent requests for the upload
+(and reads of the stored object) are made to the same region's storage.
+"""
+
+from __future__ import annotations
+
+import functools
+from typing import TYPE_CHECKING, Callable, Mapping, Optional, cast
+
+from django.conf import settings
+from django.core.signals import setting_changed
+from django.http import HttpRequest
+from django.utils.module_loading import import_string
+
+from .sharding import ShardedStorage
+
+if TYPE_CHECKING:
+    # Avoid circular imports
+    from .fields import S3FileField
+
+REGION_HEADER = 'X-S3FF-Region'
+
+RegionResolver = Callable[[HttpRequest], Optional[str]]
+
+
+@functools.lru_cache(maxsize=1)
+def get_region_resolver() -> Optional[RegionResolver]:
+    """Return the configured region resolver, if any."""
+    resolver = getattr(settings, 'S3FF_REGION_RESOLVER', None)
+    if isinstance(resolver, str):
+        resolver = import_string(resolver)
+    return resolver
+
+
+def _reset_resolver(*, setting: str, **kwargs) -> None:
+    if setting == 'S3FF_REGION_RESOLVER':
+        get_region_resolver.cache_clear()
+
+
+setting_changed.connect(_reset_resolver)
+
+
+def select_region(
+    field: S3FileField,
+    request: HttpRequest,
+    latencies: Optional[Mapping[str, float]] = None,
+) -> Optional[str]:
+    """Return the region to which an upload should be routed, or None if there is no preference."""
+    if not field.routes_regions:
+        return None
+    regions = cast(ShardedStorage, field.storage).shards
+
+    region = request.headers.get(REGION_HEADER)
+    if region in regions:
+        return region
+
+    if latencies:
+        known_latencies = {region: latencies[region] for region in latencies if region in regions}
+        if known_latencies:
+            return min(known_latencies, key=known_latencies.__getitem__)
+
+    resolver = get_region_resolver()
+    if resolver is not None:
+        region = resolver(request)
+        if region in regions:
+            return region
+
+    return None
+
+
+def route(field: S3FileField, object_key: str, region: Optional[str]) -> str:
+    """Return the object key of a new upload, routed to a region."""
+    if region is None:
+        return object_key
+    return cast(ShardedStorage, field.storage).reassign(object_key, region)
@@ -1,16 +1,90 @@
-from typing import Union
+from typing import Any, Dict, Iterable, List, Optional, Union
 
+from django.core.exceptions import FieldDoesNotExist
 from django.core.files import File
+from django.core.files.storage import Storage, default_storage
+from django.db.models import FileField
 from rest_framework.fields import FileField as FileSerializerField
+from rest_framework.serializers import ListSerializer
 
+from s3_file_field._multipart import MultipartManager, UnsupportedStorageError
+from s3_file_field.sharding import group_by_storage
 from s3_file_field.widgets import S3PlaceholderFile
 
 
+def _get_object_sizes(storage: Storage, object_keys: Iterable[str]) -> Dict[str, int]:
+    sizes: Dict[str, int] = {}
+    # Objects in a sharded storage must be looked up in the shard which contains each
+    for concrete_storage, keys in group_by_storage(storage, object_keys):
+        try:
+            manager = MultipartManager.from_storage(concrete_storage)
+        except UnsupportedStorageError:
+            # Other storages can still be asked about each object
+            sizes.update(
+                {key: concrete_storage.size(key) for key in keys if concrete_storage.exists(key)}
+            )
+        else:
+            sizes.update(manager.get_object_sizes(keys))
+    return sizes
+
+
 class S3FileSerializerField(FileSerializerField):
+    """
+    A serializer field for the signed field_value of a completed upload.
+
+    If "verify" is True, the uploaded object must also exist, with the size it was uploaded with.
+    It is looked up in "storage", or by default the storage of the model field the serializer field
+    is bound to.
+    """
+
     default_error_messages = {
         'invalid': 'Not a valid signed S3 upload. Ensure that the S3 upload flow is correct.',
+        'missing': 'The uploaded file does not exist.',
+        'size_mismatch': 'The uploaded file has changed since it was uploaded.',
     }
 
+    def __init__(self, *args, verify: bool = False, storage: Optional[Storage] = None, **kwargs):
+        self.verify = verify
+        self.storage = storage
+        # Set by S3FileListSerializer, while it validates many values at once
+        self._bulk_files: Dict[str, Optional[S3PlaceholderFile]] = {}
+        self._bulk_sizes: Dict[str, int] = {}
+        super().__init__(*args, **kwargs)
+
+    def get_storage(self) -> Storage:
+        if self.storage is not None:
+            return self.storage
+        model = getattr(getattr(self.parent, 'Meta', None), 'model', None)
+        if model is not None:
+            try:
+                model_field = model._meta.get_field(self.source)
+            except FieldDoesNotExist:
+                pass
+            else:
+                if isinstance(model_field, FileField):
+                    return model_field.storage
+        return default_storage
+
+    def prepare_bulk(self, field_values: Iterable[str]) -> None:
+        """Decode, and verify if required, many field values at once, before each is validated."""
+        self._bulk_files = {
+            field_value: S3PlaceholderFile.from_field(field_value)
+            for field_value in set(field_values)
+        }
+        if self.verify:
+            self._bulk_sizes = _get_object_sizes(
+                self.get_storage(),
+                {
+                    file_object.name
+                    for file_object in self._bulk_files.values()
+                    if file_object is not None and file_object.name
+                },
+            )
+
+    def clear_bulk(self) -> None:
+        self._bulk_files = {}
+        self._bulk_sizes = {}
+
     def to_internal_value(self, data: Union[str, File]) -> str:  # type: ignore[override]
         if isinstance(data, File):
             # Although the parser may allow submission of an inline file, S3FF should refuse to
@@ -18,8 +92,12 @@ class S3FileSerializerField(FileSerializerField):
             # API callers shouldn't be rewarded for submitting inline files.
             self.fail('invalid')
 
-        # Check the signature and load an S3PlaceholderFile
-        file_object = S3PlaceholderFile.from_field(data)
+        # Check the signature and load an S3PlaceholderFile, unless it was already loaded in bulk
+        bulk = data in self._bulk_files
+        if bulk:
+            file_object = self._bulk_files[data]
+        else:
+            file_object = S3PlaceholderFile.from_field(data)
         if file_object is None:
             self.fail('invalid')
 
@@ -27,8 +105,48 @@ class S3FileSerializerField(FileSerializerField):
         super().to_internal_value(file_object)
         assert file_object.name
 
+        if self.verify:
+            if bulk:
+                sizes = self._bulk_sizes
+            else:
+                sizes = _get_object_sizes(self.get_storage(), [file_object.name])
+            if file_object.name not in sizes:
+                self.fail('missing')
+            if sizes[file_object.name] != file_object.size:
+                self.fail('size_mismatch')
+
         # fields.S3FileField.save_form_data is not called by DRF, so the same behavior must be
         # implemented here
         internal_value = file_object.name
 
         return internal_value
+
+
+class S3FileListSerializer(ListSerializer):
+    """
+    A ListSerializer which validates the S3FileSerializerField values of all its items at once.
+
+    Signatures are decoded in a single pass, and (if the field verifies uploads) the uploaded
+    objects are looked up together, rather than once per item. Use it as the
+    "list_serializer_class" of a serializer's Meta.
+    """
+
+    def to_internal_value(self, data: Any) -> List[Any]:
+        s3_fields = [
+            field
+            for field in getattr(self.child, 'fields', {}).values()
+            if isinstance(field, S3FileSerializerField) and not field.read_only
+        ]
+        try:
+            if isinstance(data, list):
+                for field in s3_fields:
+                    field_values = [
+                        field.get_value(item) for item in data if isinstance(item, dict)
+                    ]
+                    field.prepare_bulk(
+                        field_value for field_value in field_values if isinstance(field_value, str)
+                    )
+            return super().to_internal_value(data)
+        finally:
+            for field in s3_fields:
+                field.clear_bulk()
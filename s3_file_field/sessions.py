@@ -0,0 +1,255 @@
+"""
+Records of in-flight uploads.
+
+By default, the server keeps no record of an upload between requests. A session store may be
+configured by the "S3FF_SESSION_STORE" setting, as either a SessionStore instance or the dotted path
+of a SessionStore subclass (which is instantiated with the keyword arguments in the
+"S3FF_SESSION_STORE_OPTIONS" setting). Sessions are recorded when an upload is initialized, and
+updated when it is completed, finalized or aborted.
+
+An upload which has not progressed within "S3FF_SESSION_STALLED_AFTER" (by default, the lifetime of
+its presigned URLs) is considered stalled. Stalled uploads do not count towards the
+"S3FF_MAX_CONCURRENT_UPLOADS_PER_USER" limit.
+"""
+
+from __future__ import annotations
+
+from datetime import timedelta
+import functools
+import time
+from typing import TYPE_CHECKING, Any, Dict, List, Optional, Tuple, cast
+import uuid
+
+from django.conf import settings
+from django.contrib.auth import get_user_model
+from django.core.cache import caches
+from django.core.signals import setting_changed
+from django.db import transaction
+from django.utils import timezone
+from django.utils.module_loading import import_string
+
+from ._multipart import MultipartManager
+
+if TYPE_CHECKING:
+    from django.contrib.auth.base_user import AbstractBaseUser
+
+# These mirror UploadSession.Status, which can't be imported until apps are loaded
+INITIALIZED = 'initialized'
+COMPLETED = 'completed'
+FINALIZED = 'finalized'
+ABORTED = 'aborted'
+
+
+def get_stalled_after() -> timedelta:
+    return getattr(settings, 'S3FF_SESSION_STALLED_AFTER', MultipartManager._url_expiration)
+
+
+class UploadLimitExceededError(Exception):
+    """The user already has the maximum number of uploads in flight."""
+
+
+class SessionStore:
+    """A store of upload sessions, which records nothing."""
+
+    # Disabled stores allow session bookkeeping to be skipped entirely
+    enabled = False
+
+    def create(
+        self,
+        *,
+        field_id: str,
+        object_key: str,
+        upload_id: str,
+        file_size: int,
+        part_count: int,
+        user: Optional[AbstractBaseUser],
+        max_in_flight: Optional[int] = None,
+    ) -> Optional[str]:
+        """
+        Record a newly initialized upload, returning the ID of its session.
+
+        Raise UploadLimitExceededError if the user already has "max_in_flight" uploads in flight.
+        """
+        return None
+
+    def set_status(self, session_id: str, status: str) -> None:
+        """Record the progress of an upload."""
+        pass
+
+    def count_in_flight(self, user: AbstractBaseUser) -> int:
+        """Return the number of the user's uploads which are in flight, but not stalled."""
+        return 0
+
+
+class DatabaseSessionStore(SessionStore):
+    """
+    Store sessions as UploadSession models, which are visible in the Django admin.
+
+    This requires "s3_file_field.upload_sessions" (and "django.contrib.auth") to be installed.
+    """
+
+    enabled = True
+
+    def create(
+        self,
+        *,
+        field_id: str,
+        object_key: str,
+        upload_id: str,
+        file_size: int,
+        part_count: int,
+        user: Optional[AbstractBaseUser],
+        max_in_flight: Optional[int] = None,
+    ) -> Optional[str]:
+        from .upload_sessions.models import UploadSession
+
+        with transaction.atomic():
+            if user is not None and max_in_flight is not None:
+                # Lock the user's row, so concurrent initializations by the same user can't both
+                # be counted before either is created
+                list(get_user_model().objects.select_for_update().filter(pk=user.pk).values('pk'))
+                if self._in_flight(user).count() >= max_in_flight:
+                    raise UploadLimitExceededError()
+            session = UploadSession.objects.create(
+                field_id=field_id,
+                object_key=object_key,
+                upload_id=upload_id,
+                file_size=file_size,
+                part_count=part_count,
+                # The user model is swappable
+                user=cast(Any, user),
+            )
+        return str(session.id)
+
+    def set_status(self, session_id: str, status: str) -> None:
+        from .upload_sessions.models import UploadSession
+
+        # update() does not set "auto_now" fields
+        UploadSession.objects.filter(id=session_id).update(status=status, modified=timezone.now())
+
+    def _in_flight(self, user: AbstractBaseUser):
+        from .upload_sessions.models import UploadSession
+
+        return UploadSession.objects.filter(
+            user=cast(Any, user),
+            status__in=UploadSession.IN_FLIGHT_STATUSES,
+            modified__gte=timezone.now() - get_stalled_after(),
+        )
+
+    def count_in_flight(self, user: AbstractBaseUser) -> int:
+        return self._in_flight(user).count()
+
+
+class CacheSessionStore(SessionStore):
+    """
+    Store sessions in a Django cache.
+
+    Sessions expire from the cache once they stall, and are removed once they are finalized or
+    aborted. Since cache updates are not atomic, per-user counts (and so limits) are approximate
+    under concurrent initializations by the same user; DatabaseSessionStore enforces limits exactly.
+    """
+
+    enabled = True
+
+    def __init__(self, cache_alias: str = 'default', key_prefix: str = 's3ff'):
+        self.cache_alias = cache_alias
+        self.key_prefix = key_prefix
+
+    @property
+    def cache(self):
+        return caches[self.cache_alias]
+
+    def _session_key(self, session_id: str) -> str:
+        return f'{self.key_prefix}:session:{session_id}'
+
+    def _user_key(self, user_pk: Any) -> str:
+        return f'{self.key_prefix}:user:{user_pk}'
+
+    def _get_user_sessions(self, user_pk: Any) -> List[Tuple[str, float]]:
+        # Each entry is a session ID and the time at which it will stall
+        now = time.time()
+        return [
+            (session_id, stalls_at)
+            for session_id, stalls_at in self.cache.get(self._user_key(user_pk), [])
+            if stalls_at > now
+        ]
+
+    def create(
+        self,
+        *,
+        field_id: str,
+        object_key: str,
+        upload_id: str,
+        file_size: int,
+        part_count: int,
+        user: Optional[AbstractBaseUser],
+        max_in_flight: Optional[int] = None,
+    ) -> Optional[str]:
+        if (
+            user is not None
+            and max_in_flight is not None
+            and self.count_in_flight(user) >= max_in_flight
+        ):
+            raise UploadLimitExceededError()
+        session_id = uuid.uuid4().hex
+        timeout = get_stalled_after().total_seconds()
+        session: Dict[str, Any] = {
+            'field_id': field_id,
+            'object_key': object_key,
+            'upload_id': upload_id,
+            'file_size': file_size,
+            'part_count': part_count,
+            'user_pk': user.pk if user is not None else None,
+            'status': INITIALIZED,
+        }
+        self.cache.set(self._session_key(session_id), session, timeout)
+        if user is not None:
+            user_sessions = self._get_user_sessions(user.pk)
+            user_sessions.append((session_id, time.time() + timeout))
+            self.cache.set(self._user_key(user.pk), user_sessions, timeout)
+        return session_id
+
+    def set_status(self, session_id: str, status: str) -> None:
+        session = self.cache.get(self._session_key(session_id))
+        if session is None:
+            return
+        timeout = get_stalled_after().total_seconds()
+        if status in [FINALIZED, ABORTED]:
+            self.cache.delete(self._session_key(session_id))
+        else:
+            session['status'] = status
+            self.cache.set(self._session_key(session_id), session, timeout)
+
+        if session['user_pk'] is not None:
+            user_sessions = [
+                (user_session_id, stalls_at)
+                for user_session_id, stalls_at in self._get_user_sessions(session['user_pk'])
+                if user_session_id != session_id
+            ]
+            if status not in [FINALIZED, ABORTED]:
+                # Progress resets the time until the session stalls
+                user_sessions.append((session_id, time.time() + timeout))
+            self.cache.set(self._user_key(session['user_pk']), user_sessions, timeout)
+
+    def count_in_flight(self, user: AbstractBaseUser) -> int:
+        return len(self._get_user_sessions(user.pk))
+
+
+@functools.lru_cache(maxsize=1)
+def get_session_store() -> SessionStore:
+    """Return the configured session store."""
+    store = getattr(settings, 'S3FF_SESSION_STORE', None)
+    if store is None:
+        return SessionStore()
+    if isinstance(store, str):
+        store_class = import_string(store)
+        store = store_class(**getattr(settings, 'S3FF_SESSION_STORE_OPTIONS', {}))
+    return store
+
+
+def _reset_store(*, setting: str, **kwargs) -> None:
+    if setting.startswith('S3FF_SESSION_STORE'):
+        get_session_store.cache_clear()
+
+
+setting_changed.connect(_reset_store)
@@ -0,0 +1,207 @@
+"""
+Distribution of uploads across several storages, and across key prefixes within a storage.
+
+Object stores limit the request rate for each key prefix (and, ultimately, each bucket). A
+ShardedStorage spreads new objects across several "shard" storages, each identified by an alias.
+The alias is the first component of each object's name (e.g. "b/6a1c.../file.txt" is stored in the
+"b" shard, with that same key), so the shard of an existing object is resolved from its name alone,
+and no additional state needs to be stored.
+
+Within a single storage, HashedPrefix may be used as an "upload_to" to spread object keys across
+prefixes.
+"""
+
+from __future__ import annotations
+
+from datetime import datetime
+import hashlib
+import os
+import posixpath
+from typing import (
+    Any,
+    Callable,
+    Dict,
+    Iterable,
+    Iterator,
+    List,
+    Mapping,
+    Optional,
+    Sequence,
+    Tuple,
+    Union,
+    cast,
+)
+from uuid import uuid4
+
+from django.core.files.storage import Storage
+from django.utils.deconstruct import deconstructible
+
+# Return the alias of the shard in which a new object should be stored, given its name
+ShardSelector = Callable[[str], str]
+
+
+def hash_selector(aliases: Sequence[str]) -> ShardSelector:
+    """Return a selector, which uniformly distributes names across shards."""
+
+    def selector(name: str) -> str:
+        digest = hashlib.sha256(name.encode()).digest()
+        return aliases[int.from_bytes(digest[:8], 'big') % len(aliases)]
+
+    return selector
+
+
+@deconstructible
+class ShardedStorage(Storage):
+    """
+    A storage which routes each object to one of several shard storages.
+
+    "shards" may be a mapping of aliases to storages, or a sequence of storages (which are
+    aliased by their index). New objects are assigned to a shard by "selector" (by default, a hash
+    of their name). Names which do not begin with a known alias (e.g. those stored before sharding
+    was enabled) are resolved to the "default" shard, if given.
+    """
+
+    def __init__(
+        self,
+        shards: Union[Mapping[str, Storage], Sequence[Storage]],
+        selector: Optional[ShardSelector] = None,
+        default: Optional[str] = None,
+    ):
+        if isinstance(shards, Mapping):
+            self.shards: Dict[str, Storage] = dict(shards)
+        else:
+            self.shards = {str(index): storage for index, storage in enumerate(shards)}
+        if not self.shards:
+            raise ValueError('At least one shard must be specified.')
+        for alias in self.shards:
+            if not alias or '/' in alias:
+                raise ValueError(f'Invalid shard alias "{alias}".')
+        if default is not None and default not in self.shards:
+            raise ValueError(f'Unknown default shard "{default}".')
+        self.selector = selector if selector is not None else hash_selector(list(self.shards))
+        self.default = default
+
+    def split(self, name: str) -> Tuple[str, Storage]:
+        """Return the alias and storage of the shard which contains a name."""
+        alias = name.partition('/')[0]
+        if alias in self.shards:
+            return alias, self.shards[alias]
+        if self.default is not None:
+            return self.default, self.shards[self.default]
+        raise ValueError(f'Name "{name}" does not belong to any shard.')
+
+    def get_shard(self, name: str) -> Storage:
+        """Return the storage of the shard which contains a name."""
+        return self.split(name)[1]
+
+    def generate_filename(self, filename: Union[str, os.PathLike]) -> str:
+        filename = super().generate_filename(filename)
+        return self.assign(filename, self.selector(filename))
+
+    def assign(self, filename: str, alias: str) -> str:
+        """Return the name of a new object in a specific shard."""
+        if alias not in self.shards:
+            raise ValueError(f'Unknown shard "{alias}".')
+        return f'{alias}/{self.shards[alias].generate_filename(filename)}'
+
+    def reassign(self, name: str, alias: str) -> str:
+        """Return the name of a new object, moved from its current shard to another."""
+        current_alias = name.partition('/')[0]
+        if current_alias in self.shards:
+            name = name[len(current_alias) + 1 :]
+        return self.assign(name, alias)
+
+    def get_available_name(self, name: str, max_length: Optional[int] = None) -> str:
+        return self.get_shard(name).get_available_name(name, max_length=max_length)
+
+    def _open(self, name: str, mode: str = 'rb'):
+        return self.get_shard(name).open(name, mode)
+
+    def _save(self, name: str, content) -> str:
+        return self.get_shard(name).save(name, content)
+
+    def delete(self, name: str) -> None:
+        self.get_shard(name).delete(name)
+
+    def exists(self, name: str) -> bool:
+        return self.get_shard(name).exists(name)
+
+    def listdir(self, path: str) -> Tuple[List[str], List[str]]:
+        if path.strip('/') == '':
+            return list(self.shards), []
+        return self.get_shard(path).listdir(path)
+
+    def size(self, name: str) -> int:
+        return self.get_shard(name).size(name)
+
+    def url(self, name: Optional[str]) -> str:
+        return self.get_shard(cast(str, name)).url(name)
+
+    def get_accessed_time(self, name: str) -> datetime:
+        return self.get_shard(name).get_accessed_time(name)
+
+    def get_created_time(self, name: str) -> datetime:
+        return self.get_shard(name).get_created_time(name)
+
+    def get_modified_time(self, name: str) -> datetime:
+        return self.get_shard(name).get_modified_time(name)
+
+
+def resolve_storage(storage: Storage, name: str) -> Storage:
+    """Return the storage which actually contains a name."""
+    if isinstance(storage, ShardedStorage):
+        return storage.get_shard(name)
+    return storage
+
+
+def group_by_storage(storage: Storage, names: Iterable[str]) -> List[Tuple[Storage, List[str]]]:
+    """
+    Group names by the storage which actually contains each.
+
+    Names which do not belong to any shard are omitted.
+    """
+    groups: List[Tuple[Storage, List[str]]] = []
+    for name in names:
+        try:
+            concrete_storage = resolve_storage(storage, name)
+        except ValueError:
+            continue
+        for group_storage, group_names in groups:
+            if group_storage is concrete_storage:
+                group_names.append(name)
+                break
+        else:
+            groups.append((concrete_storage, [name]))
+    return groups
+
+
+def iter_concrete_storages(storage: Storage) -> Iterator[Tuple[str, Storage]]:
+    """Iterate over the key prefix and storage of each shard of a storage."""
+    if isinstance(storage, ShardedStorage):
+        for alias, shard in storage.shards.items():
+            yield f'{alias}/', shard
+    else:
+        yield '', storage
+
+
+@deconstructible
+class HashedPrefix:
+    """
+    An "upload_to" which prefixes each object key with a short hash.
+
+    By default, keys are "<hash>/<uuid>/<filename>". If "upload_to" is given (as a string or
+    callable, in the same form as for a FileField), the key it generates is prefixed instead.
+    """
+
+    def __init__(self, upload_to: Union[str, Callable[[Any, str], str], None] = None, length=4):
+        self.upload_to = upload_to
+        self.length = length
+
+    def __call__(self, instance: Any, filename: str) -> str:
+        if self.upload_to is None:
+            key = f'{uuid4()}/{filename}'
+        elif callable(self.upload_to):
+            key = self.upload_to(instance, filename)
+        else:
+            key = posixpath.join(datetime.now().strftime(self.upload_to), filename)
+        return f'{hashlib.sha256(key.encode()).hexdigest()[:self.length]}/{key}'
@@ -1,4 +1,85 @@
+"""
+Signals sent during the lifecycle of an upload.
+
+Each signal is sent with the model class which owns the S3FileField as its sender, and with the
+following keyword arguments:
+* "field": the S3FileField being uploaded to
+* "object_key": the key of the uploaded object
+* "file_size": the size of the file, in bytes
+* "duration": the server-side time spent handling the request, in seconds
+
+The prepare and complete signals also include "part_count", the number of parts in the upload. The
+abort signal also includes "reason", a short code describing why the upload was abandoned.
+
+If the "S3FF_ASYNC_SIGNALS" setting is True, receivers are run in a background thread pool (of
+"S3FF_ASYNC_SIGNALS_MAX_WORKERS" threads), so they never delay the response to the client. They
+are submitted once the current database transaction (if any) commits, so they observe its changes,
+and are never run for changes which were rolled back. Exceptions raised by asynchronous receivers
+are logged, instead of being propagated.
+"""
+
+from __future__ import annotations
+
+from concurrent.futures import ThreadPoolExecutor
+import logging
+import threading
+from typing import Any, Dict, Optional
+
+from django.conf import settings
+from django.db import connections, transaction
 import django.dispatch
 
+logger = logging.getLogger(__name__)
+
 s3_file_field_upload_prepare = django.dispatch.Signal()
+s3_file_field_upload_complete = django.dispatch.Signal()
 s3_file_field_upload_finalize = django.dispatch.Signal()
+s3_file_field_upload_abort = django.dispatch.Signal()
+
+_executor: Optional[ThreadPoolExecutor] = None
+_executor_lock = threading.Lock()
+
+
+def _get_executor() -> ThreadPoolExecutor:
+    global _executor
+    with _executor_lock:
+        if _executor is None:
+            _executor = ThreadPoolExecutor(
+                max_workers=getattr(settings, 'S3FF_ASYNC_SIGNALS_MAX_WORKERS', 4),
+                thread_name_prefix='s3ff-signals',
+            )
+        return _executor
+
+
+def _send_robust(signal: django.dispatch.Signal, sender: Any, kwargs: Dict[str, Any]) -> None:
+    try:
+        for receiver, response in signal.send_robust(sender=sender, **kwargs):
+            if isinstance(response, Exception):
+                logger.error(
+                    'Error in asynchronous receiver %r.',
+                    receiver,
+                    exc_info=(type(response), response, response.__traceback__),
+                )
+    finally:
+        # Receivers may have opened database connections, which belong to this worker thread
+        connections.close_all()
+
+
+def send(signal: django.dispatch.Signal, sender: Any, **kwargs: Any) -> None:
+    """Send a signal, asynchronously if configured to do so."""
+    if not signal.has_listeners(sender):
+        return
+    if getattr(settings, 'S3FF_ASYNC_SIGNALS', False):
+        # Outside of a transaction, this is called immediately
+        transaction.on_commit(lambda: _get_executor().submit(_send_robust, signal, sender, kwargs))
+    else:
+        signal.send(sender=sender, **kwargs)
+
+
+def shutdown() -> None:
+    """Wait for all asynchronously sent signals to be received."""
+    global _executor
+    with _executor_lock:
+        executor, _executor = _executor, None
+    if executor is not None:
+        executor.shutdown(wait=True)
@@ -0,0 +1,129 @@
+"""
+Tracing of the upload lifecycle.
+
+If the "opentelemetry-api" package is installed, spans are emitted for each upload view and for each
+request made to the object store. Otherwise, tracing is a no-op.
+
+A single upload spans several Django requests, which are correlated in two ways:
+* Each upload is assigned a correlation ID, which is recorded on the span of each upload view as
+  the "s3ff.correlation_id" attribute. Clients may choose the ID, by sending it in the
+  "X-S3FF-Correlation-ID" header of their initialization request.
+* The trace context of the initialization request is carried in the upload signature, so spans for
+  later requests of the same upload are linked to it (or are made children of it, if the later
+  request is not already part of another trace).
+"""
+
+from __future__ import annotations
+
+import contextlib
+import functools
+import re
+from typing import Any, Callable, Dict, Iterator, Optional, TypeVar, cast
+import uuid
+
+try:
+    from opentelemetry import propagate, trace
+except ImportError:
+    propagate = None  # type: ignore[assignment]
+    trace = None  # type: ignore[assignment]
+
+CORRELATION_ID_HEADER = 'X-S3FF-Correlation-ID'
+# Don't allow clients to inject arbitrary content into signatures and traces
+_CORRELATION_ID_RE = re.compile(r'[A-Za-z0-9._-]{1,64}')
+
+Attributes = Optional[Dict[str, Any]]
+F = TypeVar('F', bound=Callable[..., Any])
+
+
+def get_correlation_id(headers: Any) -> str:
+    """Return the correlation ID requested by a client, or generate a new one."""
+    correlation_id = headers.get(CORRELATION_ID_HEADER)
+    if correlation_id and _CORRELATION_ID_RE.fullmatch(correlation_id):
+        return correlation_id
+    return uuid.uuid4().hex
+
+
+def get_trace_context() -> Optional[Dict[str, str]]:
+    """Return the serialized context of the current span, or None if there is no active trace."""
+    if propagate is None:
+        return None
+    carrier: Dict[str, str] = {}
+    propagate.inject(carrier)
+    return carrier or None
+
+
+@contextlib.contextmanager
+def span(
+    name: str, attributes: Attributes = None, trace_context: Optional[Dict[str, str]] = None
+) -> Iterator[Any]:
+    """
+    Run a block within a new span, which is yielded (or None, if tracing is unavailable).
+
+    If given, the span is related to the serialized "trace_context" from an earlier request.
+    """
+    if trace is None:
+        yield None
+        return
+
+    tracer = trace.get_tracer('s3_file_field')
+    parent_context = None
+    links = []
+    if trace_context:
+        origin = trace.get_current_span(propagate.extract(trace_context)).get_span_context()
+        if origin.is_valid:
+            if trace.get_current_span().get_span_context().is_valid:
+                # This request is already being traced, so it can only refer to the upload's trace
+                links.append(trace.Link(origin))
+            else:
+                parent_context = propagate.extract(trace_context)
+
+    with tracer.start_as_current_span(
+        name, context=parent_context, attributes=attributes, links=links
+    ) as current_span:
+        yield current_span
+
+
+def traced(name: str, attributes: Attributes = None) -> Callable[[F], F]:
+    """Decorate a function, to run each call within a new span."""
+
+    def decorator(func: F) -> F:
+        if trace is None:
+            return func
+
+        @functools.wraps(func)
+        def wrapper(*args, **kwargs):
+            with span(name, attributes):
+                return func(*args, **kwargs)
+
+        return cast(F, wrapper)
+
+    return decorator
+
+
+def record_part_timings(parts: Any) -> None:
+    """Record the part transfer timings reported by a client on the current span."""
+    if trace is None:
+        return
+    current_span = trace.get_current_span()
+    if not current_span.is_recording():
+        return
+    durations = [part.duration for part in parts if part.duration is not None]
+    if not durations:
+        return
+
+    current_span.set_attributes(
+        {
+            's3ff.part_duration_max': max(durations),
+            's3ff.part_duration_total': sum(durations),
+        }
+    )
+    for part in parts:
+        if part.duration is not None:
+            current_span.add_event(
+                's3ff.part_transferred',
+                {
+                    's3ff.part_number': part.part_number,
+                    's3ff.part_size': part.size,
+                    's3ff.part_duration': part.duration,
+                },
+            )
@@ -0,0 +1,107 @@
+import logging
+import time
+
+from django.contrib import admin, messages
+from django.db.models import QuerySet
+from django.http import HttpRequest
+from django.utils import timezone
+
+from .. import _registry, signals
+from .._multipart import MultipartManager
+from ..sessions import get_stalled_after
+from ..sharding import resolve_storage
+from .models import UploadSession
+
+logger = logging.getLogger(__name__)
+
+
+class StalledListFilter(admin.SimpleListFilter):
+    title = 'progress'
+    parameter_name = 'progress'
+
+    def lookups(self, request, model_admin):
+        return [('in_flight', 'In flight'), ('stalled', 'Stalled')]
+
+    def queryset(self, request, queryset):
+        stalled_before = timezone.now() - get_stalled_after()
+        in_flight = queryset.filter(status__in=UploadSession.IN_FLIGHT_STATUSES)
+        if self.value() == 'in_flight':
+            return in_flight.filter(modified__gte=stalled_before)
+        if self.value() == 'stalled':
+            return in_flight.filter(modified__lt=stalled_before)
+        return queryset
+
+
+@admin.register(UploadSession)
+class UploadSessionAdmin(admin.ModelAdmin):
+    list_display = [
+        'object_key',
+        'field_id',
+        'user',
+        'file_size',
+        'part_count',
+        'status',
+        'is_stalled',
+        'created',
+        'modified',
+    ]
+    list_filter = [StalledListFilter, 'status', 'field_id']
+    search_fields = ['object_key', 'upload_id']
+    date_hierarchy = 'created'
+    actions = ['abort_uploads']
+
+    def has_add_permission(self, request: HttpRequest) -> bool:
+        return False
+
+    def has_change_permission(self, request: HttpRequest, obj=None) -> bool:
+        # Sessions are only modified by uploads, but changing them is required to abort them
+        return obj is None and super().has_change_permission(request, obj)
+
+    @admin.display(boolean=True, description='Stalled')
+    def is_stalled(self, session: UploadSession) -> bool:
+        return (
+            session.status in UploadSession.IN_FLIGHT_STATUSES
+            and session.modified < timezone.now() - get_stalled_after()
+        )
+
+    @admin.action(description='Abort selected uploads', permissions=['change'])
+    def abort_uploads(self, request: HttpRequest, queryset: QuerySet[UploadSession]) -> None:
+        aborted = 0
+        for session in queryset.filter(status__in=UploadSession.IN_FLIGHT_STATUSES):
+            start = time.perf_counter()
+            try:
+                field = _registry.get_field(session.field_id)
+            except KeyError:
+                self.message_user(
+                    request, f'Unknown field "{session.field_id}" for {session}.', messages.ERROR
+                )
+                continue
+
+            try:
+                MultipartManager.from_storage(
+                    resolve_storage(field.storage, session.object_key)
+                )._abort_upload_id(session.object_key, session.upload_id)
+            except Exception:
+                # A completed upload may have already been assembled by the object store
+                if session.status != UploadSession.Status.COMPLETED:
+                    logger.exception('Failed to abort upload %s.', session.upload_id)
+                    self.message_user(request, f'Failed to abort {session}.', messages.ERROR)
+                    continue
+            if session.status == UploadSession.Status.COMPLETED:
+                # The object was never finalized, so nothing can reference it
+                field.storage.delete(session.object_key)
+
+            session.status = UploadSession.Status.ABORTED
+            session.save(update_fields=['status', 'modified'])
+            signals.send(
+                signals.s3_file_field_upload_abort,
+                sender=field.model,
+                field=field,
+                object_key=session.object_key,
+                file_size=session.file_size,
+                reason='admin',
+                duration=time.perf_counter() - start,
+            )
+            aborted += 1
+
+        self.message_user(request, f'Aborted {aborted} upload(s).', messages.SUCCESS)
@@ -0,0 +1,7 @@
+from django.apps import AppConfig
+
+
+class UploadSessionsConfig(AppConfig):
+    name = 's3_file_field.upload_sessions'
+    label = 's3ff_upload_sessions'
+    verbose_name = 'S3 File Field upload sessions'
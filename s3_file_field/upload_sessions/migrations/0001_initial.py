@@ -0,0 +1,68 @@
+# Generated by Django 4.1.13 on 2026-10-19 12:45
+
+import uuid
+
+from django.conf import settings
+from django.db import migrations, models
+import django.db.models.deletion
+
+
+class Migration(migrations.Migration):
+
+    initial = True
+
+    dependencies = [
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='UploadSession',
+            fields=[
+                (
+                    'id',
+                    models.UUIDField(
+                        default=uuid.uuid4, editable=False, primary_key=True, serialize=False
+                    ),
+                ),
+                ('field_id', models.CharField(max_length=255)),
+                ('object_key', models.CharField(max_length=2000)),
+                ('upload_id', models.CharField(max_length=2000)),
+                ('file_size', models.PositiveBigIntegerField()),
+                ('part_count', models.PositiveIntegerField()),
+                (
+                    'status',
+                    models.CharField(
+                        choices=[
+                            ('initialized', 'Initialized'),
+                            ('completed', 'Completed'),
+                            ('finalized', 'Finalized'),
+                            ('aborted', 'Aborted'),
+                        ],
+                        default='initialized',
+                        max_length=16,
+                    ),
+                ),
+                ('created', models.DateTimeField(auto_now_add=True)),
+                ('modified', models.DateTimeField(auto_now=True)),
+                (
+                    'user',
+                    models.ForeignKey(
+                        blank=True,
+                        null=True,
+                        on_delete=django.db.models.deletion.SET_NULL,
+                        related_name='+',
+                        to=settings.AUTH_USER_MODEL,
+                    ),
+                ),
+            ],
+        ),
+        migrations.AddIndex(
+            model_name='uploadsession',
+            index=models.Index(fields=['status', 'modified'], name='s3ff_upload_status_3a8208_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='uploadsession',
+            index=models.Index(fields=['user', 'status'], name='s3ff_upload_user_id_4039a0_idx'),
+        ),
+    ]
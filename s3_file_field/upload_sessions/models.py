@@ -0,0 +1,43 @@
+import uuid
+
+from django.conf import settings
+from django.db import models
+
+
+class UploadSession(models.Model):
+    """A record of a multipart upload, used by the DatabaseSessionStore."""
+
+    class Status(models.TextChoices):
+        INITIALIZED = 'initialized'
+        COMPLETED = 'completed'
+        FINALIZED = 'finalized'
+        ABORTED = 'aborted'
+
+    # Statuses of uploads which may still have incomplete multipart data in the object store
+    IN_FLIGHT_STATUSES = [Status.INITIALIZED, Status.COMPLETED]
+
+    id = models.UUIDField(primary_key=True, default=uuid.uuid4, editable=False)
+    field_id = models.CharField(max_length=255)
+    object_key = models.CharField(max_length=2000)
+    upload_id = models.CharField(max_length=2000)
+    file_size = models.PositiveBigIntegerField()
+    part_count = models.PositiveIntegerField()
+    user = models.ForeignKey(
+        settings.AUTH_USER_MODEL,
+        null=True,
+        blank=True,
+        on_delete=models.SET_NULL,
+        related_name='+',
+    )
+    status = models.CharField(max_length=16, choices=Status.choices, default=Status.INITIALIZED)
+    created = models.DateTimeField(auto_now_add=True)
+    modified = models.DateTimeField(auto_now=True)
+
+    class Meta:
+        indexes = [
+            models.Index(fields=['status', 'modified']),
+            models.Index(fields=['user', 'status']),
+        ]
+
+    def __str__(self) -> str:
+        return self.object_key
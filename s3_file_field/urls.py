@@ -1,15 +1,30 @@
 from django.urls import path
 
-from .views import finalize, upload_complete, upload_initialize
+from .views import (
+    bucket_notifications,
+    filesystem_upload,
+    finalize,
+    upload_abort,
+    upload_complete,
+    upload_initialize,
+    upload_part_url,
+)
 
 app_name = 's3_file_field'
 
 urlpatterns = [
     path('upload-initialize/', upload_initialize, name='upload-initialize'),
+    # Signs the checksum of each part, for uploads with checksums
+    path('upload-part-url/', upload_part_url, name='upload-part-url'),
     path(
         'upload-complete/',
         upload_complete,
         name='upload-complete',
     ),
     path('finalize/', finalize, name='finalize'),
+    path('upload-abort/', upload_abort, name='upload-abort'),
+    # Stands in for the object store when uploading to a FileSystemStorage
+    path('filesystem-upload/<str:token>/', filesystem_upload, name='filesystem-upload'),
+    # Receives bucket notifications, if enabled
+    path('notifications/', bucket_notifications, name='notifications'),
 ]
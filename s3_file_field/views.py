@@ -1,15 +1,55 @@
-from typing import Dict
-
+import hmac
+import json
+import time
+from typing import Any, Dict, List, Optional, Sequence, cast
+from xml.etree import ElementTree
+from xml.sax.saxutils import escape as xml_escape
+
+from django.conf import settings
 from django.core import signing
+from django.core.exceptions import ValidationError
+from django.http import HttpRequest, HttpResponse, HttpResponseNotFound
 from django.http.response import HttpResponseBase
-from rest_framework import serializers
+from django.views.decorators.csrf import csrf_exempt
+from django.views.decorators.http import require_http_methods
+from rest_framework import exceptions, serializers
 from rest_framework.decorators import api_view, parser_classes
 from rest_framework.parsers import JSONParser
 from rest_framework.request import Request
 from rest_framework.response import Response
 
-from . import _multipart, _registry
-from ._multipart import ObjectNotFoundError, TransferredPart, TransferredParts
+from . import (
+    _idempotency,
+    _multipart,
+    _registry,
+    _tokens,
+    metrics,
+    notifications,
+    pipeline,
+    regions,
+    signals,
+    tracing,
+)
+from ._multipart import (
+    CHECKSUM_ALGORITHMS,
+    ObjectNotFoundError,
+    PresignedParts,
+    PresignedPartTransfer,
+    TransferredPart,
+    TransferredParts,
+    UploadNotFoundError,
+)
+from ._multipart_filesystem import FileSystemMultipartManager, FileSystemUploadError
+from .fields import S3FileField
+from .planning import ClientHints
+from .sessions import (
+    ABORTED,
+    COMPLETED,
+    FINALIZED,
+    UploadLimitExceededError,
+    get_session_store,
+)
+from .sharding import resolve_storage
 
 
 class UploadInitializationRequestSerializer(serializers.Serializer):
@@ -18,6 +58,15 @@ class UploadInitializationRequestSerializer(serializers.Serializer):
     file_size = serializers.IntegerField(min_value=1)
     # part_size = serializers.IntegerField(min_value=1)
     content_type = serializers.CharField(required=False)
+    # Optional hints, which may be used to plan the part size
+    bandwidth = serializers.IntegerField(min_value=1, required=False)
+    concurrency = serializers.IntegerField(min_value=1, required=False)
+    # Round-trip times to each of a field's regions, in milliseconds, as measured by the client
+    region_latencies = serializers.DictField(
+        child=serializers.FloatField(min_value=0), required=False
+    )
+    # Retries with the same key receive the original response, rather than a new upload
+    idempotency_key = serializers.CharField(max_length=255, required=False)
 
     def validate_field_id(self, field_id):
         try:
@@ -26,6 +75,14 @@ class UploadInitializationRequestSerializer(serializers.Serializer):
             raise serializers.ValidationError(f'Invalid field ID: "{field_id}".')
         return field_id
 
+    def validate(self, attrs: Dict) -> Dict:
+        # Reject disallowed files before anything is sent to the object store
+        field = _registry.get_field(attrs['field_id'])
+        field.upload_policy.validate(
+            attrs['file_name'], attrs['file_size'], attrs.get('content_type')
+        )
+        return attrs
+
 
 class PartInitializationResponseSerializer(serializers.Serializer):
     part_number = serializers.IntegerField(min_value=1)
@@ -33,36 +90,156 @@ class PartInitializationResponseSerializer(serializers.Serializer):
     upload_url = serializers.URLField()
 
 
+class PresignedPartsField(serializers.ListField):
+    child = PartInitializationResponseSerializer()
+
+    def to_representation(self, data: Sequence[PresignedPartTransfer]) -> List[Dict]:
+        # An upload may have up to 10,000 parts, so avoid the overhead of serializing each part
+        # through "child"; it remains as a description of the output
+        if isinstance(data, PresignedParts):
+            return data.to_dicts()
+        return [
+            {'part_number': part.part_number, 'size': part.size, 'upload_url': part.upload_url}
+            for part in data
+        ]
+
+
 class UploadInitializationResponseSerializer(serializers.Serializer):
     object_key = serializers.CharField(trim_whitespace=False)
     upload_id = serializers.CharField()
-    parts = PartInitializationResponseSerializer(many=True, allow_empty=False)
+    parts = PresignedPartsField(allow_empty=False)
     upload_signature = serializers.CharField(trim_whitespace=False)
+    # If set, the client must send a checksum with each part, using this algorithm
+    checksum_algorithm = serializers.ChoiceField(choices=CHECKSUM_ALGORITHMS, allow_null=True)
+    # Clients should send this in the "X-S3FF-Correlation-ID" header of subsequent requests
+    correlation_id = serializers.CharField()
 
 
 class TransferredPartRequestSerializer(serializers.Serializer):
     part_number = serializers.IntegerField(min_value=1)
     size = serializers.IntegerField(min_value=1)
     etag = serializers.CharField()
+    checksum = serializers.CharField(required=False)
+    # The time taken to transfer the part, in seconds, which is recorded for tracing
+    duration = serializers.FloatField(min_value=0, required=False)
 
     def create(self, validated_data) -> TransferredPart:
         return TransferredPart(**validated_data)
 
 
+class TransferredPartsField(serializers.ListField):
+    """
+    A list of transferred parts, sorted by part number.
+
+    An upload may have up to 10,000 parts, so rather than running a nested serializer for each
+    part, all parts are validated in a single pass; "child" remains as a description of the input.
+    """
+
+    child = TransferredPartRequestSerializer()
+
+    default_error_messages = {
+        **serializers.ListField.default_error_messages,
+        'not_contiguous': 'Part numbers must be contiguous, starting from 1.',
+    }
+
+    def to_internal_value(self, data) -> List[TransferredPart]:
+        if not isinstance(data, list):
+            self.fail('not_a_list', input_type=type(data).__name__)
+        if not self.allow_empty and not data:
+            self.fail('empty')
+
+        parts: List[TransferredPart] = []
+        errors: Dict[Any, Any] = {}
+        for index, item in enumerate(data):
+            if not isinstance(item, dict):
+                errors[index] = {'non_field_errors': ['Invalid data. Expected a dictionary.']}
+                continue
+            item_errors: Dict[str, List[str]] = {}
+            part_number = self._positive_int(item, 'part_number', item_errors)
+            size = self._positive_int(item, 'size', item_errors)
+            etag = item.get('etag')
+            if not isinstance(etag, str) or not etag:
+                item_errors['etag'] = ['A non-empty string is required.']
+            checksum = item.get('checksum')
+            if checksum is not None and (not isinstance(checksum, str) or not checksum):
+                item_errors['checksum'] = ['A non-empty string is required.']
+            duration = item.get('duration')
+            if duration is not None and (
+                type(duration) not in (int, float) or not 0 <= duration < float('inf')
+            ):
+                item_errors['duration'] = ['A non-negative number is required.']
+            if item_errors:
+                errors[index] = item_errors
+            else:
+                parts.append(
+                    TransferredPart(
+                        part_number=part_number,
+                        size=size,
+                        etag=cast(str, etag),
+                        checksum=checksum,
+                        duration=duration,
+                    )
+                )
+        if errors:
+            raise serializers.ValidationError(errors)
+
+        parts.sort(key=lambda part: part.part_number)
+        # Since parts are sorted, this also detects duplicates
+        if any(part.part_number != index for index, part in enumerate(parts, start=1)):
+            self.fail('not_contiguous')
+        return parts
+
+    @staticmethod
+    def _positive_int(item: Dict, key: str, item_errors: Dict[str, List[str]]) -> int:
+        value = item.get(key)
+        # Like IntegerField, accept strings of digits, but don't accept booleans. Only ASCII digits
+        # are accepted, since isdigit() is also true of characters (e.g. "²") which int() rejects.
+        if isinstance(value, str) and value.isascii() and value.isdigit():
+            value = int(value)
+        if type(value) is not int or value < 1:
+            item_errors[key] = ['A positive integer is required.']
+            return 0
+        return value
+
+
 class UploadCompletionRequestSerializer(serializers.Serializer):
     upload_signature = serializers.CharField(trim_whitespace=False)
     upload_id = serializers.CharField()
-    parts = TransferredPartRequestSerializer(many=True, allow_empty=False)
+    parts = TransferredPartsField(allow_empty=False)
+
+    def validate_upload_signature(self, upload_signature: str) -> Dict:
+        # Decode the signature once, so the view can reuse it; parts can't be uploaded once their
+        # URLs expire, so neither can the upload be completed
+        try:
+            return _tokens.loads(
+                upload_signature, max_age=_multipart.MultipartManager._url_expiration
+            )
+        except signing.SignatureExpired:
+            raise serializers.ValidationError('Upload signature has expired.')
+        except signing.BadSignature:
+            raise serializers.ValidationError('Invalid upload signature.')
+
+    def validate(self, attrs: Dict) -> Dict:
+        # Older signatures may not include the file size
+        file_size = attrs['upload_signature'].get('file_size')
+        if file_size is not None and sum(part.size for part in attrs['parts']) != file_size:
+            raise serializers.ValidationError(
+                {'parts': ['Part sizes do not add up to the initialized file size.']}
+            )
+        if attrs['upload_signature'].get('checksum_algorithm') and any(
+            part.checksum is None for part in attrs['parts']
+        ):
+            raise serializers.ValidationError({'parts': ['Each part must include a checksum.']})
+        return attrs
 
     def create(self, validated_data) -> TransferredParts:
-        parts = [
-            TransferredPart(**part)
-            for part in sorted(validated_data.pop('parts'), key=lambda part: part['part_number'])
-        ]
-        upload_signature = signing.loads(validated_data['upload_signature'])
-        object_key = upload_signature['object_key']
-        upload_id = validated_data['upload_id']
-        return TransferredParts(parts=parts, object_key=object_key, upload_id=upload_id)
+        upload_signature = validated_data['upload_signature']
+        return TransferredParts(
+            parts=validated_data['parts'],
+            object_key=upload_signature['object_key'],
+            upload_id=validated_data['upload_id'],
+            checksum_algorithm=upload_signature.get('checksum_algorithm'),
+        )
 
 
 class UploadCompletionResponseSerializer(serializers.Serializer):
@@ -70,6 +247,38 @@ class UploadCompletionResponseSerializer(serializers.Serializer):
     body = serializers.CharField(trim_whitespace=False)
 
 
+class PartUrlRequestSerializer(serializers.Serializer):
+    upload_signature = serializers.CharField(trim_whitespace=False)
+    part_number = serializers.IntegerField(min_value=1, max_value=10_000)
+    size = serializers.IntegerField(min_value=1)
+    checksum = serializers.CharField()
+
+    def validate_upload_signature(self, upload_signature: str) -> Dict:
+        try:
+            upload_signature_data = _tokens.loads(
+                upload_signature, max_age=_multipart.MultipartManager._url_expiration
+            )
+        except signing.SignatureExpired:
+            raise serializers.ValidationError('Upload signature has expired.')
+        except signing.BadSignature:
+            raise serializers.ValidationError('Invalid upload signature.')
+        # The initialized part URLs may be used for uploads without checksums
+        if 'checksum_algorithm' not in upload_signature_data:
+            raise serializers.ValidationError('This upload does not use checksums.')
+        return upload_signature_data
+
+    def validate(self, attrs: Dict) -> Dict:
+        if attrs['size'] > attrs['upload_signature']['file_size']:
+            raise serializers.ValidationError({'size': ['Part is larger than the file.']})
+        return attrs
+
+
+class PartUrlResponseSerializer(serializers.Serializer):
+    upload_url = serializers.URLField()
+    # Headers which were signed, so must be sent with the part
+    headers = serializers.DictField(child=serializers.CharField())
+
+
 class FinalizationRequestSerializer(serializers.Serializer):
     upload_signature = serializers.CharField(trim_whitespace=False)
 
@@ -78,114 +287,541 @@ class FinalizationResponseSerializer(serializers.Serializer):
     field_value = serializers.CharField(trim_whitespace=False)
 
 
+class UploadAbortRequestSerializer(serializers.Serializer):
+    upload_signature = serializers.CharField(trim_whitespace=False)
+
+    def validate_upload_signature(self, upload_signature: str) -> Dict:
+        try:
+            upload_signature_data = _tokens.loads(upload_signature)
+        except signing.BadSignature:
+            raise serializers.ValidationError('Invalid upload signature.')
+        # Older signatures do not include the upload ID
+        if 'upload_id' not in upload_signature_data:
+            raise serializers.ValidationError('This upload cannot be aborted.')
+        return upload_signature_data
+
+
+def _span_attributes(upload_signature: Dict, **extra: Any) -> Dict[str, Any]:
+    attributes = {
+        's3ff.field_id': upload_signature['field_id'],
+        's3ff.object_key': upload_signature['object_key'],
+        **{f's3ff.{key}': value for key, value in extra.items()},
+    }
+    # Older signatures may not include these
+    for key in ['correlation_id', 'file_size']:
+        if key in upload_signature:
+            attributes[f's3ff.{key}'] = upload_signature[key]
+    return attributes
+
+
+def _get_multipart_manager(field: S3FileField, object_key: str) -> _multipart.MultipartManager:
+    # Objects of a sharded field are uploaded directly to their shard's storage
+    return _multipart.MultipartManager.from_storage(resolve_storage(field.storage, object_key))
+
+
 @api_view(['POST'])
 @parser_classes([JSONParser])
+@metrics.timed('views.upload_initialize')
 def upload_initialize(request: Request) -> HttpResponseBase:
+    start = time.perf_counter()
     request_serializer = UploadInitializationRequestSerializer(data=request.data)
     request_serializer.is_valid(raise_exception=True)
     upload_request: Dict = request_serializer.validated_data
     field = _registry.get_field(upload_request['field_id'])
+    user = request.user if request.user.is_authenticated else None
 
-    file_name = upload_request['file_name']
-    # TODO The first argument to generate_filename() is an instance of the model.
-    # We do not and will never have an instance of the model during field upload.
-    # Maybe we need a different generate method/upload_to with a different signature?
-    object_key = field.generate_filename(None, file_name)
-
-    content_type = upload_request.get('content_type')
-
-    initialization = _multipart.MultipartManager.from_storage(field.storage).initialize_upload(
-        object_key,
-        upload_request['file_size'],
-        content_type=content_type,
-    )
+    idempotency_key = upload_request.pop('idempotency_key', None)
+    # The keys of anonymous clients without a session are ignored, since they can't be told apart
+    idempotency_scope = _idempotency.get_scope(request) if idempotency_key is not None else None
+    if idempotency_key is None or idempotency_scope is None:
+        return Response(_initialize_upload(request, upload_request, field, user, start))
+    idempotency_entry = _idempotency.get_entry(idempotency_key, idempotency_scope)
 
-    # signals.s3_file_field_upload_prepare.send(
-    #     sender=upload_prepare, name=name, object_key=object_key
-    # )
+    try:
+        replayed_response = _idempotency.reserve(idempotency_key, idempotency_scope, upload_request)
+    except _idempotency.IdempotencyKeyReusedError:
+        raise serializers.ValidationError(
+            {'idempotency_key': ['This key was already used with a different request.']}
+        )
+    except _idempotency.IdempotencyKeyInProgressError:
+        return Response('A request with this idempotency key is in progress.', status=409)
+    if replayed_response is not None:
+        metrics.get_sink().increment('uploads.replayed', tags={'field': field.id})
+        return Response(replayed_response)
 
-    # We sign the field_id and object_key to create a "session token" for this upload
-    upload_signature = signing.dumps(
-        {
+    try:
+        response_data = _initialize_upload(
+            request, upload_request, field, user, start, idempotency_entry=idempotency_entry
+        )
+    except BaseException:
+        # Allow the initialization to be retried
+        _idempotency.release(idempotency_key, idempotency_scope)
+        raise
+    _idempotency.set_response(idempotency_key, idempotency_scope, upload_request, response_data)
+    return Response(response_data)
+
+
+def _initialize_upload(
+    request: Request,
+    upload_request: Dict,
+    field: S3FileField,
+    user: Any,
+    start: float,
+    idempotency_entry: Optional[str] = None,
+) -> Dict:
+    correlation_id = tracing.get_correlation_id(request.headers)
+    session_store = get_session_store()
+    max_uploads = getattr(settings, 'S3FF_MAX_CONCURRENT_UPLOADS_PER_USER', None)
+    # Reject most excess uploads before anything is sent to the object store; the session store
+    # enforces the limit atomically when the session is created
+    if (
+        max_uploads is not None
+        and user is not None
+        and session_store.count_in_flight(user) >= max_uploads
+    ):
+        raise exceptions.Throttled(detail='Too many concurrent uploads.')
+
+    with tracing.span(
+        's3ff.upload_initialize',
+        attributes={
+            's3ff.correlation_id': correlation_id,
+            's3ff.field_id': field.id,
+            's3ff.file_size': upload_request['file_size'],
+        },
+    ):
+        file_name = upload_request['file_name']
+        # TODO The first argument to generate_filename() is an instance of the model.
+        # We do not and will never have an instance of the model during field upload.
+        # Maybe we need a different generate method/upload_to with a different signature?
+        object_key = field.generate_filename(None, file_name)
+        object_key = regions.route(
+            field,
+            object_key,
+            regions.select_region(field, request, upload_request.get('region_latencies')),
+        )
+
+        content_type = upload_request.get('content_type')
+
+        initialization = _get_multipart_manager(field, object_key).initialize_upload(
+            object_key,
+            upload_request['file_size'],
+            content_type=content_type,
+            field=field,
+            hints=ClientHints(
+                bandwidth=upload_request.get('bandwidth'),
+                concurrency=upload_request.get('concurrency'),
+            ),
+            checksum_algorithm=field.checksum_algorithm,
+        )
+
+        # We sign the field_id and object_key to create a "session token" for this upload.
+        # The file_size is also signed, so the policy-validated size can be enforced at
+        # finalization. The correlation ID and trace context relate later requests to this one.
+        upload_signature_data = {
             'field_id': upload_request['field_id'],
             'object_key': object_key,
-        }
-    )
-
-    response_serializer = UploadInitializationResponseSerializer(
-        {
-            'object_key': initialization.object_key,
             'upload_id': initialization.upload_id,
-            'parts': initialization.parts,
-            'upload_signature': upload_signature,
+            'file_size': upload_request['file_size'],
+            'correlation_id': correlation_id,
         }
-    )
-    return Response(response_serializer.data)
+        if initialization.checksum_algorithm:
+            upload_signature_data['checksum_algorithm'] = initialization.checksum_algorithm
+        if idempotency_entry is not None:
+            upload_signature_data['idempotency_entry'] = idempotency_entry
+        if session_store.enabled:
+            try:
+                upload_signature_data['session_id'] = session_store.create(
+                    field_id=field.id,
+                    object_key=object_key,
+                    upload_id=initialization.upload_id,
+                    file_size=upload_request['file_size'],
+                    part_count=len(initialization.parts),
+                    user=user,
+                    max_in_flight=max_uploads,
+                )
+            except UploadLimitExceededError:
+                # A concurrent initialization by the same user reached the limit first
+                _get_multipart_manager(field, object_key)._abort_upload_id(
+                    object_key, initialization.upload_id
+                )
+                raise exceptions.Throttled(detail='Too many concurrent uploads.')
+        trace_context = tracing.get_trace_context()
+        if trace_context:
+            upload_signature_data['trace_context'] = trace_context
+        upload_signature = _tokens.dumps(upload_signature_data)
+
+        sink = metrics.get_sink()
+        sink.increment('uploads.initialized', tags={'field': field.id})
+        sink.observe('uploads.file_size', upload_request['file_size'], tags={'field': field.id})
+        sink.observe('uploads.part_count', len(initialization.parts), tags={'field': field.id})
+
+        signals.send(
+            signals.s3_file_field_upload_prepare,
+            sender=field.model,
+            field=field,
+            object_key=object_key,
+            file_size=upload_request['file_size'],
+            part_count=len(initialization.parts),
+            duration=time.perf_counter() - start,
+        )
+
+        response_serializer = UploadInitializationResponseSerializer(
+            {
+                'object_key': initialization.object_key,
+                'upload_id': initialization.upload_id,
+                'parts': initialization.parts,
+                'upload_signature': upload_signature,
+                'checksum_algorithm': initialization.checksum_algorithm,
+                'correlation_id': correlation_id,
+            }
+        )
+        return response_serializer.data
+
+
+@api_view(['POST'])
+@parser_classes([JSONParser])
+@metrics.timed('views.upload_part_url')
+def upload_part_url(request: Request) -> HttpResponseBase:
+    """
+    Return the URL to upload a part with a checksum.
+
+    Object stores reject unsigned checksum headers, so for uploads with checksums, each part's
+    checksum must be signed into its URL, once the client has computed it. Any headers which were
+    signed are returned, to be sent with the part.
+    """
+    request_serializer = PartUrlRequestSerializer(data=request.data)
+    request_serializer.is_valid(raise_exception=True)
+    part_request = request_serializer.validated_data
+
+    upload_signature = part_request['upload_signature']
+    field = _registry.get_field(upload_signature['field_id'])
+    object_key = upload_signature['object_key']
+    with tracing.span(
+        's3ff.upload_part_url',
+        attributes=_span_attributes(upload_signature, part_number=part_request['part_number']),
+        trace_context=upload_signature.get('trace_context'),
+    ):
+        multipart = _get_multipart_manager(field, object_key)
+        upload_url = multipart._generate_presigned_part_url(
+            object_key,
+            upload_signature['upload_id'],
+            part_request['part_number'],
+            part_request['size'],
+            checksum_algorithm=upload_signature['checksum_algorithm'],
+            checksum=part_request['checksum'],
+        )
+        headers = multipart._presigned_part_headers(
+            upload_url, upload_signature['checksum_algorithm'], part_request['checksum']
+        )
+        return Response(
+            PartUrlResponseSerializer({'upload_url': upload_url, 'headers': headers}).data
+        )
 
 
 @api_view(['POST'])
 @parser_classes([JSONParser])
+@metrics.timed('views.upload_complete')
 def upload_complete(request: Request) -> HttpResponseBase:
+    start = time.perf_counter()
     request_serializer = UploadCompletionRequestSerializer(data=request.data)
     request_serializer.is_valid(raise_exception=True)
     transferred_parts: TransferredParts = request_serializer.save()
 
-    upload_signature = signing.loads(request_serializer.validated_data['upload_signature'])
+    upload_signature = request_serializer.validated_data['upload_signature']
     field = _registry.get_field(upload_signature['field_id'])
 
-    # check if upload_prepare signed this less than max age ago
-    # tsigner = TimestampSigner()
-    # if object_key != tsigner.unsign(
-    #     upload_sig, max_age=int(MultipartManager._url_expiration.total_seconds())
-    # ):
-    #     raise BadSignature()
+    with tracing.span(
+        's3ff.upload_complete',
+        attributes=_span_attributes(upload_signature, part_count=len(transferred_parts.parts)),
+        trace_context=upload_signature.get('trace_context'),
+    ):
+        tracing.record_part_timings(transferred_parts.parts)
+
+        completed_upload = _get_multipart_manager(
+            field, transferred_parts.object_key
+        ).complete_upload(transferred_parts)
+        metrics.get_sink().increment('uploads.completed', tags={'field': field.id})
+        if 'session_id' in upload_signature:
+            get_session_store().set_status(upload_signature['session_id'], COMPLETED)
+
+        signals.send(
+            signals.s3_file_field_upload_complete,
+            sender=field.model,
+            field=field,
+            object_key=transferred_parts.object_key,
+            file_size=sum(part.size for part in transferred_parts.parts),
+            part_count=len(transferred_parts.parts),
+            duration=time.perf_counter() - start,
+        )
+
+        response_serializer = UploadCompletionResponseSerializer(
+            {
+                'complete_url': completed_upload.complete_url,
+                'body': completed_upload.body,
+            }
+        )
+        return Response(response_serializer.data)
 
-    completed_upload = _multipart.MultipartManager.from_storage(field.storage).complete_upload(
-        transferred_parts
-    )
 
-    # signals.s3_file_field_upload_finalize.send(
-    #     sender=multipart_upload_finalize, name=name, object_key=object_key
-    # )
+@api_view(['POST'])
+@parser_classes([JSONParser])
+@metrics.timed('views.finalize')
+def finalize(request: Request) -> HttpResponseBase:
+    start = time.perf_counter()
+    request_serializer = FinalizationRequestSerializer(data=request.data)
+    request_serializer.is_valid(raise_exception=True)
+
+    upload_signature = _tokens.loads(request_serializer.validated_data['upload_signature'])
+    with tracing.span(
+        's3ff.finalize',
+        attributes=_span_attributes(upload_signature),
+        trace_context=upload_signature.get('trace_context'),
+    ):
+        field_id = upload_signature['field_id']
+        object_key = upload_signature['object_key']
 
-    response_serializer = UploadCompletionResponseSerializer(
-        {
-            'complete_url': completed_upload.complete_url,
-            'body': completed_upload.body,
+        field = _registry.get_field(field_id)
+
+        checksum_algorithm = upload_signature.get('checksum_algorithm')
+
+        # A notification of the object's creation confirms that the upload completed, but does
+        # not include checksums
+        metadata = (
+            notifications.get_confirmation(resolve_storage(field.storage, object_key), object_key)
+            if checksum_algorithm is None
+            else None
+        )
+        if metadata is not None:
+            metrics.get_sink().increment(
+                'uploads.confirmed_by_notification', tags={'field': field.id}
+            )
+        else:
+            # get_object_metadata implicitly verifies that the object exists.
+            # We don't want to distribute the field value if the upload did not complete.
+            try:
+                metadata = _get_multipart_manager(field, object_key).get_object_metadata(
+                    object_key, checksum_algorithm=checksum_algorithm
+                )
+            except ObjectNotFoundError:
+                metrics.get_sink().increment(
+                    'uploads.failed', tags={'field': field.id, 'reason': 'not_found'}
+                )
+                return Response('Object not found', status=400)
+        size = metadata.size
+        if 'idempotency_entry' in upload_signature:
+            # The upload is complete, so a retried initialization must not replay it
+            _idempotency.forget(upload_signature['idempotency_entry'])
+
+        # The client may have uploaded different content than it declared at initialization
+        try:
+            if size != upload_signature.get('file_size', size):
+                raise ValidationError(
+                    'Object size does not match the initialized upload.', code='file_size_mismatch'
+                )
+            field.upload_policy.validate_size(size)
+        except ValidationError as e:
+            # Don't keep an object which can never be used
+            field.storage.delete(object_key)
+            if 'session_id' in upload_signature:
+                get_session_store().set_status(upload_signature['session_id'], ABORTED)
+            metrics.get_sink().increment(
+                'uploads.failed', tags={'field': field.id, 'reason': 'rejected'}
+            )
+            signals.send(
+                signals.s3_file_field_upload_abort,
+                sender=field.model,
+                field=field,
+                object_key=object_key,
+                file_size=size,
+                reason='rejected',
+                duration=time.perf_counter() - start,
+            )
+            return Response(e.messages, status=400)
+
+        field_value_data = {
+            'object_key': object_key,
+            'file_size': size,
         }
-    )
-    return Response(response_serializer.data)
+        if checksum_algorithm and metadata.checksum:
+            # Record the full-object checksum, as computed by the object store from the part
+            # checksums
+            field_value_data['checksum_algorithm'] = checksum_algorithm
+            field_value_data['checksum'] = metadata.checksum
+        field_value = _tokens.dumps(field_value_data)
+
+        sink = metrics.get_sink()
+        sink.increment('uploads.finalized', tags={'field': field.id})
+        sink.increment('uploads.finalized_bytes', size, tags={'field': field.id})
+        if 'session_id' in upload_signature:
+            get_session_store().set_status(upload_signature['session_id'], FINALIZED)
+
+        signals.send(
+            signals.s3_file_field_upload_finalize,
+            sender=field.model,
+            field=field,
+            object_key=object_key,
+            file_size=size,
+            duration=time.perf_counter() - start,
+        )
+        pipeline.schedule(field, object_key)
+
+        response_serializer = FinalizationResponseSerializer(
+            {
+                'field_value': field_value,
+            }
+        )
+        return Response(response_serializer.data)
 
 
 @api_view(['POST'])
 @parser_classes([JSONParser])
-def finalize(request: Request) -> HttpResponseBase:
-    request_serializer = FinalizationRequestSerializer(data=request.data)
+@metrics.timed('views.upload_abort')
+def upload_abort(request: Request) -> HttpResponseBase:
+    start = time.perf_counter()
+    request_serializer = UploadAbortRequestSerializer(data=request.data)
     request_serializer.is_valid(raise_exception=True)
 
-    upload_signature = signing.loads(request_serializer.validated_data['upload_signature'])
-    field_id = upload_signature['field_id']
-    object_key = upload_signature['object_key']
+    upload_signature = request_serializer.validated_data['upload_signature']
+    with tracing.span(
+        's3ff.upload_abort',
+        attributes=_span_attributes(upload_signature),
+        trace_context=upload_signature.get('trace_context'),
+    ):
+        field = _registry.get_field(upload_signature['field_id'])
+        object_key = upload_signature['object_key']
 
-    field = _registry.get_field(field_id)
+        if 'idempotency_entry' in upload_signature:
+            # A retried initialization must not replay the aborted upload
+            _idempotency.forget(upload_signature['idempotency_entry'])
 
-    # get_object_size implicitly verifies that the object exists.
-    # We don't want to distribute the field value if the upload did not complete.
+        multipart = _get_multipart_manager(field, object_key)
+        # Release any parts which have already been stored
+        try:
+            multipart._abort_upload_id(object_key, upload_signature['upload_id'])
+        except UploadNotFoundError:
+            try:
+                multipart.get_object_metadata(object_key)
+            except ObjectNotFoundError:
+                # The upload was already aborted
+                return Response(status=204)
+            return Response('Upload was already completed.', status=409)
+
+        if 'session_id' in upload_signature:
+            get_session_store().set_status(upload_signature['session_id'], ABORTED)
+        metrics.get_sink().increment(
+            'uploads.failed', tags={'field': field.id, 'reason': 'aborted'}
+        )
+        signals.send(
+            signals.s3_file_field_upload_abort,
+            sender=field.model,
+            field=field,
+            object_key=object_key,
+            file_size=upload_signature.get('file_size'),
+            reason='aborted',
+            duration=time.perf_counter() - start,
+        )
+
+        return Response(status=204)
+
+
+_S3_NAMESPACE = 'http://s3.amazonaws.com/doc/2006-03-01/'
+
+
+@csrf_exempt
+@require_http_methods(['PUT', 'POST'])
+def filesystem_upload(request: HttpRequest, token: str) -> HttpResponse:
+    """
+    Accept the part uploads and completion of an upload to a FileSystemStorage.
+
+    This stands in for the object store, so requests and responses mirror those of S3.
+    """
     try:
-        size = _multipart.MultipartManager.from_storage(field.storage).get_object_size(object_key)
-    except ObjectNotFoundError:
-        return Response('Object not found', status=400)
+        multipart, data = FileSystemMultipartManager.from_token(token)
+        if request.method != data['method']:
+            raise FileSystemUploadError(
+                403, 'SignatureDoesNotMatch', 'The request signature does not match.'
+            )
+
+        if request.method == 'PUT':
+            # As with S3, checksums must be signed, so they can't be sent as headers
+            if any(header.lower().startswith('x-amz-checksum-') for header in request.headers):
+                raise FileSystemUploadError(
+                    403,
+                    'HeadersNotSigned',
+                    'There were headers present in the request which were not signed.',
+                )
+            etag = multipart.write_part(
+                data['upload_id'],
+                data['part_number'],
+                # Stream the body, rather than loading it into memory
+                cast(Any, request),
+                int(request.META.get('CONTENT_LENGTH') or 0),
+                data.get('checksums'),
+            )
+            response = HttpResponse()
+            response['ETag'] = etag
+            return response
 
-    field_value = signing.dumps(
-        {
-            'object_key': object_key,
-            'file_size': size,
-        }
-    )
+        try:
+            root = ElementTree.fromstring(request.body)
+        except ElementTree.ParseError:
+            raise FileSystemUploadError(400, 'MalformedXML', 'The XML is not well-formed.')
+        try:
+            parts = [
+                (
+                    int(part.findtext(f'{{{_S3_NAMESPACE}}}PartNumber', '0')),
+                    part.findtext(f'{{{_S3_NAMESPACE}}}ETag', ''),
+                    next(
+                        (
+                            child.text
+                            for child in part
+                            if child.tag.startswith(f'{{{_S3_NAMESPACE}}}Checksum')
+                        ),
+                        None,
+                    ),
+                )
+                for part in root.iter(f'{{{_S3_NAMESPACE}}}Part')
+            ]
+        except ValueError:
+            raise FileSystemUploadError(400, 'MalformedXML', 'The XML is not well-formed.')
+        object_key, etag = multipart.complete_parts(data['upload_id'], parts)
+        return HttpResponse(
+            '<?xml version="1.0" encoding="UTF-8"?>'
+            f'<CompleteMultipartUploadResult xmlns="{_S3_NAMESPACE}">'
+            f'<Key>{xml_escape(object_key)}</Key><ETag>{xml_escape(etag)}</ETag>'
+            '</CompleteMultipartUploadResult>',
+            content_type='application/xml',
+        )
+    except FileSystemUploadError as e:
+        return HttpResponse(
+            '<?xml version="1.0" encoding="UTF-8"?>'
+            f'<Error><Code>{e.code}</Code><Message>{xml_escape(e.message)}</Message></Error>',
+            status=e.status,
+            content_type='application/xml',
+        )
+
+
+@csrf_exempt
+@require_http_methods(['POST'])
+def bucket_notifications(request: HttpRequest) -> HttpResponse:
+    """
+    Accept the event notifications of a bucket, to confirm uploads without HEAD requests.
+
+    This is only enabled if the "S3FF_NOTIFICATION_TOKEN" setting is set, which the notifier must
+    send as its "Authorization" header (optionally, as a bearer token).
+    """
+    token = getattr(settings, 'S3FF_NOTIFICATION_TOKEN', None)
+    if not token:
+        return HttpResponseNotFound()
+    authorization = request.headers.get('Authorization', '')
+    if authorization.startswith('Bearer '):
+        authorization = authorization[len('Bearer ') :]
+    if not hmac.compare_digest(authorization.encode(), token.encode()):
+        return HttpResponse('Invalid token.', status=403)
 
-    response_serializer = FinalizationResponseSerializer(
-        {
-            'field_value': field_value,
-        }
-    )
-    return Response(response_serializer.data)
+    try:
+        ingested = notifications.ingest(json.loads(request.body))
+    except ValueError:
+        return HttpResponse('Malformed notification.', status=400)
+    metrics.get_sink().increment('notifications.ingested', ingested)
+    return HttpResponse(status=204)
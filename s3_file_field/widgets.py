@@ -12,6 +12,8 @@ from django.forms.widgets import FILE_INPUT_CONTRADICTION, CheckboxInput  # type
 from django.urls import reverse
 from django.utils.datastructures import MultiValueDict
 
+from . import _tokens
+
 
 @functools.lru_cache(maxsize=1)
 def get_base_url() -> str:
@@ -42,7 +44,7 @@ class S3PlaceholderFile(File):
     @classmethod
     def from_field(cls, field_value: str) -> Optional[S3PlaceholderFile]:
         try:
-            parsed_field = signing.loads(field_value)
+            parsed_field = _tokens.loads(field_value)
         except signing.BadSignature:
             return None
         # Since the field is signed, we know the content is structurally valid
@@ -60,7 +60,7 @@ setup(
         'Programming Language :: Python :: 3.10',
         'Programming Language :: Python',
     ],
-    packages=find_packages(include=['s3_file_field']),
+    packages=find_packages(include=['s3_file_field', 's3_file_field.*']),
     package_data={'': ['*.html', '*.js']},
     include_package_data=True,
     install_requires=[
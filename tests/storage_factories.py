@@ -0,0 +1,53 @@
+"""Factories of the storages used by tests and benchmarks, which connect to a local object store."""
+
+from typing import TYPE_CHECKING, cast
+
+from botocore.exceptions import ClientError
+from django.conf import settings
+from minio import Minio
+from minio_storage.storage import MinioStorage
+from storages.backends.s3boto3 import S3Boto3Storage
+
+if TYPE_CHECKING:
+    # mypy_boto3_s3 only provides types
+    import mypy_boto3_s3 as s3
+
+
+def s3boto3_storage_factory() -> 'S3Boto3Storage':
+    storage = S3Boto3Storage(
+        access_key=settings.MINIO_STORAGE_ACCESS_KEY,
+        secret_key=settings.MINIO_STORAGE_SECRET_KEY,
+        region_name='test-region',
+        bucket_name=settings.MINIO_STORAGE_MEDIA_BUCKET_NAME,
+        # For testing, connect to a local Minio instance
+        endpoint_url=(
+            f'{"https" if settings.MINIO_STORAGE_USE_HTTPS else "http"}:'
+            f'//{settings.MINIO_STORAGE_ENDPOINT}'
+        ),
+    )
+
+    resource: s3.ServiceResource = storage.connection
+    client: s3.Client = cast('s3.Client', resource.meta.client)
+    try:
+        client.head_bucket(Bucket=settings.MINIO_STORAGE_MEDIA_BUCKET_NAME)
+    except ClientError:
+        client.create_bucket(Bucket=settings.MINIO_STORAGE_MEDIA_BUCKET_NAME)
+
+    return storage
+
+
+def minio_storage_factory() -> MinioStorage:
+    return MinioStorage(
+        minio_client=Minio(
+            endpoint=settings.MINIO_STORAGE_ENDPOINT,
+            secure=settings.MINIO_STORAGE_USE_HTTPS,
+            access_key=settings.MINIO_STORAGE_ACCESS_KEY,
+            secret_key=settings.MINIO_STORAGE_SECRET_KEY,
+            # Don't use s3_connection_params.region, let Minio set its own value internally
+        ),
+        bucket_name=settings.MINIO_STORAGE_MEDIA_BUCKET_NAME,
+        auto_create_bucket=True,
+        presign_urls=True,
+        # TODO: Test the case of an alternate base_url
+        # base_url='http://minio:9000/bucket-name'
+    )
@@ -1,6 +1,9 @@
+from django.core.files.storage import default_storage
 from django.db import models
 
+from s3_file_field._sizes import mb
 from s3_file_field.fields import S3FileField
+from s3_file_field.sharding import HashedPrefix
 
 
 class Resource(models.Model):
@@ -10,3 +13,27 @@ class Resource(models.Model):
 class MultiResource(models.Model):
     blob = S3FileField()
     optional_blob = S3FileField(blank=True)
+
+
+class RestrictedResource(models.Model):
+    blob = S3FileField(
+        min_size=5,
+        max_size=mb(10),
+        allowed_content_types=['image/*'],
+        allowed_extensions=['png'],
+    )
+
+
+class ChecksumResource(models.Model):
+    blob = S3FileField(checksum_algorithm='SHA256')
+
+
+class ShardedResource(models.Model):
+    blob = S3FileField(
+        storage_shards={'a': default_storage, 'b': default_storage},
+        upload_to=HashedPrefix(),
+    )
+
+
+class RegionalResource(models.Model):
+    blob = S3FileField(storage_regions={'us': default_storage, 'eu': default_storage})
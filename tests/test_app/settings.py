@@ -3,10 +3,13 @@ import os
 SECRET_KEY = 'test_key'
 
 INSTALLED_APPS = [
+    'django.contrib.admin',
     'django.contrib.auth',
     'django.contrib.contenttypes',
+    'django.contrib.messages',
     'rest_framework',
     's3_file_field',
+    's3_file_field.upload_sessions',
     # This is really hacky, but saves repeating the whole settings file...
     # Mypy needs a reference to settings, but its import resolution is different than
     # pytest's (since pytest-django injects the location of manage.py into the pythonpath).
@@ -24,6 +27,28 @@ INSTALLED_APPS = [
 
 ROOT_URLCONF = 'test_app.urls'
 
+# Required by the admin
+MIDDLEWARE = [
+    'django.contrib.sessions.middleware.SessionMiddleware',
+    'django.contrib.auth.middleware.AuthenticationMiddleware',
+    'django.contrib.messages.middleware.MessageMiddleware',
+]
+# Sessions are stored without a database, so requests which don't use one don't need database access
+SESSION_ENGINE = 'django.contrib.sessions.backends.signed_cookies'
+TEMPLATES = [
+    {
+        'BACKEND': 'django.template.backends.django.DjangoTemplates',
+        'APP_DIRS': True,
+        'OPTIONS': {
+            'context_processors': [
+                'django.template.context_processors.request',
+                'django.contrib.auth.context_processors.auth',
+                'django.contrib.messages.context_processors.messages',
+            ],
+        },
+    },
+]
+
 # Django will use a memory resident database
 DATABASES = {'default': {'ENGINE': 'django.db.backends.sqlite3'}}
 
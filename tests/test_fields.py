@@ -4,6 +4,7 @@ from django.core.exceptions import ValidationError
 from django.core.files.base import ContentFile
 import pytest
 
+from s3_file_field.fields import S3FileField
 from test_app.models import Resource
 
 
@@ -58,3 +59,8 @@ def test_fields_clean_empty():
     resource = Resource()
     with pytest.raises(ValidationError, match=r'This field cannot be blank\.'):
         resource.full_clean()
+
+
+def test_fields_checksum_algorithm_invalid():
+    with pytest.raises(ValueError, match=r'Unsupported checksum algorithm'):
+        S3FileField(checksum_algorithm='MD5')
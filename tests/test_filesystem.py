@@ -0,0 +1,308 @@
+import base64
+import hashlib
+import os
+import time
+from typing import List
+
+from django.core.files.storage import default_storage
+from django.core.management import call_command
+from django.test import Client
+from django.urls import reverse
+import pytest
+from rest_framework.test import APIClient
+
+from s3_file_field._multipart import MultipartManager, TransferredPart, TransferredParts
+from s3_file_field._multipart_filesystem import STAGING_DIRECTORY, FileSystemMultipartManager
+from s3_file_field._sizes import mb
+
+
+@pytest.fixture
+def filesystem_storage(settings, tmp_path):
+    settings.MEDIA_ROOT = str(tmp_path)
+    settings.DEFAULT_FILE_STORAGE = 'django.core.files.storage.FileSystemStorage'
+    return default_storage
+
+
+@pytest.fixture
+def filesystem_multipart_manager(filesystem_storage) -> FileSystemMultipartManager:
+    return FileSystemMultipartManager(filesystem_storage)
+
+
+def upload_part(client: Client, upload_url: str, data: bytes, **headers):
+    return client.put(upload_url, data, content_type='application/octet-stream', **headers)
+
+
+def upload_parts(multipart_manager, file_size: int, **kwargs) -> TransferredParts:
+    client = Client()
+    transfer = multipart_manager.initialize_upload('test.bin', file_size, **kwargs)
+    parts: List[TransferredPart] = []
+    # Parts may be written in any order
+    for part in reversed(transfer.parts):
+        part_bytes = bytes([part.part_number]) * part.size
+        upload_url = part.upload_url
+        checksum = None
+        if transfer.checksum_algorithm == 'SHA256':
+            checksum = base64.b64encode(hashlib.sha256(part_bytes).digest()).decode()
+            upload_url = multipart_manager._generate_presigned_part_url(
+                transfer.object_key,
+                transfer.upload_id,
+                part.part_number,
+                part.size,
+                checksum_algorithm='SHA256',
+                checksum=checksum,
+            )
+        resp = upload_part(client, upload_url, part_bytes)
+        assert resp.status_code == 200
+        parts.insert(
+            0,
+            TransferredPart(
+                part_number=part.part_number,
+                size=part.size,
+                etag=resp['ETag'],
+                checksum=checksum,
+            ),
+        )
+    return TransferredParts(
+        object_key=transfer.object_key,
+        upload_id=transfer.upload_id,
+        parts=parts,
+        checksum_algorithm=transfer.checksum_algorithm,
+    )
+
+
+def test_filesystem_storage_supported(filesystem_storage):
+    assert isinstance(MultipartManager.from_storage(filesystem_storage), FileSystemMultipartManager)
+
+
+def test_filesystem_multipart_manager_initialize_upload(filesystem_multipart_manager, tmp_path):
+    transfer = filesystem_multipart_manager.initialize_upload('test.bin', mb(12))
+
+    # The staging file is preallocated to the full size
+    assert os.path.getsize(tmp_path / STAGING_DIRECTORY / transfer.upload_id / 'data') == mb(12)
+    assert transfer.parts[0].upload_url.startswith('/api/s3ff_test/filesystem-upload/')
+
+
+def test_filesystem_multipart_manager_base_url(filesystem_multipart_manager, settings):
+    settings.S3FF_FILESYSTEM_BASE_URL = 'https://example.com/'
+
+    transfer = filesystem_multipart_manager.initialize_upload('test.bin', 10)
+
+    assert transfer.parts[0].upload_url.startswith(
+        'https://example.com/api/s3ff_test/filesystem-upload/'
+    )
+
+
+@pytest.mark.parametrize('file_size', [10, mb(12)], ids=['10B', '12MB'])
+def test_filesystem_multipart_manager_full_upload(
+    filesystem_multipart_manager, tmp_path, file_size
+):
+    transferred_parts = upload_parts(filesystem_multipart_manager, file_size)
+    completion = filesystem_multipart_manager.complete_upload(transferred_parts)
+
+    resp = Client().post(completion.complete_url, completion.body, content_type='application/xml')
+
+    assert resp.status_code == 200
+    assert f'-{len(transferred_parts.parts)}"</ETag>' in resp.content.decode()
+    with open(tmp_path / 'test.bin', 'rb') as object_stream:
+        assert object_stream.read() == b''.join(
+            bytes([part.part_number]) * part.size for part in transferred_parts.parts
+        )
+    assert filesystem_multipart_manager.get_object_size('test.bin') == file_size
+    assert os.listdir(tmp_path / STAGING_DIRECTORY) == []
+
+
+def test_filesystem_multipart_manager_full_upload_checksum(filesystem_multipart_manager):
+    transferred_parts = upload_parts(
+        filesystem_multipart_manager, mb(7), checksum_algorithm='SHA256'
+    )
+    completion = filesystem_multipart_manager.complete_upload(transferred_parts)
+
+    resp = Client().post(completion.complete_url, completion.body, content_type='application/xml')
+
+    assert resp.status_code == 200
+
+
+def test_filesystem_multipart_manager_part_bad_checksum(filesystem_multipart_manager):
+    transfer = filesystem_multipart_manager.initialize_upload(
+        'test.bin', 10, checksum_algorithm='SHA256'
+    )
+
+    upload_url = filesystem_multipart_manager._generate_presigned_part_url(
+        transfer.object_key,
+        transfer.upload_id,
+        1,
+        10,
+        checksum_algorithm='SHA256',
+        checksum=base64.b64encode(b'0' * 32).decode(),
+    )
+
+    resp = upload_part(Client(), upload_url, b'a' * 10)
+
+    assert resp.status_code == 400
+    assert b'<Code>BadDigest</Code>' in resp.content
+
+
+def test_filesystem_multipart_manager_part_unsigned_checksum(filesystem_multipart_manager):
+    transfer = filesystem_multipart_manager.initialize_upload(
+        'test.bin', 10, checksum_algorithm='SHA256'
+    )
+
+    resp = upload_part(
+        Client(),
+        transfer.parts[0].upload_url,
+        b'a' * 10,
+        HTTP_X_AMZ_CHECKSUM_SHA256=base64.b64encode(hashlib.sha256(b'a' * 10).digest()).decode(),
+    )
+
+    assert resp.status_code == 403
+    assert b'<Code>HeadersNotSigned</Code>' in resp.content
+
+
+def test_filesystem_multipart_manager_part_wrong_size(filesystem_multipart_manager):
+    transfer = filesystem_multipart_manager.initialize_upload('test.bin', 10)
+
+    resp = upload_part(Client(), transfer.parts[0].upload_url, b'a' * 11)
+
+    assert resp.status_code == 400
+    assert b'<Code>InvalidArgument</Code>' in resp.content
+
+
+def test_filesystem_multipart_manager_part_signature(filesystem_multipart_manager):
+    transfer = filesystem_multipart_manager.initialize_upload('test.bin', 10)
+    upload_url = transfer.parts[0].upload_url
+
+    tampered_resp = upload_part(Client(), upload_url.replace('.', 'x.', 1), b'a' * 10)
+    wrong_method_resp = Client().post(upload_url, b'a' * 10, content_type='application/xml')
+
+    assert tampered_resp.status_code == 403
+    assert b'<Code>SignatureDoesNotMatch</Code>' in tampered_resp.content
+    assert wrong_method_resp.status_code == 403
+
+
+def test_filesystem_multipart_manager_complete_missing_part(filesystem_multipart_manager):
+    transferred_parts = upload_parts(filesystem_multipart_manager, mb(12))
+    del transferred_parts.parts[1]
+    completion = filesystem_multipart_manager.complete_upload(transferred_parts)
+
+    resp = Client().post(completion.complete_url, completion.body, content_type='application/xml')
+
+    assert resp.status_code == 400
+    assert b'<Code>InvalidPart</Code>' in resp.content
+    assert not filesystem_multipart_manager._storage.exists('test.bin')
+
+
+def test_filesystem_multipart_manager_complete_retry(filesystem_multipart_manager):
+    transferred_parts = upload_parts(filesystem_multipart_manager, mb(12))
+    missing_part = transferred_parts.parts.pop(1)
+    completion = filesystem_multipart_manager.complete_upload(transferred_parts)
+    Client().post(completion.complete_url, completion.body, content_type='application/xml')
+    transferred_parts.parts.insert(1, missing_part)
+    completion = filesystem_multipart_manager.complete_upload(transferred_parts)
+
+    resp = Client().post(completion.complete_url, completion.body, content_type='application/xml')
+
+    assert resp.status_code == 200
+    assert filesystem_multipart_manager._storage.exists('test.bin')
+
+
+def test_filesystem_multipart_manager_complete_existing(filesystem_multipart_manager, tmp_path):
+    transferred_parts = upload_parts(filesystem_multipart_manager, mb(12))
+    completion = filesystem_multipart_manager.complete_upload(transferred_parts)
+    # Another file was saved with the same name in the meantime
+    (tmp_path / 'test.bin').write_bytes(b'existing')
+
+    resp = Client().post(completion.complete_url, completion.body, content_type='application/xml')
+
+    assert resp.status_code == 412
+    assert b'<Code>PreconditionFailed</Code>' in resp.content
+    assert (tmp_path / 'test.bin').read_bytes() == b'existing'
+
+
+def test_filesystem_multipart_manager_complete_concurrent(filesystem_multipart_manager, tmp_path):
+    transferred_parts = upload_parts(filesystem_multipart_manager, mb(12))
+    completion = filesystem_multipart_manager.complete_upload(transferred_parts)
+    # Another request is completing the upload
+    (tmp_path / STAGING_DIRECTORY / transferred_parts.upload_id / 'complete.lock').touch()
+
+    resp = Client().post(completion.complete_url, completion.body, content_type='application/xml')
+
+    assert resp.status_code == 404
+    assert b'<Code>NoSuchUpload</Code>' in resp.content
+    assert not filesystem_multipart_manager._storage.exists('test.bin')
+
+
+def test_filesystem_multipart_manager_complete_malformed(filesystem_multipart_manager):
+    transferred_parts = upload_parts(filesystem_multipart_manager, 10)
+    completion = filesystem_multipart_manager.complete_upload(transferred_parts)
+
+    resp = Client().post(
+        completion.complete_url,
+        completion.body.replace('<PartNumber>1</PartNumber>', '<PartNumber>one</PartNumber>'),
+        content_type='application/xml',
+    )
+
+    assert resp.status_code == 400
+    assert b'<Code>MalformedXML</Code>' in resp.content
+
+
+def test_filesystem_multipart_manager_abort(filesystem_multipart_manager, tmp_path):
+    transfer = filesystem_multipart_manager.initialize_upload('test.bin', 10)
+
+    filesystem_multipart_manager._abort_upload_id(transfer.object_key, transfer.upload_id)
+
+    assert os.listdir(tmp_path / STAGING_DIRECTORY) == []
+    resp = upload_part(Client(), transfer.parts[0].upload_url, b'a' * 10)
+    assert resp.status_code == 404
+
+
+def test_filesystem_clean_staging(filesystem_storage, tmp_path):
+    multipart_manager = FileSystemMultipartManager(filesystem_storage)
+    expired_transfer = multipart_manager.initialize_upload('expired.bin', 10)
+    transfer = multipart_manager.initialize_upload('test.bin', 10)
+    expired_at = time.time() - 2 * MultipartManager._url_expiration.total_seconds() - 1
+    os.utime(tmp_path / STAGING_DIRECTORY / expired_transfer.upload_id, (expired_at, expired_at))
+
+    call_command('s3ff_clean_staging')
+
+    assert os.listdir(tmp_path / STAGING_DIRECTORY) == [transfer.upload_id]
+
+
+def test_filesystem_full_upload_flow(filesystem_storage, api_client: APIClient):
+    client = Client()
+    resp = api_client.post(
+        reverse('s3_file_field:upload-initialize'),
+        {'field_id': 'test_app.Resource.blob', 'file_name': 'test.txt', 'file_size': mb(7)},
+        format='json',
+    )
+    assert resp.status_code == 200
+    initialization = resp.data
+
+    parts = []
+    for part in initialization['parts']:
+        part_resp = upload_part(client, part['upload_url'], b'a' * part['size'])
+        assert part_resp.status_code == 200
+        parts.append(
+            {'part_number': part['part_number'], 'size': part['size'], 'etag': part_resp['ETag']}
+        )
+    resp = api_client.post(
+        reverse('s3_file_field:upload-complete'),
+        {
+            'upload_id': initialization['upload_id'],
+            'parts': parts,
+            'upload_signature': initialization['upload_signature'],
+        },
+        format='json',
+    )
+    assert resp.status_code == 200
+    complete_resp = client.post(
+        resp.data['complete_url'], resp.data['body'], content_type='application/xml'
+    )
+    assert complete_resp.status_code == 200
+
+    resp = api_client.post(
+        reverse('s3_file_field:finalize'),
+        {'upload_signature': initialization['upload_signature']},
+        format='json',
+    )
+    assert resp.status_code == 200
+    assert default_storage.size(initialization['object_key']) == mb(7)
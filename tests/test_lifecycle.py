@@ -0,0 +1,110 @@
+from io import StringIO
+
+from django.core.files.storage import Storage
+from django.core.management import CommandError, call_command
+import pytest
+
+from s3_file_field._multipart import ABORT_INCOMPLETE_RULE_ID, MultipartManager
+from s3_file_field.checks import check_lifecycle_rules
+
+from .storage_factories import minio_storage_factory, s3boto3_storage_factory
+
+
+@pytest.fixture
+def s3_client():
+    storage = s3boto3_storage_factory()
+    return storage.connection.meta.client, storage.bucket_name
+
+
+@pytest.fixture(autouse=True)
+def clean_lifecycle(s3_client):
+    client, bucket_name = s3_client
+    client.delete_bucket_lifecycle(Bucket=bucket_name)
+    yield
+    client.delete_bucket_lifecycle(Bucket=bucket_name)
+
+
+@pytest.fixture(params=[s3boto3_storage_factory, minio_storage_factory], ids=['s3boto3', 'minio'])
+def multipart_manager(request) -> MultipartManager:
+    storage: Storage = request.param()
+    return MultipartManager.from_storage(storage)
+
+
+def test_put_abort_incomplete_rule(multipart_manager: MultipartManager):
+    assert multipart_manager.get_abort_incomplete_rule('uploads/') is None
+
+    assert multipart_manager.put_abort_incomplete_rule('uploads/', days=3)
+
+    rule = multipart_manager.get_abort_incomplete_rule('uploads/')
+    assert rule is not None
+    assert rule.id == f'{ABORT_INCOMPLETE_RULE_ID}/uploads/'
+    assert rule.abort_incomplete_days == 3
+    # Idempotent
+    assert not multipart_manager.put_abort_incomplete_rule('uploads/', days=3)
+    # Other prefixes are not covered
+    assert multipart_manager.get_abort_incomplete_rule('other/') is None
+
+
+def test_put_abort_incomplete_rule_covered(multipart_manager: MultipartManager, s3_client):
+    client, bucket_name = s3_client
+    client.put_bucket_lifecycle_configuration(
+        Bucket=bucket_name,
+        LifecycleConfiguration={
+            'Rules': [
+                {
+                    'ID': 'existing',
+                    'Filter': {'Prefix': ''},
+                    'Status': 'Enabled',
+                    'AbortIncompleteMultipartUpload': {'DaysAfterInitiation': 1},
+                }
+            ]
+        },
+    )
+
+    assert not multipart_manager.put_abort_incomplete_rule('uploads/')
+    rule = multipart_manager.get_abort_incomplete_rule('uploads/')
+    assert rule is not None
+    assert rule.id == 'existing'
+
+
+def test_put_abort_incomplete_rule_merge(multipart_manager: MultipartManager, s3_client):
+    client, bucket_name = s3_client
+    expiration_rule = {
+        'ID': 'expire-logs',
+        'Filter': {'Prefix': 'logs/'},
+        'Status': 'Enabled',
+        'Expiration': {'Days': 30},
+    }
+    client.put_bucket_lifecycle_configuration(
+        Bucket=bucket_name, LifecycleConfiguration={'Rules': [expiration_rule]}
+    )
+
+    assert multipart_manager.put_abort_incomplete_rule('uploads/')
+
+    rules = client.get_bucket_lifecycle_configuration(Bucket=bucket_name)['Rules']
+    assert [rule['ID'] for rule in rules] == ['expire-logs', f'{ABORT_INCOMPLETE_RULE_ID}/uploads/']
+    assert rules[0]['Expiration'] == {'Days': 30}
+
+
+def test_lifecycle_command():
+    stdout = StringIO()
+    with pytest.raises(CommandError):
+        call_command('s3ff_lifecycle', stdout=stdout)
+    assert 'incomplete uploads are never aborted' in stdout.getvalue()
+
+    call_command('s3ff_lifecycle', '--install', '--days', '2', stdout=stdout)
+    assert 'installed a rule to abort incomplete uploads after 2 day(s)' in stdout.getvalue()
+
+    stdout = StringIO()
+    call_command('s3ff_lifecycle', stdout=stdout)
+    assert 'incomplete uploads are aborted after 2 day(s)' in stdout.getvalue()
+
+
+def test_check_lifecycle_rules(settings):
+    assert check_lifecycle_rules(None) == []
+
+    settings.S3FF_CHECK_LIFECYCLE_RULES = True
+    assert [message.id for message in check_lifecycle_rules(None)] == ['s3_file_field.W004']
+
+    call_command('s3ff_lifecycle', '--install', stdout=StringIO())
+    assert check_lifecycle_rules(None) == []
@@ -0,0 +1,289 @@
+import base64
+from datetime import timedelta
+import hashlib
+
+from django.core.files.base import ContentFile
+from django.core.files.storage import default_storage
+from django.urls import reverse
+import pytest
+import requests
+from rest_framework.test import APIClient
+
+from s3_file_field._multipart import MultipartManager, TransferredPart, TransferredParts
+from s3_file_field._multipart_memory import MemoryMultipartManager
+from s3_file_field._sizes import mb
+from s3_file_field.memory import MemoryStorage
+
+
+@pytest.fixture
+def memory_multipart_manager(s3ff_memory_storage: MemoryStorage) -> MemoryMultipartManager:
+    return MemoryMultipartManager(s3ff_memory_storage)
+
+
+def upload_parts(multipart_manager: MultipartManager, file_size: int, **kwargs) -> TransferredParts:
+    transfer = multipart_manager.initialize_upload('test.bin', file_size, **kwargs)
+    parts = []
+    for part in transfer.parts:
+        part_bytes = b'a' * part.size
+        upload_url = part.upload_url
+        checksum = None
+        if transfer.checksum_algorithm == 'SHA256':
+            checksum = base64.b64encode(hashlib.sha256(part_bytes).digest()).decode()
+            upload_url = multipart_manager._generate_presigned_part_url(
+                transfer.object_key,
+                transfer.upload_id,
+                part.part_number,
+                part.size,
+                checksum_algorithm='SHA256',
+                checksum=checksum,
+            )
+        resp = requests.put(upload_url, data=part_bytes)
+        resp.raise_for_status()
+        parts.append(
+            TransferredPart(
+                part_number=part.part_number,
+                size=part.size,
+                etag=resp.headers['ETag'],
+                checksum=checksum,
+            )
+        )
+    return TransferredParts(
+        object_key=transfer.object_key,
+        upload_id=transfer.upload_id,
+        parts=parts,
+        checksum_algorithm=transfer.checksum_algorithm,
+    )
+
+
+def test_memory_storage_default_storage(s3ff_memory_storage):
+    assert isinstance(MultipartManager.from_storage(default_storage), MemoryMultipartManager)
+
+
+def test_memory_storage_save_open(s3ff_memory_storage):
+    name = s3ff_memory_storage.save('dir/test.txt', ContentFile(b'test content'))
+
+    assert s3ff_memory_storage.exists(name)
+    assert s3ff_memory_storage.size(name) == 12
+    assert s3ff_memory_storage.listdir('') == (['dir'], [])
+    assert s3ff_memory_storage.listdir('dir') == ([], ['test.txt'])
+    with s3ff_memory_storage.open(name) as file_object:
+        assert file_object.read() == b'test content'
+    resp = requests.get(s3ff_memory_storage.url(name))
+    assert resp.content == b'test content'
+    assert resp.headers['Content-Type'] == 'text/plain'
+
+    s3ff_memory_storage.delete(name)
+    assert not s3ff_memory_storage.exists(name)
+
+
+@pytest.mark.parametrize('file_size', [10, mb(12)], ids=['10B', '12MB'])
+def test_memory_multipart_manager_full_upload(memory_multipart_manager, file_size):
+    transferred_parts = upload_parts(memory_multipart_manager, file_size)
+    completion = memory_multipart_manager.complete_upload(transferred_parts)
+
+    resp = requests.post(completion.complete_url, data=completion.body)
+
+    assert resp.status_code == 200
+    assert f'-{len(transferred_parts.parts)}"</ETag>' in resp.text
+    assert memory_multipart_manager.get_object_size(transferred_parts.object_key) == file_size
+
+
+def test_memory_multipart_manager_full_upload_checksum(memory_multipart_manager):
+    transferred_parts = upload_parts(memory_multipart_manager, mb(7), checksum_algorithm='SHA256')
+    completion = memory_multipart_manager.complete_upload(transferred_parts)
+
+    resp = requests.post(completion.complete_url, data=completion.body)
+
+    assert resp.status_code == 200
+    metadata = memory_multipart_manager.get_object_metadata(
+        transferred_parts.object_key, checksum_algorithm='SHA256'
+    )
+    part_digests = b''.join(
+        base64.b64decode(part.checksum or '') for part in transferred_parts.parts
+    )
+    composite_checksum = base64.b64encode(hashlib.sha256(part_digests).digest()).decode()
+    assert metadata.checksum == f'{composite_checksum}-2'
+
+
+def test_memory_multipart_manager_part_signature(memory_multipart_manager):
+    transfer = memory_multipart_manager.initialize_upload('test.bin', 10)
+    upload_url = transfer.parts[0].upload_url
+
+    resp = requests.put(upload_url.replace('partNumber=1', 'partNumber=2'), data=b'a' * 10)
+
+    assert resp.status_code == 403
+    assert '<Code>SignatureDoesNotMatch</Code>' in resp.text
+
+
+def test_memory_multipart_manager_part_expired(memory_multipart_manager, mocker):
+    mocker.patch.object(MemoryMultipartManager, '_url_expiration', new=timedelta(seconds=-1))
+    transfer = memory_multipart_manager.initialize_upload('test.bin', 10)
+
+    resp = requests.put(transfer.parts[0].upload_url, data=b'a' * 10)
+
+    assert resp.status_code == 403
+    assert '<Code>AccessDenied</Code>' in resp.text
+
+
+def test_memory_multipart_manager_part_bad_checksum(memory_multipart_manager):
+    transfer = memory_multipart_manager.initialize_upload(
+        'test.bin', 10, checksum_algorithm='SHA256'
+    )
+
+    upload_url = memory_multipart_manager._generate_presigned_part_url(
+        transfer.object_key,
+        transfer.upload_id,
+        1,
+        10,
+        checksum_algorithm='SHA256',
+        checksum=base64.b64encode(b'0' * 32).decode(),
+    )
+
+    resp = requests.put(upload_url, data=b'a' * 10)
+
+    assert resp.status_code == 400
+    assert '<Code>BadDigest</Code>' in resp.text
+
+
+def test_memory_multipart_manager_part_unsigned_checksum(memory_multipart_manager):
+    transfer = memory_multipart_manager.initialize_upload(
+        'test.bin', 10, checksum_algorithm='SHA256'
+    )
+
+    # As with S3, checksum headers are rejected, since they aren't signed
+    resp = requests.put(
+        transfer.parts[0].upload_url,
+        data=b'a' * 10,
+        headers={'x-amz-checksum-sha256': base64.b64encode(hashlib.sha256(b'a' * 10).digest())},
+    )
+
+    assert resp.status_code == 403
+    assert '<Code>HeadersNotSigned</Code>' in resp.text
+
+
+def test_memory_multipart_manager_complete_invalid_part(memory_multipart_manager):
+    transferred_parts = upload_parts(memory_multipart_manager, 10)
+    transferred_parts.parts[0].etag = f'"{"0" * 32}"'
+    completion = memory_multipart_manager.complete_upload(transferred_parts)
+
+    resp = requests.post(completion.complete_url, data=completion.body)
+
+    assert resp.status_code == 400
+    assert '<Code>InvalidPart</Code>' in resp.text
+
+
+def test_memory_multipart_manager_part_malformed_number(
+    memory_multipart_manager, s3ff_memory_store
+):
+    transfer = memory_multipart_manager.initialize_upload('test.bin', 10)
+    upload_url = s3ff_memory_store.presign(
+        'PUT',
+        's3ff',
+        transfer.object_key,
+        {'uploadId': transfer.upload_id, 'partNumber': 'one'},
+    )
+
+    resp = requests.put(upload_url, data=b'a' * 10)
+
+    assert resp.status_code == 400
+    assert '<Code>InvalidArgument</Code>' in resp.text
+
+
+def test_memory_multipart_manager_complete_malformed(memory_multipart_manager):
+    transferred_parts = upload_parts(memory_multipart_manager, 10)
+    completion = memory_multipart_manager.complete_upload(transferred_parts)
+
+    resp = requests.post(
+        completion.complete_url,
+        data=completion.body.replace('<PartNumber>1</PartNumber>', '<PartNumber>one</PartNumber>'),
+    )
+
+    assert resp.status_code == 400
+    assert '<Code>MalformedXML</Code>' in resp.text
+
+
+def test_memory_multipart_manager_abort(memory_multipart_manager, s3ff_memory_store):
+    transfer = memory_multipart_manager.initialize_upload('test.bin', 10)
+    assert s3ff_memory_store.list_uploads('s3ff') == [(transfer.object_key, transfer.upload_id)]
+
+    memory_multipart_manager._abort_upload_id(transfer.object_key, transfer.upload_id)
+
+    assert s3ff_memory_store.list_uploads('s3ff') == []
+    resp = requests.put(transfer.parts[0].upload_url, data=b'a' * 10)
+    assert resp.status_code == 404
+
+
+def test_memory_multipart_manager_lifecycle(memory_multipart_manager):
+    assert memory_multipart_manager.get_abort_incomplete_rule() is None
+
+    assert memory_multipart_manager.put_abort_incomplete_rule('', days=3)
+
+    rule = memory_multipart_manager.get_abort_incomplete_rule()
+    assert rule is not None
+    assert rule.abort_incomplete_days == 3
+
+
+def test_memory_multipart_manager_get_object_sizes_listing_budget(
+    memory_multipart_manager, s3ff_memory_storage, mocker
+):
+    # Many other objects share a prefix with the requested keys, and are listed before them
+    for index in range(30):
+        s3ff_memory_storage.save(f'prefix/a{index:02}', ContentFile(b'a'))
+    for name in ['prefix/y', 'prefix/z']:
+        s3ff_memory_storage.save(name, ContentFile(b'yz'))
+    get_object_size = mocker.spy(memory_multipart_manager, 'get_object_size')
+
+    sizes = memory_multipart_manager.get_object_sizes(['prefix/a00', 'prefix/z'])
+
+    assert sizes == {'prefix/a00': 1, 'prefix/z': 2}
+    # Listing stopped early, so the key which wasn't reached was fetched separately
+    get_object_size.assert_called_once_with('prefix/z')
+
+
+def test_memory_full_upload_flow(s3ff_memory_storage, api_client: APIClient):
+    resp = api_client.post(
+        reverse('s3_file_field:upload-initialize'),
+        {
+            'field_id': 'test_app.Resource.blob',
+            'file_name': 'test.txt',
+            'file_size': mb(7),
+            'content_type': 'text/plain',
+        },
+        format='json',
+    )
+    assert resp.status_code == 200
+    initialization = resp.data
+
+    parts = []
+    for part in initialization['parts']:
+        part_resp = requests.put(part['upload_url'], data=b'a' * part['size'])
+        part_resp.raise_for_status()
+        parts.append(
+            {
+                'part_number': part['part_number'],
+                'size': part['size'],
+                'etag': part_resp.headers['ETag'],
+            }
+        )
+    resp = api_client.post(
+        reverse('s3_file_field:upload-complete'),
+        {
+            'upload_id': initialization['upload_id'],
+            'parts': parts,
+            'upload_signature': initialization['upload_signature'],
+        },
+        format='json',
+    )
+    assert resp.status_code == 200
+    complete_resp = requests.post(resp.data['complete_url'], data=resp.data['body'])
+    complete_resp.raise_for_status()
+
+    resp = api_client.post(
+        reverse('s3_file_field:finalize'),
+        {'upload_signature': initialization['upload_signature']},
+        format='json',
+    )
+    assert resp.status_code == 200
+    object_resp = requests.get(default_storage.url(initialization['object_key']))
+    assert object_resp.content == b'a' * mb(7)
+    assert object_resp.headers['Content-Type'] == 'text/plain'
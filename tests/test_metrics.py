@@ -0,0 +1,124 @@
+from django.core.files.storage import default_storage
+from django.test import RequestFactory
+from django.urls import reverse
+import pytest
+
+from s3_file_field import metrics
+from s3_file_field._sizes import mb
+
+
+@pytest.fixture
+def prometheus_sink(settings):
+    sink = metrics.PrometheusMetricsSink()
+    settings.S3FF_METRICS_SINK = sink
+    return sink
+
+
+def test_default_sink_disabled():
+    assert not metrics.get_sink().enabled
+
+
+def test_sink_from_dotted_path(settings):
+    settings.S3FF_METRICS_SINK = 's3_file_field.metrics.PrometheusMetricsSink'
+    settings.S3FF_METRICS_SINK_OPTIONS = {'namespace': 'uploads'}
+    sink = metrics.get_sink()
+    assert isinstance(sink, metrics.PrometheusMetricsSink)
+    assert sink.namespace == 'uploads'
+
+
+def test_prometheus_render(prometheus_sink):
+    prometheus_sink.increment('uploads.initialized', tags={'field': 'a'})
+    prometheus_sink.increment('uploads.initialized', tags={'field': 'b'})
+    prometheus_sink.increment('uploads.initialized', tags={'field': 'b'})
+    prometheus_sink.observe('uploads.part_count', 3)
+
+    rendered = prometheus_sink.render()
+
+    assert rendered.count('# TYPE s3ff_uploads_initialized_total counter') == 1
+    assert 's3ff_uploads_initialized_total{field="a"} 1\n' in rendered
+    assert 's3ff_uploads_initialized_total{field="b"} 2\n' in rendered
+    assert 's3ff_uploads_part_count_bucket{le="2"} 0\n' in rendered
+    assert 's3ff_uploads_part_count_bucket{le="5"} 1\n' in rendered
+    assert 's3ff_uploads_part_count_bucket{le="+Inf"} 1\n' in rendered
+    assert 's3ff_uploads_part_count_sum 3\n' in rendered
+    assert 's3ff_uploads_part_count_count 1\n' in rendered
+
+
+def test_prometheus_render_escapes_labels(prometheus_sink):
+    prometheus_sink.increment('pipeline.stage_failed', tags={'processor': 'a\\b"c\nd'})
+
+    rendered = prometheus_sink.render()
+
+    assert 's3ff_pipeline_stage_failed_total{processor="a\\\\b\\"c\\nd"} 1\n' in rendered
+
+
+def test_timed(prometheus_sink):
+    @metrics.timed('work', tags={'kind': 'test'})
+    def work():
+        return 'result'
+
+    assert work() == 'result'
+    assert 's3ff_work_count{kind="test"} 1\n' in prometheus_sink.render()
+
+
+def test_timed_exception(prometheus_sink):
+    @metrics.timed('work')
+    def work():
+        raise ValueError
+
+    with pytest.raises(ValueError):
+        work()
+    assert 's3ff_work_count 1\n' in prometheus_sink.render()
+
+
+def test_prometheus_metrics_view(prometheus_sink):
+    prometheus_sink.increment('uploads.completed')
+
+    resp = metrics.prometheus_metrics_view(RequestFactory().get('/metrics/'))
+
+    assert resp.status_code == 200
+    assert b's3ff_uploads_completed_total 1\n' in resp.content
+
+
+def test_prometheus_metrics_view_disabled():
+    resp = metrics.prometheus_metrics_view(RequestFactory().get('/metrics/'))
+
+    assert resp.status_code == 404
+
+
+def test_views_instrumented(api_client, prometheus_sink):
+    resp = api_client.post(
+        reverse('s3_file_field:upload-initialize'),
+        {'field_id': 'test_app.Resource.blob', 'file_name': 'test.txt', 'file_size': mb(10)},
+        format='json',
+    )
+    assert resp.status_code == 200
+
+    rendered = prometheus_sink.render()
+    assert 's3ff_uploads_initialized_total{field="test_app.Resource.blob"} 1\n' in rendered
+    assert 's3ff_uploads_part_count_sum{field="test_app.Resource.blob"} 2\n' in rendered
+    assert 's3ff_views_upload_initialize_count 1\n' in rendered
+    assert 's3ff_multipart_initialize_upload_count 1\n' in rendered
+    assert 's3ff_multipart_create_upload_id_count{manager=' in rendered
+
+
+def test_finalize_failure_counted(api_client, prometheus_sink):
+    resp = api_client.post(
+        reverse('s3_file_field:upload-initialize'),
+        {'field_id': 'test_app.Resource.blob', 'file_name': 'test.txt', 'file_size': 10},
+        format='json',
+    )
+    # Never upload the object
+    default_storage.delete(resp.data['object_key'])
+
+    resp = api_client.post(
+        reverse('s3_file_field:finalize'),
+        {'upload_signature': resp.data['upload_signature']},
+        format='json',
+    )
+
+    assert resp.status_code == 400
+    assert (
+        's3ff_uploads_failed_total{field="test_app.Resource.blob",reason="not_found"} 1\n'
+        in prometheus_sink.render()
+    )
@@ -1,18 +1,22 @@
 from io import BytesIO
-from typing import TYPE_CHECKING, cast
+from typing import Any, cast
+from urllib.parse import parse_qsl, urlparse
+from uuid import uuid4
 
-from botocore.exceptions import ClientError
-from django.conf import settings
-from django.core.files.storage import FileSystemStorage, Storage
-from minio import Minio
+from django.core.exceptions import ImproperlyConfigured
+from django.core.files.storage import Storage
 from minio_storage.storage import MinioStorage
 import pytest
 import requests
 from storages.backends.s3boto3 import S3Boto3Storage
 
+from s3_file_field import _multipart_boto3, metrics
 from s3_file_field._multipart import (
     MultipartManager,
     ObjectNotFoundError,
+    PartPlan,
+    PresignedParts,
+    PresignedPartTransfer,
     TransferredPart,
     TransferredParts,
 )
@@ -20,49 +24,7 @@ from s3_file_field._multipart_boto3 import Boto3MultipartManager
 from s3_file_field._multipart_minio import MinioMultipartManager
 from s3_file_field._sizes import gb, mb
 
-if TYPE_CHECKING:
-    # mypy_boto3_s3 only provides types
-    import mypy_boto3_s3 as s3
-
-
-def s3boto3_storage_factory() -> 'S3Boto3Storage':
-    storage = S3Boto3Storage(
-        access_key=settings.MINIO_STORAGE_ACCESS_KEY,
-        secret_key=settings.MINIO_STORAGE_SECRET_KEY,
-        region_name='test-region',
-        bucket_name=settings.MINIO_STORAGE_MEDIA_BUCKET_NAME,
-        # For testing, connect to a local Minio instance
-        endpoint_url=(
-            f'{"https" if settings.MINIO_STORAGE_USE_HTTPS else "http"}:'
-            f'//{settings.MINIO_STORAGE_ENDPOINT}'
-        ),
-    )
-
-    resource: s3.ServiceResource = storage.connection
-    client: s3.Client = cast('s3.Client', resource.meta.client)
-    try:
-        client.head_bucket(Bucket=settings.MINIO_STORAGE_MEDIA_BUCKET_NAME)
-    except ClientError:
-        client.create_bucket(Bucket=settings.MINIO_STORAGE_MEDIA_BUCKET_NAME)
-
-    return storage
-
-
-def minio_storage_factory() -> MinioStorage:
-    return MinioStorage(
-        minio_client=Minio(
-            endpoint=settings.MINIO_STORAGE_ENDPOINT,
-            secure=settings.MINIO_STORAGE_USE_HTTPS,
-            access_key=settings.MINIO_STORAGE_ACCESS_KEY,
-            secret_key=settings.MINIO_STORAGE_SECRET_KEY,
-            # Don't use s3_connection_params.region, let Minio set its own value internally
-        ),
-        bucket_name=settings.MINIO_STORAGE_MEDIA_BUCKET_NAME,
-        auto_create_bucket=True,
-        presign_urls=True,
-        # TODO: Test the case of an alternate base_url
-        # base_url='http://minio:9000/bucket-name'
-    )
+from .storage_factories import minio_storage_factory, s3boto3_storage_factory
 
 
 @pytest.fixture
@@ -101,7 +63,7 @@ def test_multipart_manager_supported_storage(storage: Storage):
 
 
 def test_multipart_manager_supported_storage_unsupported():
-    storage = FileSystemStorage()
+    storage = Storage()
     assert not MultipartManager.supported_storage(storage)
 
 
@@ -161,6 +123,98 @@ def test_multipart_manager_generate_presigned_part_url(multipart_manager: Multip
     assert isinstance(upload_url, str)
 
 
+@pytest.mark.parametrize(
+    'setting,host',
+    [
+        ('S3FF_TRANSFER_ACCELERATION', 's3ff-test.s3-accelerate.amazonaws.com'),
+        ('S3FF_DUALSTACK_ENDPOINT', 's3ff-test.s3.dualstack.test-region.amazonaws.com'),
+    ],
+    ids=['accelerate', 'dualstack'],
+)
+def test_boto3_multipart_manager_transfer_endpoint(
+    settings, s3boto3_storage: S3Boto3Storage, setting, host
+):
+    setattr(settings, setting, True)
+    multipart_manager = Boto3MultipartManager(s3boto3_storage)
+
+    upload_url = multipart_manager._generate_presigned_part_url(
+        'new-object', 'fake-upload-id', 1, 100
+    )
+    assert urlparse(upload_url).netloc == host
+    # Other requests are still made to the storage's endpoint
+    assert multipart_manager._client.meta.endpoint_url == s3boto3_storage.endpoint_url
+
+
+def test_boto3_multipart_manager_transfer_endpoint_storage(s3boto3_storage: S3Boto3Storage):
+    s3boto3_storage.s3ff_transfer_acceleration = True  # type: ignore[attr-defined]
+    upload_url = Boto3MultipartManager(s3boto3_storage)._generate_presigned_part_url(
+        'new-object', 'fake-upload-id', 1, 100
+    )
+    assert urlparse(upload_url).netloc == 's3ff-test.s3-accelerate.amazonaws.com'
+
+
+def test_boto3_multipart_manager_shared_client(s3boto3_storage: S3Boto3Storage):
+    multipart_manager = Boto3MultipartManager(s3boto3_storage)
+
+    # The client is reused by managers, but is not the storage's own thread-local client
+    assert Boto3MultipartManager(s3boto3_storage)._client is multipart_manager._client
+    assert multipart_manager._client is not s3boto3_storage.connection.meta.client
+    assert multipart_manager._signing_client is multipart_manager._client
+    # botocore's Config sets its options as attributes dynamically
+    config = cast(Any, multipart_manager._client.meta.config)
+    assert config.max_pool_connections == 50
+    assert config.retries == {'mode': 'standard'}
+
+
+def test_boto3_multipart_manager_client_config(settings, s3boto3_storage: S3Boto3Storage):
+    client = Boto3MultipartManager(s3boto3_storage)._client
+    settings.S3FF_BOTO3_CLIENT_CONFIG = {'max_pool_connections': 100, 'read_timeout': 5}
+
+    multipart_manager = Boto3MultipartManager(s3boto3_storage)
+
+    assert multipart_manager._client is not client
+    config = cast(Any, multipart_manager._client.meta.config)
+    assert config.max_pool_connections == 100
+    assert config.read_timeout == 5
+
+
+def test_boto3_multipart_manager_connection_pool_stats(boto3_multipart_manager):
+    boto3_multipart_manager.test_upload()
+
+    stats = boto3_multipart_manager.connection_pool_stats()
+
+    assert stats is not None
+    assert stats.max_connections == 50
+    assert stats.in_use == 0
+    assert stats.utilization == 0.0
+
+
+def test_boto3_multipart_manager_connection_pool_stats_unknown(boto3_multipart_manager, mocker):
+    # botocore's internals have changed
+    mocker.patch.object(
+        boto3_multipart_manager._client._endpoint.http_session, '_manager', object()
+    )
+
+    assert boto3_multipart_manager.connection_pool_stats() is None
+
+
+def test_boto3_multipart_manager_connection_pool_sampled(settings, boto3_multipart_manager, mocker):
+    settings.S3FF_METRICS_SINK = metrics.PrometheusMetricsSink()
+    mocker.patch.object(_multipart_boto3, '_pool_observed_at', float('-inf'))
+    connection_pool_stats = mocker.spy(Boto3MultipartManager, 'connection_pool_stats')
+
+    boto3_multipart_manager.test_upload()
+    boto3_multipart_manager.test_upload()
+
+    connection_pool_stats.assert_called_once()
+
+
+def test_minio_multipart_manager_dualstack_endpoint(settings, minio_storage: MinioStorage):
+    settings.S3FF_DUALSTACK_ENDPOINT = True
+    with pytest.raises(ImproperlyConfigured):
+        MinioMultipartManager(minio_storage)
+
+
 @pytest.mark.skip
 def test_multipart_manager_generate_presigned_part_url_content_length(
     multipart_manager: MultipartManager,
@@ -173,6 +227,27 @@ def test_multipart_manager_generate_presigned_part_url_content_length(
     assert 'content-length' in upload_url
 
 
+def test_multipart_manager_generate_presigned_part_url_checksum(
+    multipart_manager: MultipartManager,
+):
+    upload_url = multipart_manager._generate_presigned_part_url(
+        'new-object', 'fake-upload-id', 1, 100, checksum_algorithm='SHA256', checksum='ZmFrZQ=='
+    )
+
+    headers = multipart_manager._presigned_part_headers(upload_url, 'SHA256', 'ZmFrZQ==')
+
+    # Object stores reject unsigned "x-amz-*" headers, so the checksum is either a signed query
+    # parameter, or a signed header which must be sent
+    query = dict(parse_qsl(urlparse(upload_url).query))
+    if 'x-amz-checksum-sha256' in query:
+        assert query['x-amz-checksum-sha256'] == 'ZmFrZQ=='
+        assert headers == {}
+    else:
+        assert 'x-amz-checksum-sha256' in query['X-Amz-SignedHeaders'].split(';')
+        assert headers['x-amz-checksum-sha256'] == 'ZmFrZQ=='
+    assert 'X-Amz-Signature' in query or 'Signature' in query
+
+
 def test_multipart_manager_generate_presigned_complete_url(multipart_manager: MultipartManager):
     upload_url = multipart_manager._generate_presigned_complete_url(
         TransferredParts(object_key='new-object', upload_id='fake-upload-id', parts=[])
@@ -226,6 +301,39 @@ def test_multipart_manager_get_object_size_not_found(multipart_manager: Multipar
         )
 
 
+def test_multipart_manager_read_object_range(storage, multipart_manager: MultipartManager):
+    key = storage.save(name=f'object-range-{uuid4()}', content=BytesIO(b'0123456789'))
+
+    assert multipart_manager.read_object_range(key, 2, 5) == b'23456'
+
+    storage.delete(key)
+
+
+def test_multipart_manager_get_object_sizes(storage, multipart_manager: MultipartManager, mocker):
+    prefix = f'object-sizes-{uuid4()}'
+    keys = [storage.save(name=f'{prefix}/{size}', content=BytesIO(b'X' * size)) for size in [1, 2]]
+    get_object_size = mocker.spy(multipart_manager, 'get_object_size')
+
+    sizes = multipart_manager.get_object_sizes([*keys, f'{prefix}/no-such-object'])
+
+    assert sizes == {keys[0]: 1, keys[1]: 2}
+    # The shared prefix was listed instead
+    get_object_size.assert_not_called()
+
+    for key in keys:
+        storage.delete(key)
+
+
+def test_multipart_manager_get_object_sizes_no_prefix(storage, multipart_manager: MultipartManager):
+    key = storage.save(name=f'object-sizes-{uuid4()}', content=BytesIO(b'X' * 3))
+
+    sizes = multipart_manager.get_object_sizes([key, 'no-such-object'])
+
+    assert sizes == {key: 3}
+
+    storage.delete(key)
+
+
 @pytest.mark.parametrize(
     'file_size,requested_part_size,initial_part_size,final_part_size,part_count',
     [
@@ -264,3 +372,46 @@ def test_multipart_manager_iter_part_sizes(
 
     assert all(part_size == initial_part_size for part_size in part_sizes[:-1])
     assert part_sizes[-1] == final_part_size
+
+
+@pytest.mark.parametrize(
+    'file_size,part_size,count,last_part_size',
+    [(0, 10, 0, 0), (10, 10, 1, 10), (25, 10, 3, 5)],
+    ids=['empty', 'single_part', 'different_final'],
+)
+def test_part_plan_from_file_size(file_size, part_size, count, last_part_size):
+    plan = PartPlan.from_file_size(file_size, part_size)
+
+    assert plan == PartPlan(part_size=part_size, count=count, last_part_size=last_part_size)
+    assert sum(size for _, size in plan) == file_size
+
+
+def test_presigned_parts_lazy(mocker):
+    presign = mocker.Mock(side_effect=lambda part_number, part_size: f'url-{part_number}')
+    parts = PresignedParts(PartPlan.from_file_size(gb(5), mb(5)), presign)
+
+    assert len(parts) == 1024
+    presign.assert_not_called()
+
+    assert parts[-1] == PresignedPartTransfer(part_number=1024, size=mb(5), upload_url='url-1024')
+    presign.assert_called_once_with(1024, mb(5))
+    with pytest.raises(IndexError):
+        parts[1024]
+
+
+def test_multipart_manager_generate_presigned_complete_body_checksum(
+    multipart_manager: MultipartManager,
+):
+    body = multipart_manager._generate_presigned_complete_body(
+        TransferredParts(
+            object_key='new-object',
+            upload_id='fake-upload-id',
+            parts=[
+                TransferredPart(part_number=1, size=1, etag='fake-etag-1', checksum='ZmFrZQ=='),
+            ],
+            checksum_algorithm='SHA256',
+        )
+    )
+
+    assert '<Part><PartNumber>1</PartNumber><ETag>fake-etag-1</ETag>' in body
+    assert '<ChecksumSHA256>ZmFrZQ==</ChecksumSHA256></Part>' in body
@@ -0,0 +1,189 @@
+import json
+
+from django.core.cache import cache
+from django.core.files.base import ContentFile
+from django.urls import reverse
+import pytest
+import requests
+
+from s3_file_field import _tokens, metrics, notifications
+from s3_file_field._multipart_memory import MemoryMultipartManager
+from s3_file_field._sizes import mb
+from s3_file_field.memory import MemoryStorage
+from test_app.models import Resource
+
+from .test_memory import upload_parts
+
+
+def created_notification(object_key: str, size: int, event_name: str = 's3:ObjectCreated:Put'):
+    # As sent by a MinIO webhook target
+    return {
+        'EventName': event_name,
+        'Key': f's3ff/{object_key}',
+        'Records': [
+            {
+                'eventVersion': '2.0',
+                'eventSource': 'minio:s3',
+                'eventName': event_name,
+                's3': {
+                    'bucket': {'name': 's3ff'},
+                    'object': {'key': object_key.replace(' ', '+'), 'size': size, 'eTag': 'abc'},
+                },
+            }
+        ],
+    }
+
+
+@pytest.fixture(autouse=True)
+def clear_confirmations():
+    yield
+    cache.clear()
+
+
+@pytest.fixture
+def notifications_enabled(settings):
+    settings.S3FF_NOTIFICATIONS = True
+
+
+@pytest.fixture
+def notification_token(settings, notifications_enabled) -> str:
+    settings.S3FF_NOTIFICATION_TOKEN = 'test-token'
+    return settings.S3FF_NOTIFICATION_TOKEN
+
+
+def test_ingest(s3ff_memory_storage, notifications_enabled):
+    assert notifications.ingest(created_notification('test key.txt', 12)) == 1
+
+    metadata = notifications.get_confirmation(s3ff_memory_storage, 'test key.txt')
+    assert metadata is not None
+    assert (metadata.size, metadata.etag) == (12, 'abc')
+    # Confirmations are specific to a bucket
+    assert (
+        notifications.get_confirmation(MemoryStorage(bucket_name='other'), 'test key.txt') is None
+    )
+
+
+def test_ingest_disabled(s3ff_memory_storage):
+    notifications.ingest(created_notification('test.txt', 12))
+
+    assert notifications.get_confirmation(s3ff_memory_storage, 'test.txt') is None
+
+
+def test_ingest_sns(s3ff_memory_storage, notifications_enabled):
+    notification = created_notification('test.txt', 12, 'ObjectCreated:CompleteMultipartUpload')
+
+    assert notifications.ingest({'Type': 'Notification', 'Message': json.dumps(notification)}) == 1
+    assert notifications.get_confirmation(s3ff_memory_storage, 'test.txt') is not None
+
+
+def test_ingest_removed(s3ff_memory_storage, notifications_enabled):
+    notifications.ingest(created_notification('test.txt', 12))
+    notifications.ingest(created_notification('test.txt', 12, 's3:ObjectRemoved:Delete'))
+
+    assert notifications.get_confirmation(s3ff_memory_storage, 'test.txt') is None
+
+
+def test_ingest_other_events():
+    assert notifications.ingest({'Event': 's3:TestEvent'}) == 0
+
+
+@pytest.mark.parametrize('notification', [[], {'Records': [{'eventName': 'ObjectCreated:Put'}]}])
+def test_ingest_malformed(notification):
+    with pytest.raises(ValueError, match='Malformed bucket notification'):
+        notifications.ingest(notification)
+
+
+def test_bucket_notifications_view(client, s3ff_memory_storage, notification_token):
+    resp = client.post(
+        reverse('s3_file_field:notifications'),
+        created_notification('test.txt', 12),
+        content_type='application/json',
+        HTTP_AUTHORIZATION=f'Bearer {notification_token}',
+    )
+
+    assert resp.status_code == 204
+    assert notifications.get_confirmation(s3ff_memory_storage, 'test.txt') is not None
+
+
+def test_bucket_notifications_view_invalid_token(client, s3ff_memory_storage, notification_token):
+    resp = client.post(
+        reverse('s3_file_field:notifications'),
+        created_notification('test.txt', 12),
+        content_type='application/json',
+        HTTP_AUTHORIZATION='wrong-token',
+    )
+
+    assert resp.status_code == 403
+    assert notifications.get_confirmation(s3ff_memory_storage, 'test.txt') is None
+
+
+def test_bucket_notifications_view_malformed(client, notification_token):
+    resp = client.post(
+        reverse('s3_file_field:notifications'),
+        'not json',
+        content_type='application/json',
+        HTTP_AUTHORIZATION=notification_token,
+    )
+
+    assert resp.status_code == 400
+
+
+def test_bucket_notifications_view_disabled(client):
+    resp = client.post(reverse('s3_file_field:notifications'), {}, content_type='application/json')
+
+    assert resp.status_code == 404
+
+
+def finalize(api_client, object_key: str, file_size: int):
+    upload_signature = _tokens.dumps(
+        {
+            'field_id': Resource._meta.get_field('blob').id,
+            'object_key': object_key,
+            'file_size': file_size,
+        }
+    )
+    return api_client.post(
+        reverse('s3_file_field:finalize'), {'upload_signature': upload_signature}, format='json'
+    )
+
+
+def test_finalize_confirmed_by_notification(api_client, s3ff_notifications, settings, mocker):
+    sink = metrics.PrometheusMetricsSink()
+    settings.S3FF_METRICS_SINK = sink
+    # The fake notifier delivers a notification as soon as the upload completes
+    multipart = MemoryMultipartManager(MemoryStorage(store=s3ff_notifications))
+    transferred_parts = upload_parts(multipart, mb(6))
+    completion = multipart.complete_upload(transferred_parts)
+    requests.post(completion.complete_url, data=completion.body).raise_for_status()
+    get_object_metadata = mocker.spy(MemoryMultipartManager, 'get_object_metadata')
+
+    resp = finalize(api_client, transferred_parts.object_key, mb(6))
+
+    assert resp.status_code == 200
+    get_object_metadata.assert_not_called()
+    assert (
+        's3ff_uploads_confirmed_by_notification_total{field="test_app.Resource.blob"} 1\n'
+        in sink.render()
+    )
+
+
+def test_finalize_without_notification(
+    api_client, s3ff_memory_storage, notifications_enabled, mocker
+):
+    object_key = s3ff_memory_storage.save('test.txt', ContentFile(b'test content'))
+    get_object_metadata = mocker.spy(MemoryMultipartManager, 'get_object_metadata')
+
+    resp = finalize(api_client, object_key, 12)
+
+    assert resp.status_code == 200
+    get_object_metadata.assert_called_once()
+
+
+def test_finalize_removed_object(api_client, s3ff_notifications):
+    storage = MemoryStorage(store=s3ff_notifications)
+    object_key = storage.save('test.txt', ContentFile(b'test content'))
+    storage.delete(object_key)
+
+    resp = finalize(api_client, object_key, 12)
+
+    assert resp.status_code == 400
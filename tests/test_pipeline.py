@@ -0,0 +1,208 @@
+from django.core.cache import cache
+from django.core.files.base import ContentFile
+from django.urls import reverse
+import pytest
+
+from s3_file_field import _tokens, metrics, pipeline
+from s3_file_field._multipart_memory import MemoryMultipartManager
+from s3_file_field.checks import check_pipeline_cache
+from test_app.models import Resource
+
+PNG_HEADER = b'\x89PNG\r\n\x1a\n'
+
+
+@pytest.fixture(autouse=True)
+def clear_results():
+    yield
+    cache.clear()
+
+
+@pytest.fixture
+def blob_field(mocker):
+    field = Resource._meta.get_field('blob')
+    mocker.patch.object(field, 'processors', [])
+    return field
+
+
+@pytest.fixture
+def stored_object_key(s3ff_memory_storage) -> str:
+    return s3ff_memory_storage.save('test.png', ContentFile(PNG_HEADER + b'a' * 1000))
+
+
+@pytest.fixture
+def immediate_scheduler(settings):
+    settings.S3FF_PIPELINE_SCHEDULER = pipeline.ImmediateScheduler()
+
+
+def stored_object(field, storage, object_key: str) -> pipeline.StoredObject:
+    manager = MemoryMultipartManager(storage)
+    return pipeline.StoredObject(
+        field, object_key, manager.get_object_metadata(object_key), manager
+    )
+
+
+def test_stored_object_read(blob_field, s3ff_memory_storage, stored_object_key, mocker):
+    obj = stored_object(blob_field, s3ff_memory_storage, stored_object_key)
+    read_object_range = mocker.spy(MemoryMultipartManager, 'read_object_range')
+
+    assert obj.head(8) == PNG_HEADER
+    # Reads within a prefix which was already read are not repeated
+    assert obj.read(2, 4) == PNG_HEADER[2:6]
+    assert obj.read(1000, 100) == b'a' * 8
+    assert obj.read(2000) == b''
+
+    assert [call.args[2:] for call in read_object_range.call_args_list] == [(0, 8), (1000, 8)]
+    assert obj.bytes_read == 16
+
+
+def test_content_type_sniffer(blob_field, s3ff_memory_storage, stored_object_key):
+    sniffer = pipeline.ContentTypeSniffer()
+    other_key = s3ff_memory_storage.save('test.txt', ContentFile(b'text'))
+
+    assert sniffer(stored_object(blob_field, s3ff_memory_storage, stored_object_key)) == 'image/png'
+    assert sniffer(stored_object(blob_field, s3ff_memory_storage, other_key)) is None
+
+
+def test_run_pipeline(blob_field, stored_object_key, settings, caplog):
+    sink = metrics.PrometheusMetricsSink()
+    settings.S3FF_METRICS_SINK = sink
+
+    def failing(stored_object):
+        raise ValueError('test error')
+
+    def size(stored_object):
+        # Earlier results are available to later processors
+        assert stored_object.results['content_type'] == 'image/png'
+        return stored_object.size
+
+    blob_field.processors = [pipeline.ContentTypeSniffer(), failing, size]
+
+    results = pipeline.run_pipeline(blob_field.id, stored_object_key)
+
+    assert results == {'content_type': 'image/png', 'size': 1008}
+    assert pipeline.get_results(stored_object_key) == results
+    assert 'Error in processor "failing"' in caplog.text
+    rendered = sink.render()
+    assert (
+        's3ff_pipeline_stage_failed_total{field="test_app.Resource.blob",processor="failing"} 1\n'
+        in rendered
+    )
+    assert 's3ff_pipeline_stage_count{field="test_app.Resource.blob",processor="size"} 1\n' in (
+        rendered
+    )
+
+
+@pytest.mark.django_db
+def test_processing_results(blob_field, stored_object_key, immediate_scheduler):
+    blob_field.processors = [pipeline.ContentTypeSniffer()]
+    resource = Resource.objects.create(blob=stored_object_key)
+
+    pipeline.schedule(blob_field, stored_object_key)
+
+    assert Resource.objects.get(pk=resource.pk).blob.processing_results == {
+        'content_type': 'image/png'
+    }
+
+
+def test_thread_pool_scheduler(blob_field, stored_object_key, settings):
+    scheduler = pipeline.ThreadPoolScheduler(max_workers=2)
+    settings.S3FF_PIPELINE_SCHEDULER = scheduler
+    blob_field.processors = [pipeline.ContentTypeSniffer()]
+
+    pipeline.schedule(blob_field, stored_object_key)
+    scheduler.shutdown()
+
+    assert pipeline.get_results(stored_object_key) == {'content_type': 'image/png'}
+
+
+def test_scheduler_from_dotted_path(settings):
+    settings.S3FF_PIPELINE_SCHEDULER = 's3_file_field.pipeline.ThreadPoolScheduler'
+    settings.S3FF_PIPELINE_SCHEDULER_OPTIONS = {'max_workers': 8}
+
+    scheduler = pipeline.get_scheduler()
+
+    assert isinstance(scheduler, pipeline.ThreadPoolScheduler)
+    assert scheduler.max_workers == 8
+
+
+def test_finalize_schedules_pipeline(
+    api_client, blob_field, stored_object_key, immediate_scheduler
+):
+    blob_field.processors = [pipeline.ContentTypeSniffer()]
+    upload_signature = _tokens.dumps(
+        {'field_id': blob_field.id, 'object_key': stored_object_key, 'file_size': 1008}
+    )
+
+    resp = api_client.post(
+        reverse('s3_file_field:finalize'), {'upload_signature': upload_signature}, format='json'
+    )
+
+    assert resp.status_code == 200
+    assert pipeline.get_results(stored_object_key) == {'content_type': 'image/png'}
+
+
+def test_finalize_repeated_schedules_pipeline_once(
+    api_client, blob_field, stored_object_key, immediate_scheduler, mocker
+):
+    blob_field.processors = [pipeline.ContentTypeSniffer()]
+    upload_signature = _tokens.dumps(
+        {'field_id': blob_field.id, 'object_key': stored_object_key, 'file_size': 1008}
+    )
+    run_pipeline = mocker.spy(pipeline, 'run_pipeline')
+
+    for _ in range(2):
+        resp = api_client.post(
+            reverse('s3_file_field:finalize'), {'upload_signature': upload_signature}, format='json'
+        )
+        assert resp.status_code == 200
+
+    run_pipeline.assert_called_once()
+
+
+def test_schedule_after_failure(blob_field, stored_object_key, immediate_scheduler, mocker):
+    blob_field.processors = [pipeline.ContentTypeSniffer()]
+    get_object_metadata = mocker.patch.object(
+        MemoryMultipartManager, 'get_object_metadata', side_effect=RuntimeError
+    )
+
+    with pytest.raises(RuntimeError):
+        pipeline.schedule(blob_field, stored_object_key)
+    mocker.stop(get_object_metadata)
+
+    # The claim was released, so the pipeline may be scheduled again
+    assert pipeline.schedule(blob_field, stored_object_key)
+    assert pipeline.get_results(stored_object_key) == {'content_type': 'image/png'}
+
+
+def test_rerun(blob_field, stored_object_key, immediate_scheduler, mocker):
+    blob_field.processors = [pipeline.ContentTypeSniffer()]
+    run_pipeline = mocker.spy(pipeline, 'run_pipeline')
+
+    assert pipeline.schedule(blob_field, stored_object_key)
+    assert not pipeline.schedule(blob_field, stored_object_key)
+    assert pipeline.rerun(blob_field, stored_object_key)
+
+    assert run_pipeline.call_count == 2
+
+
+@pytest.mark.django_db
+def test_delete_clears_results(blob_field, stored_object_key, immediate_scheduler):
+    blob_field.processors = [pipeline.ContentTypeSniffer()]
+    resource = Resource.objects.create(blob=stored_object_key)
+    pipeline.schedule(blob_field, stored_object_key)
+
+    resource.blob.delete()
+
+    assert pipeline.get_results(stored_object_key) == {}
+    # The object may be replaced by another with the same key, which is processed anew
+    assert cache.get(pipeline._scheduled_key(stored_object_key)) is None
+
+
+def test_check_pipeline_cache(blob_field, settings):
+    blob_field.processors = [pipeline.ContentTypeSniffer()]
+
+    # The test settings use the default, process-local cache
+    assert [message.id for message in check_pipeline_cache(None)] == ['s3_file_field.W005']
+
+    blob_field.processors = []
+    assert check_pipeline_cache(None) == []
@@ -0,0 +1,60 @@
+from typing import cast
+
+import pytest
+
+from s3_file_field._multipart import MultipartManager
+from s3_file_field._sizes import gb, kb, mb, tb
+from s3_file_field.fields import S3FileField
+from s3_file_field.planning import AdaptivePartSizePlanner, ClientHints, FixedPartSizePlanner
+from test_app.models import Resource
+
+
+@pytest.mark.parametrize(
+    'file_size,hints,part_size',
+    [
+        # Default
+        (gb(1), ClientHints(), mb(64)),
+        # Huge file
+        (tb(1), ClientHints(), gb(1) + mb(25)),
+        # Slow client
+        (gb(1), ClientHints(bandwidth=kb(256)), mb(8)),
+        # Concurrent client
+        (mb(512), ClientHints(concurrency=8), mb(32)),
+    ],
+    ids=['default', 'huge', 'slow', 'concurrent'],
+)
+def test_adaptive_part_size_planner(file_size, hints, part_size):
+    planner = AdaptivePartSizePlanner()
+
+    assert planner(file_size, None, hints) == part_size
+
+
+def test_iter_part_sizes_planner(mocker):
+    field = cast(S3FileField, Resource._meta.get_field('blob'))
+    planner = mocker.Mock(return_value=mb(10))
+    mocker.patch.object(field, 'part_size_planner', planner)
+    hints = ClientHints(bandwidth=mb(1))
+
+    part_sizes = [
+        part_size
+        for _, part_size in MultipartManager._iter_part_sizes(mb(25), field=field, hints=hints)
+    ]
+
+    planner.assert_called_once_with(mb(25), field, hints)
+    assert part_sizes == [mb(10), mb(10), mb(5)]
+
+
+def test_iter_part_sizes_planner_limits():
+    field = S3FileField(part_size_planner=FixedPartSizePlanner(kb(1)))
+
+    part_sizes = [
+        part_size for _, part_size in MultipartManager._iter_part_sizes(mb(8), field=field)
+    ]
+
+    # The planned part size is still subject to S3's minimum
+    assert part_sizes == [mb(5), mb(3)]
+
+
+def test_field_part_size_planner_conflict():
+    with pytest.raises(TypeError, match=r'part_size_planner'):
+        S3FileField(part_size=mb(10), part_size_planner=AdaptivePartSizePlanner())
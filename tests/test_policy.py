@@ -0,0 +1,39 @@
+from django.core.exceptions import ValidationError
+import pytest
+
+from s3_file_field.policy import UploadPolicy
+
+
+def test_policy_unrestricted():
+    UploadPolicy().validate('test.bin', 1, None)
+
+
+@pytest.mark.parametrize(
+    'file_name,file_size,content_type,error_field',
+    [
+        ('test.png', 1, 'image/png', 'file_size'),
+        ('test.png', 101, 'image/png', 'file_size'),
+        ('test.jpg', 50, 'image/png', 'file_name'),
+        ('test', 50, 'image/png', 'file_name'),
+        ('test.png', 50, 'text/plain', 'content_type'),
+        ('test.png', 50, None, 'content_type'),
+    ],
+    ids=['too_small', 'too_large', 'extension', 'no_extension', 'content_type', 'no_content_type'],
+)
+def test_policy_validate_invalid(file_name, file_size, content_type, error_field):
+    policy = UploadPolicy(
+        min_size=10,
+        max_size=100,
+        allowed_content_types=['image/*'],
+        allowed_extensions=['.png'],
+    )
+
+    with pytest.raises(ValidationError) as e:
+        policy.validate(file_name, file_size, content_type)
+    assert list(e.value.error_dict) == [error_field]
+
+
+def test_policy_validate_case_insensitive():
+    policy = UploadPolicy(allowed_content_types=['image/png'], allowed_extensions=['png'])
+
+    policy.validate('TEST.PNG', 1, 'Image/PNG')
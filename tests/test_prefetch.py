@@ -0,0 +1,88 @@
+from django.core.files.base import ContentFile
+import pytest
+
+from s3_file_field._multipart import MultipartManager, UnsupportedStorageError
+from s3_file_field.prefetch import S3FileQuerySet, prefetch_s3_metadata
+from test_app.models import Resource
+
+
+@pytest.fixture
+def resources():
+    resources = [
+        Resource.objects.create(blob=ContentFile(b'a' * size, name='test.txt'))
+        for size in [1, 2, 3]
+    ]
+    yield resources
+    for resource in resources:
+        resource.blob.delete(save=False)
+
+
+@pytest.mark.django_db
+def test_prefetch_s3_metadata(resources, mocker):
+    resources = list(Resource.objects.order_by('pk'))
+    get_object_metadata = mocker.spy(MultipartManager, 'get_objects_metadata')
+
+    prefetch_s3_metadata(resources, 'blob')
+
+    get_object_metadata.assert_called_once()
+    size = mocker.spy(resources[0].blob.storage, 'size')
+    assert [resource.blob.size for resource in resources] == [1, 2, 3]
+    assert resources[0].blob.metadata.size == 1
+    size.assert_not_called()
+
+
+@pytest.mark.django_db
+def test_prefetch_s3_metadata_stale(resources):
+    resource = Resource.objects.get(pk=resources[0].pk)
+    prefetch_s3_metadata([resource], 'blob')
+
+    resource.blob.save('other.txt', ContentFile(b'a' * 10))
+
+    assert resource.blob.size == 10
+    resource.blob.delete(save=False)
+
+
+@pytest.mark.django_db
+def test_prefetch_s3_metadata_missing(resources):
+    resources[0].blob.delete(save=False)
+    resources[0].blob.name = 'no-such-object'
+    resources[0].save()
+    prefetched = list(Resource.objects.order_by('pk'))
+
+    prefetch_s3_metadata(prefetched, 'blob')
+
+    # Missing objects are not cached, so accessing them raises as usual
+    assert prefetched[0].blob._s3ff_metadata is None
+    assert prefetched[1].blob.size == 2
+
+
+@pytest.mark.django_db
+def test_prefetch_s3_metadata_unsupported_storage(resources, mocker):
+    prefetched = list(Resource.objects.order_by('pk'))
+    mocker.patch.object(MultipartManager, 'from_storage', side_effect=UnsupportedStorageError)
+
+    prefetch_s3_metadata(prefetched, 'blob')
+
+    # The metadata falls back to the storage's size
+    assert prefetched[0].blob._s3ff_metadata is None
+    assert prefetched[0].blob.metadata.size == 1
+    assert prefetched[1].blob.size == 2
+
+
+def test_prefetch_s3_metadata_not_s3_file_field():
+    with pytest.raises(TypeError):
+        prefetch_s3_metadata([Resource()], 'id')
+
+
+@pytest.mark.django_db
+def test_queryset_prefetch_s3_metadata(resources, mocker):
+    get_objects_metadata = mocker.spy(MultipartManager, 'get_objects_metadata')
+    queryset = S3FileQuerySet(model=Resource).prefetch_s3_metadata('blob').order_by('pk')
+
+    assert [resource.blob.size for resource in queryset[:2]] == [1, 2]
+    assert get_objects_metadata.call_count == 1
+    assert len(get_objects_metadata.call_args.args[1]) == 2
+    # The queryset is only prefetched once
+    list(queryset)
+    list(queryset)
+    assert get_objects_metadata.call_count == 2
@@ -0,0 +1,57 @@
+from django.urls import reverse
+import pytest
+
+from s3_file_field.regions import REGION_HEADER
+
+from .fuzzy import Re
+
+
+def eu_resolver(request):
+    return 'eu'
+
+
+def initialize(api_client, field_id='test_app.RegionalResource.blob', **kwargs):
+    headers = kwargs.pop('headers', {})
+    resp = api_client.post(
+        reverse('s3_file_field:upload-initialize'),
+        {'field_id': field_id, 'file_name': 'test.txt', 'file_size': 10, **kwargs},
+        format='json',
+        **{f'HTTP_{key.upper().replace("-", "_")}': value for key, value in headers.items()},
+    )
+    assert resp.status_code == 200
+    return resp.data
+
+
+def test_region_default(api_client):
+    assert initialize(api_client)['object_key'] == Re(r'us/.*/test\.txt')
+
+
+def test_region_header(api_client):
+    initialization = initialize(api_client, headers={REGION_HEADER: 'eu'})
+    assert initialization['object_key'] == Re(r'eu/.*/test\.txt')
+
+
+def test_region_header_unknown(api_client):
+    initialization = initialize(api_client, headers={REGION_HEADER: 'ap'})
+    assert initialization['object_key'] == Re(r'us/.*/test\.txt')
+
+
+def test_region_latencies(api_client):
+    initialization = initialize(api_client, region_latencies={'us': 120, 'eu': 35.5, 'ap': 1})
+    assert initialization['object_key'] == Re(r'eu/.*/test\.txt')
+
+
+@pytest.mark.parametrize('resolver', [eu_resolver, 'tests.test_regions.eu_resolver'])
+def test_region_resolver(api_client, settings, resolver):
+    settings.S3FF_REGION_RESOLVER = resolver
+    assert initialize(api_client)['object_key'] == Re(r'eu/.*/test\.txt')
+    # Headers take precedence
+    initialization = initialize(api_client, headers={REGION_HEADER: 'us'})
+    assert initialization['object_key'] == Re(r'us/.*/test\.txt')
+
+
+def test_region_unrouted_field(api_client):
+    initialization = initialize(
+        api_client, field_id='test_app.Resource.blob', headers={REGION_HEADER: 'eu'}
+    )
+    assert initialization['object_key'] == Re(r'[0-9a-f]{8}-.*/test\.txt')
@@ -31,7 +31,7 @@ def test_registry_get_field(s3ff_field: S3FileField):
 def test_registry_iter_fields(s3ff_field: S3FileField):
     fields = list(_registry.iter_fields())
 
-    assert len(fields) == 3
+    assert len(fields) == 7
     assert any(field is s3ff_field for field in fields)
 
 
@@ -1,5 +1,11 @@
+from django.core.files.storage import Storage, default_storage
 import pytest
+from rest_framework import serializers
 
+from s3_file_field._multipart import MultipartManager
+from s3_file_field.rest_framework import S3FileListSerializer, S3FileSerializerField
+from s3_file_field.widgets import S3PlaceholderFile
+from test_app.models import Resource
 from test_app.rest import ResourceSerializer
 
 
@@ -62,3 +68,77 @@ def test_serializer_save_update(resource, stored_file_object, s3ff_field_value):
     serializer.save()
 
     assert resource.blob.name == stored_file_object.name
+
+
+class VerifiedResourceSerializer(serializers.ModelSerializer):
+    class Meta:
+        model = Resource
+        fields = '__all__'
+        extra_kwargs = {'blob': {'verify': True}}
+        list_serializer_class = S3FileListSerializer
+
+
+def test_serializer_verify(s3ff_field_value):
+    serializer = VerifiedResourceSerializer(data={'blob': s3ff_field_value})
+
+    assert serializer.is_valid()
+
+
+def test_serializer_verify_missing(stored_file_object, s3ff_field_value):
+    default_storage.delete(stored_file_object.name)
+    serializer = VerifiedResourceSerializer(data={'blob': s3ff_field_value})
+
+    assert not serializer.is_valid()
+    assert serializer.errors['blob'][0].code == 'missing'
+
+
+def test_serializer_verify_size_mismatch(stored_file_object, s3ff_field_value_factory):
+    field_value = s3ff_field_value_factory(
+        S3PlaceholderFile(stored_file_object.name, stored_file_object.size + 1)
+    )
+    serializer = VerifiedResourceSerializer(data={'blob': field_value})
+
+    assert not serializer.is_valid()
+    assert serializer.errors['blob'][0].code == 'size_mismatch'
+
+
+class SizeOnlyStorage(Storage):
+    """A storage which MultipartManager does not support."""
+
+    def __init__(self, sizes):
+        self.sizes = sizes
+
+    def exists(self, name):
+        return name in self.sizes
+
+    def size(self, name):
+        return self.sizes[name]
+
+
+@pytest.mark.parametrize('sizes,valid', [({'test_key': 12}, True), ({}, False)])
+def test_serializer_verify_unsupported_storage(s3ff_field_value_factory, sizes, valid):
+    class UnsupportedStorageSerializer(serializers.Serializer):
+        blob = S3FileSerializerField(verify=True, storage=SizeOnlyStorage(sizes))
+
+    field_value = s3ff_field_value_factory(S3PlaceholderFile('test_key', 12))
+    serializer = UnsupportedStorageSerializer(data={'blob': field_value})
+
+    assert serializer.is_valid() is valid
+
+
+def test_list_serializer_bulk(stored_file_object, s3ff_field_value, mocker):
+    get_object_sizes = mocker.spy(MultipartManager, 'get_object_sizes')
+    from_field = mocker.spy(S3PlaceholderFile, 'from_field')
+    serializer = VerifiedResourceSerializer(
+        data=[{'blob': s3ff_field_value}, {'blob': 'test_key'}, {'blob': s3ff_field_value}],
+        many=True,
+    )
+
+    assert not serializer.is_valid()
+    assert serializer.errors[0] == {}
+    assert serializer.errors[1]['blob'][0].code == 'invalid'
+    assert serializer.errors[2] == {}
+    # Each distinct value is decoded once, and all objects are looked up together
+    assert from_field.call_count == 2
+    get_object_sizes.assert_called_once()
+    assert list(get_object_sizes.call_args.args[1]) == [stored_file_object.name]
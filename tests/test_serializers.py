@@ -1,8 +1,14 @@
+from datetime import timedelta
+
 from django.core import signing
 import pytest
 from rest_framework.exceptions import ValidationError
 
+from s3_file_field import _tokens
 from s3_file_field._multipart import (
+    MultipartManager,
+    PartPlan,
+    PresignedParts,
     PresignedPartTransfer,
     PresignedTransfer,
     TransferredPart,
@@ -70,6 +76,7 @@ def test_upload_initialization_response_serialization(
             'upload_id': initialization.upload_id,
             'parts': initialization.parts,
             'upload_signature': 'test-upload-signature',
+            'correlation_id': 'test-correlation-id',
         }
     )
     assert isinstance(serializer.data, dict)
@@ -92,3 +99,144 @@ def test_upload_completion_request_deserialization():
     completion = serializer.save()
     assert isinstance(completion, TransferredParts)
     assert all(isinstance(part, TransferredPart) for part in completion.parts)
+
+
+def test_upload_initialization_request_deserialization_policy_violation():
+    serializer = UploadInitializationRequestSerializer(
+        data={
+            'field_id': 'test_app.RestrictedResource.blob',
+            'file_name': 'test-name.jpg',
+            'file_size': 15,
+            'content_type': 'image/jpeg',
+        }
+    )
+    with pytest.raises(ValidationError) as e:
+        serializer.is_valid(raise_exception=True)
+    assert e.value.detail == {'file_name': ['File extension "jpg" is not allowed.']}
+
+
+def test_upload_initialization_response_serialization_presigned_parts():
+    parts = PresignedParts(
+        PartPlan.from_file_size(25, 10),
+        lambda part_number, part_size: f'http://minio.test/test-bucket/{part_number}',
+    )
+    serializer = UploadInitializationResponseSerializer(
+        {
+            'object_key': 'test-object-key',
+            'upload_id': 'test-upload-id',
+            'parts': parts,
+            'upload_signature': 'test-upload-signature',
+            'correlation_id': 'test-correlation-id',
+        }
+    )
+
+    assert serializer.data['parts'] == [
+        {'part_number': 1, 'size': 10, 'upload_url': 'http://minio.test/test-bucket/1'},
+        {'part_number': 2, 'size': 10, 'upload_url': 'http://minio.test/test-bucket/2'},
+        {'part_number': 3, 'size': 5, 'upload_url': 'http://minio.test/test-bucket/3'},
+    ]
+
+
+def test_upload_completion_request_deserialization_sorted():
+    upload_signature = signing.dumps({'object_key': 'test-object-key', 'field_id': 'test-field-id'})
+    serializer = UploadCompletionRequestSerializer(
+        data={
+            'upload_signature': upload_signature,
+            'upload_id': 'test-upload-id',
+            'parts': [
+                {'part_number': 2, 'size': 3_500, 'etag': 'test-etag-2', 'duration': 0.5},
+                {'part_number': 1, 'size': 10_000, 'etag': 'test-etag-1', 'duration': 2},
+            ],
+        }
+    )
+
+    serializer.is_valid(raise_exception=True)
+    completion = serializer.save()
+    assert [part.part_number for part in completion.parts] == [1, 2]
+    assert [part.duration for part in completion.parts] == [2, 0.5]
+
+
+@pytest.mark.parametrize(
+    'parts,error',
+    [
+        (
+            [{'part_number': 1, 'size': 0, 'etag': 'test-etag-1'}],
+            {'parts': {0: {'size': ['A positive integer is required.']}}},
+        ),
+        (
+            [{'part_number': '\u00b2', 'size': 15, 'etag': 'test-etag-1'}],
+            {'parts': {0: {'part_number': ['A positive integer is required.']}}},
+        ),
+        (
+            [{'part_number': 1, 'size': 10}],
+            {'parts': {0: {'etag': ['A non-empty string is required.']}}},
+        ),
+        (
+            [
+                {'part_number': 1, 'size': 10, 'etag': 'test-etag-1'},
+                {'part_number': 3, 'size': 5, 'etag': 'test-etag-3'},
+            ],
+            {'parts': ['Part numbers must be contiguous, starting from 1.']},
+        ),
+        (
+            [
+                {'part_number': 1, 'size': 10, 'etag': 'test-etag-1'},
+                {'part_number': 2, 'size': 4, 'etag': 'test-etag-2'},
+            ],
+            {'parts': ['Part sizes do not add up to the initialized file size.']},
+        ),
+        (
+            [{'part_number': 1, 'size': 15, 'etag': 'test-etag-1', 'duration': -1}],
+            {'parts': {0: {'duration': ['A non-negative number is required.']}}},
+        ),
+    ],
+    ids=[
+        'invalid_size',
+        'unicode_part_number',
+        'missing_etag',
+        'not_contiguous',
+        'size_mismatch',
+        'invalid_duration',
+    ],
+)
+def test_upload_completion_request_deserialization_invalid_parts(parts, error):
+    upload_signature = signing.dumps(
+        {'object_key': 'test-object-key', 'field_id': 'test-field-id', 'file_size': 15}
+    )
+    serializer = UploadCompletionRequestSerializer(
+        data={'upload_signature': upload_signature, 'upload_id': 'test-upload-id', 'parts': parts}
+    )
+
+    with pytest.raises(ValidationError) as e:
+        serializer.is_valid(raise_exception=True)
+    assert e.value.detail == error
+
+
+def test_upload_completion_request_deserialization_invalid_signature():
+    serializer = UploadCompletionRequestSerializer(
+        data={
+            'upload_signature': 'test-upload-signature',
+            'upload_id': 'test-upload-id',
+            'parts': [{'part_number': 1, 'size': 10, 'etag': 'test-etag-1'}],
+        }
+    )
+
+    with pytest.raises(ValidationError) as e:
+        serializer.is_valid(raise_exception=True)
+    assert e.value.detail == {'upload_signature': ['Invalid upload signature.']}
+
+
+def test_upload_completion_request_deserialization_expired_signature(monkeypatch):
+    upload_signature = _tokens.dumps({'object_key': 'test-object-key', 'field_id': 'test-field-id'})
+    monkeypatch.setattr(MultipartManager, '_url_expiration', timedelta(seconds=-1))
+    serializer = UploadCompletionRequestSerializer(
+        data={
+            'upload_signature': upload_signature,
+            'upload_id': 'test-upload-id',
+            'parts': [{'part_number': 1, 'size': 10, 'etag': 'test-etag-1'}],
+        }
+    )
+
+    with pytest.raises(ValidationError) as e:
+        serializer.is_valid(raise_exception=True)
+    assert e.value.detail == {'upload_signature': ['Upload signature has expired.']}
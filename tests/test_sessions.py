@@ -0,0 +1,184 @@
+from datetime import timedelta
+
+from django.contrib import admin
+from django.core.files.storage import default_storage
+from django.test import RequestFactory
+from django.urls import reverse
+from django.utils import timezone
+import pytest
+import requests
+
+from s3_file_field import sessions
+from s3_file_field._multipart import MultipartManager
+from s3_file_field.checks import check_session_store, check_upload_limit
+from s3_file_field.upload_sessions.admin import UploadSessionAdmin
+from s3_file_field.upload_sessions.models import UploadSession
+
+
+@pytest.fixture
+def database_store(settings):
+    settings.S3FF_SESSION_STORE = 's3_file_field.sessions.DatabaseSessionStore'
+
+
+@pytest.fixture
+def user(django_user_model):
+    return django_user_model.objects.create(username='test-user')
+
+
+def initialize(api_client, file_size=10):
+    return api_client.post(
+        reverse('s3_file_field:upload-initialize'),
+        {'field_id': 'test_app.Resource.blob', 'file_name': 'test.txt', 'file_size': file_size},
+        format='json',
+    )
+
+
+def test_default_store_disabled():
+    assert not sessions.get_session_store().enabled
+
+
+@pytest.mark.django_db
+def test_database_store_lifecycle(api_client, database_store, user):
+    api_client.force_authenticate(user=user)
+    initialization = initialize(api_client).data
+
+    session = UploadSession.objects.get()
+    assert session.upload_id == initialization['upload_id']
+    assert session.object_key == initialization['object_key']
+    assert session.file_size == 10
+    assert session.part_count == 1
+    assert session.user == user
+    assert session.status == UploadSession.Status.INITIALIZED
+
+    part = initialization['parts'][0]
+    part_resp = requests.put(part['upload_url'], data=b'a' * 10)
+    resp = api_client.post(
+        reverse('s3_file_field:upload-complete'),
+        {
+            'upload_id': initialization['upload_id'],
+            'parts': [{'part_number': 1, 'size': 10, 'etag': part_resp.headers['ETag']}],
+            'upload_signature': initialization['upload_signature'],
+        },
+        format='json',
+    )
+    session.refresh_from_db()
+    assert session.status == UploadSession.Status.COMPLETED
+
+    requests.post(resp.data['complete_url'], data=resp.data['body']).raise_for_status()
+    api_client.post(
+        reverse('s3_file_field:finalize'),
+        {'upload_signature': initialization['upload_signature']},
+        format='json',
+    )
+    session.refresh_from_db()
+    assert session.status == UploadSession.Status.FINALIZED
+
+
+@pytest.mark.django_db
+def test_concurrent_upload_limit(api_client, database_store, settings, user):
+    settings.S3FF_MAX_CONCURRENT_UPLOADS_PER_USER = 1
+    api_client.force_authenticate(user=user)
+
+    assert initialize(api_client).status_code == 200
+    resp = initialize(api_client)
+    assert resp.status_code == 429
+    assert resp.data == {'detail': 'Too many concurrent uploads.'}
+
+    # Stalled uploads don't count towards the limit
+    UploadSession.objects.update(modified=timezone.now() - timedelta(days=2))
+    assert initialize(api_client).status_code == 200
+
+
+@pytest.mark.django_db
+def test_concurrent_upload_limit_race(api_client, database_store, settings, user, mocker):
+    settings.S3FF_MAX_CONCURRENT_UPLOADS_PER_USER = 1
+    api_client.force_authenticate(user=user)
+    assert initialize(api_client).status_code == 200
+    # Simulate a concurrent initialization, which counted before the first session was created
+    mocker.patch.object(sessions.DatabaseSessionStore, 'count_in_flight', return_value=0)
+    abort_upload_id = mocker.spy(
+        type(MultipartManager.from_storage(default_storage)), '_abort_upload_id'
+    )
+
+    resp = initialize(api_client)
+
+    assert resp.status_code == 429
+    assert UploadSession.objects.count() == 1
+    abort_upload_id.assert_called_once()
+
+
+@pytest.mark.django_db
+def test_cache_store(settings, user):
+    store = sessions.CacheSessionStore()
+    session_kwargs = {
+        'field_id': 'test_app.Resource.blob',
+        'object_key': 'test-object-key',
+        'upload_id': 'test-upload-id',
+        'file_size': 10,
+        'part_count': 1,
+    }
+
+    session_id = store.create(**session_kwargs, user=user)
+    other_session_id = store.create(**session_kwargs, user=user)
+    assert store.count_in_flight(user) == 2
+
+    store.set_status(session_id, sessions.COMPLETED)
+    assert store.count_in_flight(user) == 2
+
+    store.set_status(session_id, sessions.FINALIZED)
+    store.set_status(other_session_id, sessions.ABORTED)
+    assert store.count_in_flight(user) == 0
+
+
+@pytest.mark.django_db
+def test_cache_store_stalled(settings, user):
+    settings.S3FF_SESSION_STALLED_AFTER = timedelta(0)
+    store = sessions.CacheSessionStore()
+
+    store.create(
+        field_id='test_app.Resource.blob',
+        object_key='test-object-key',
+        upload_id='test-upload-id',
+        file_size=10,
+        part_count=1,
+        user=user,
+    )
+
+    assert store.count_in_flight(user) == 0
+
+
+@pytest.mark.django_db
+def test_admin_abort_uploads(api_client, database_store, mocker):
+    initialize(api_client)
+    model_admin = UploadSessionAdmin(UploadSession, admin.site)
+    message_user = mocker.patch.object(model_admin, 'message_user')
+
+    model_admin.abort_uploads(RequestFactory().post('/'), UploadSession.objects.all())
+
+    assert UploadSession.objects.get().status == UploadSession.Status.ABORTED
+    message_user.assert_called_once_with(mocker.ANY, 'Aborted 1 upload(s).', mocker.ANY)
+
+
+def test_check_upload_limit_without_store(settings):
+    settings.S3FF_MAX_CONCURRENT_UPLOADS_PER_USER = 1
+
+    assert [message.id for message in check_upload_limit(None)] == ['s3_file_field.W002']
+
+
+def test_check_session_store_without_app(database_store, mocker):
+    mocker.patch('s3_file_field.checks.apps.is_installed', return_value=False)
+
+    assert [message.id for message in check_session_store(None)] == ['s3_file_field.E003']
+
+
+@pytest.mark.django_db
+def test_upload_abort_session(api_client, database_store):
+    initialization = initialize(api_client).data
+
+    api_client.post(
+        reverse('s3_file_field:upload-abort'),
+        {'upload_signature': initialization['upload_signature']},
+        format='json',
+    )
+
+    assert UploadSession.objects.get().status == UploadSession.Status.ABORTED
@@ -0,0 +1,132 @@
+from django.core.files.base import ContentFile
+from django.core.files.storage import default_storage
+from django.urls import reverse
+import pytest
+import requests
+
+from s3_file_field._registry import get_storage_key_prefix
+from s3_file_field.sharding import HashedPrefix, ShardedStorage
+from test_app.models import ShardedResource
+
+from .fuzzy import Re
+
+
+@pytest.fixture
+def sharded_storage() -> ShardedStorage:
+    return ShardedStorage(
+        {'a': default_storage, 'b': default_storage}, selector=lambda name: 'b', default='a'
+    )
+
+
+def test_sharded_storage_aliases():
+    storage = ShardedStorage([default_storage, default_storage])
+    assert list(storage.shards) == ['0', '1']
+
+
+def test_sharded_storage_invalid():
+    with pytest.raises(ValueError, match='At least one shard'):
+        ShardedStorage({})
+    with pytest.raises(ValueError, match='Invalid shard alias'):
+        ShardedStorage({'a/b': default_storage})
+    with pytest.raises(ValueError, match='Unknown default shard'):
+        ShardedStorage({'a': default_storage}, default='b')
+
+
+def test_sharded_storage_generate_filename(sharded_storage):
+    assert sharded_storage.generate_filename('test/file.txt') == 'b/test/file.txt'
+
+
+def test_sharded_storage_hash_selector():
+    storage = ShardedStorage({'a': default_storage, 'b': default_storage})
+    aliases = {storage.generate_filename(f'{index}.txt').partition('/')[0] for index in range(20)}
+    assert aliases == {'a', 'b'}
+
+
+def test_sharded_storage_reassign(sharded_storage):
+    assert sharded_storage.reassign('b/test/file.txt', 'a') == 'a/test/file.txt'
+    with pytest.raises(ValueError, match='Unknown shard'):
+        sharded_storage.reassign('b/test/file.txt', 'c')
+
+
+def test_sharded_storage_split(sharded_storage):
+    assert sharded_storage.split('a/test.txt') == ('a', default_storage)
+    # Unknown names fall back to the default shard
+    assert sharded_storage.split('c/test.txt') == ('a', default_storage)
+
+    with pytest.raises(ValueError, match='does not belong to any shard'):
+        ShardedStorage({'a': default_storage}).split('test.txt')
+
+
+def test_sharded_storage_save(sharded_storage):
+    name = sharded_storage.save(
+        sharded_storage.generate_filename('test_sharded_storage_save.txt'),
+        ContentFile(b'test content'),
+    )
+    assert name == 'b/test_sharded_storage_save.txt'
+    assert default_storage.exists(name)
+    with sharded_storage.open(name) as stream:
+        assert stream.read() == b'test content'
+    assert sharded_storage.size(name) == 12
+
+    sharded_storage.delete(name)
+    assert not sharded_storage.exists(name)
+
+
+def test_hashed_prefix():
+    key = HashedPrefix()(None, 'test.txt')
+    assert key == Re(
+        r'[0-9a-f]{4}/[0-9a-f]{8}-[0-9a-f]{4}-[0-9a-f]{4}-[0-9a-f]{4}-[0-9a-f]{12}/test.txt'
+    )
+    assert HashedPrefix('uploads/', length=2)(None, 'test.txt') == Re(
+        r'[0-9a-f]{2}/uploads/test.txt'
+    )
+
+
+def test_sharded_field_deconstruct():
+    _, _, _, kwargs = ShardedResource._meta.get_field('blob').deconstruct()
+    assert 'storage' not in kwargs
+
+
+def test_sharded_field_key_prefix():
+    assert get_storage_key_prefix(default_storage) == ''
+
+
+@pytest.mark.django_db
+def test_sharded_upload_flow(api_client):
+    resp = api_client.post(
+        reverse('s3_file_field:upload-initialize'),
+        {'field_id': 'test_app.ShardedResource.blob', 'file_name': 'test.txt', 'file_size': 10},
+        format='json',
+    )
+    assert resp.status_code == 200
+    initialization = resp.data
+    assert initialization['object_key'] == Re(r'[ab]/[0-9a-f]{4}/.*/test.txt')
+
+    part = initialization['parts'][0]
+    part_resp = requests.put(part['upload_url'], data=b'a' * part['size'])
+    part_resp.raise_for_status()
+
+    resp = api_client.post(
+        reverse('s3_file_field:upload-complete'),
+        {
+            'upload_signature': initialization['upload_signature'],
+            'upload_id': initialization['upload_id'],
+            'parts': [{'part_number': 1, 'size': part['size'], 'etag': part_resp.headers['ETag']}],
+        },
+        format='json',
+    )
+    assert resp.status_code == 200
+    requests.post(resp.data['complete_url'], data=resp.data['body']).raise_for_status()
+
+    resp = api_client.post(
+        reverse('s3_file_field:finalize'),
+        {'upload_signature': initialization['upload_signature']},
+        format='json',
+    )
+    assert resp.status_code == 200
+
+    resource = ShardedResource.objects.create(blob=initialization['object_key'])
+    resource.refresh_from_db()
+    with resource.blob.open() as stream:
+        assert stream.read() == b'a' * 10
+    resource.blob.delete()
@@ -0,0 +1,174 @@
+import threading
+
+from django.core import signing
+from django.db import transaction
+from django.urls import reverse
+import pytest
+import requests
+
+from s3_file_field import signals
+from test_app.models import Resource
+
+
+class Received(list):
+    def __init__(self):
+        super().__init__()
+        self.sent = threading.Event()
+
+
+@pytest.fixture
+def received():
+    """Record the keyword arguments of each signal sent during the test."""
+    calls = Received()
+    lock = threading.Lock()
+
+    def receiver(signal, sender, **kwargs):
+        with lock:
+            calls.append((signal, sender, kwargs))
+        calls.sent.set()
+
+    all_signals = [
+        signals.s3_file_field_upload_prepare,
+        signals.s3_file_field_upload_complete,
+        signals.s3_file_field_upload_finalize,
+        signals.s3_file_field_upload_abort,
+    ]
+    for signal in all_signals:
+        signal.connect(receiver)
+    yield calls
+    for signal in all_signals:
+        signal.disconnect(receiver)
+
+
+def test_upload_signals(api_client, received):
+    resp = api_client.post(
+        reverse('s3_file_field:upload-initialize'),
+        {'field_id': 'test_app.Resource.blob', 'file_name': 'test.txt', 'file_size': 10},
+        format='json',
+    )
+    initialization = resp.data
+    part = initialization['parts'][0]
+    part_resp = requests.put(part['upload_url'], data=b'a' * 10)
+    part_resp.raise_for_status()
+
+    resp = api_client.post(
+        reverse('s3_file_field:upload-complete'),
+        {
+            'upload_id': initialization['upload_id'],
+            'parts': [{'part_number': 1, 'size': 10, 'etag': part_resp.headers['ETag']}],
+            'upload_signature': initialization['upload_signature'],
+        },
+        format='json',
+    )
+    requests.post(resp.data['complete_url'], data=resp.data['body']).raise_for_status()
+
+    resp = api_client.post(
+        reverse('s3_file_field:finalize'),
+        {'upload_signature': initialization['upload_signature']},
+        format='json',
+    )
+    assert resp.status_code == 200
+
+    assert [signal for signal, _, _ in received] == [
+        signals.s3_file_field_upload_prepare,
+        signals.s3_file_field_upload_complete,
+        signals.s3_file_field_upload_finalize,
+    ]
+    for _, sender, kwargs in received:
+        assert sender is Resource
+        assert kwargs['field'] is Resource._meta.get_field('blob')
+        assert kwargs['object_key'] == initialization['object_key']
+        assert kwargs['file_size'] == 10
+        assert kwargs['duration'] >= 0
+    assert received[0][2]['part_count'] == 1
+    assert received[1][2]['part_count'] == 1
+
+
+def test_upload_abort_signal(api_client, stored_file_object, received):
+    upload_signature = signing.dumps(
+        {
+            'field_id': 'test_app.Resource.blob',
+            'object_key': stored_file_object.name,
+            'file_size': stored_file_object.size + 1,
+        }
+    )
+
+    resp = api_client.post(
+        reverse('s3_file_field:finalize'),
+        {'upload_signature': upload_signature},
+        format='json',
+    )
+
+    assert resp.status_code == 400
+    assert len(received) == 1
+    signal, _, kwargs = received[0]
+    assert signal is signals.s3_file_field_upload_abort
+    assert kwargs['object_key'] == stored_file_object.name
+    assert kwargs['reason'] == 'rejected'
+
+
+@pytest.mark.django_db(transaction=True)
+def test_send_async(settings, received):
+    settings.S3FF_ASYNC_SIGNALS = True
+
+    signals.send(signals.s3_file_field_upload_prepare, sender=Resource, object_key='test')
+
+    assert received.sent.wait(timeout=5)
+    _, sender, kwargs = received[0]
+    assert sender is Resource
+    assert kwargs['object_key'] == 'test'
+
+
+@pytest.mark.django_db(transaction=True)
+def test_send_async_receiver_error(settings, caplog):
+    settings.S3FF_ASYNC_SIGNALS = True
+    done = threading.Event()
+
+    def failing_receiver(sender, **kwargs):
+        raise ValueError('receiver failed')
+
+    def receiver(sender, **kwargs):
+        done.set()
+
+    signals.s3_file_field_upload_prepare.connect(failing_receiver)
+    signals.s3_file_field_upload_prepare.connect(receiver)
+    try:
+        # The error must not propagate to the sender, nor prevent other receivers from running
+        signals.send(signals.s3_file_field_upload_prepare, sender=Resource)
+        signals.shutdown()
+        assert done.is_set()
+    finally:
+        signals.s3_file_field_upload_prepare.disconnect(failing_receiver)
+        signals.s3_file_field_upload_prepare.disconnect(receiver)
+
+    error_records = [record for record in caplog.records if record.name == 's3_file_field.signals']
+    assert len(error_records) == 1
+    assert error_records[0].getMessage().startswith('Error in asynchronous receiver')
+    assert isinstance(error_records[0].exc_info[1], ValueError)
+
+
+@pytest.mark.django_db(transaction=True)
+def test_send_async_on_commit(settings, received):
+    settings.S3FF_ASYNC_SIGNALS = True
+
+    with transaction.atomic():
+        signals.send(signals.s3_file_field_upload_prepare, sender=Resource, object_key='test')
+        signals.shutdown()
+        # Receivers are not run until the transaction commits
+        assert received == []
+    signals.shutdown()
+
+    assert len(received) == 1
+
+
+@pytest.mark.django_db(transaction=True)
+def test_send_async_rolled_back(settings, received):
+    settings.S3FF_ASYNC_SIGNALS = True
+
+    with pytest.raises(ValueError):
+        with transaction.atomic():
+            signals.send(signals.s3_file_field_upload_prepare, sender=Resource, object_key='test')
+            raise ValueError
+    signals.shutdown()
+
+    assert received == []
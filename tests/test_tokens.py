@@ -0,0 +1,79 @@
+from datetime import timedelta
+
+from django.core import signing
+import pytest
+
+from s3_file_field import _tokens
+
+
+@pytest.fixture
+def data():
+    return {
+        'object_key': '6a1c9f3e-1d2b-4c5d-8e7f-0123456789ab/test.bin',
+        'field_id': 'test_app.Resource.blob',
+        'file_size': 10,
+    }
+
+
+def test_tokens_roundtrip(data):
+    token = _tokens.dumps(data)
+
+    assert _tokens.loads(token) == data
+    assert _tokens.loads(token, max_age=timedelta(minutes=1)) == data
+    assert len(token) < len(signing.dumps(data))
+
+
+def test_tokens_tampered(data):
+    token = _tokens.dumps(data)
+    payload, timestamp, mac = token.split('.')
+
+    for tampered_token in [
+        f'{payload}x.{timestamp}.{mac}',
+        f'{payload}.{timestamp}x.{mac}',
+        f'{payload}.{timestamp}.{mac[:-1]}',
+        f'{payload}.{mac}',
+        '',
+    ]:
+        with pytest.raises(signing.BadSignature):
+            _tokens.loads(tampered_token)
+
+
+def test_tokens_salt(data):
+    token = _tokens.dumps(data, salt='test-salt')
+
+    assert _tokens.loads(token, salt='test-salt') == data
+    with pytest.raises(signing.BadSignature):
+        _tokens.loads(token)
+
+
+def test_tokens_expired(data):
+    token = _tokens.dumps(data)
+
+    with pytest.raises(signing.SignatureExpired):
+        _tokens.loads(token, max_age=-1)
+
+
+def test_tokens_secret_key_fallbacks(settings, data):
+    token = _tokens.dumps(data)
+    settings.SECRET_KEY_FALLBACKS = [settings.SECRET_KEY]
+    settings.SECRET_KEY = 'test-new-secret-key'
+
+    assert _tokens.loads(token) == data
+    settings.SECRET_KEY_FALLBACKS = []
+    with pytest.raises(signing.BadSignature):
+        _tokens.loads(token)
+
+
+def test_tokens_legacy(data):
+    legacy_token = signing.dumps(data)
+
+    assert _tokens.loads(legacy_token) == data
+    with pytest.raises(signing.SignatureExpired):
+        _tokens.loads(legacy_token, max_age=-1)
+
+
+def test_tokens_legacy_salt(data):
+    # Tokens signed with django.core.signing's default salt are only valid for the default salt
+    with pytest.raises(signing.BadSignature):
+        _tokens.loads(signing.dumps(data), salt='other')
+    assert _tokens.loads(signing.dumps(data, salt='other'), salt='other') == data
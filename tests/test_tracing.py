@@ -0,0 +1,98 @@
+from django.urls import reverse
+import pytest
+import requests
+
+from s3_file_field import _tokens, tracing
+
+trace = pytest.importorskip('opentelemetry.trace')
+sdk_trace = pytest.importorskip('opentelemetry.sdk.trace')
+in_memory_span_exporter = pytest.importorskip(
+    'opentelemetry.sdk.trace.export.in_memory_span_exporter'
+)
+export = pytest.importorskip('opentelemetry.sdk.trace.export')
+
+_exporter = in_memory_span_exporter.InMemorySpanExporter()
+
+
+@pytest.fixture
+def spans():
+    # The global tracer provider may only be set once per process
+    if not isinstance(trace.get_tracer_provider(), sdk_trace.TracerProvider):
+        provider = sdk_trace.TracerProvider()
+        provider.add_span_processor(export.SimpleSpanProcessor(_exporter))
+        trace.set_tracer_provider(provider)
+    _exporter.clear()
+    yield _exporter
+    _exporter.clear()
+
+
+def test_get_correlation_id():
+    assert tracing.get_correlation_id({'X-S3FF-Correlation-ID': 'abc-123'}) == 'abc-123'
+    # Invalid IDs are replaced
+    assert tracing.get_correlation_id({'X-S3FF-Correlation-ID': 'a b'}) != 'a b'
+    assert len(tracing.get_correlation_id({})) == 32
+
+
+def test_upload_traced(api_client, spans):
+    resp = api_client.post(
+        reverse('s3_file_field:upload-initialize'),
+        {'field_id': 'test_app.Resource.blob', 'file_name': 'test.txt', 'file_size': 10},
+        format='json',
+        HTTP_X_S3FF_CORRELATION_ID='test-correlation-id',
+    )
+    assert resp.data['correlation_id'] == 'test-correlation-id'
+    initialization = resp.data
+    upload_signature = _tokens.loads(initialization['upload_signature'])
+    assert upload_signature['correlation_id'] == 'test-correlation-id'
+    assert 'traceparent' in upload_signature['trace_context']
+
+    part = initialization['parts'][0]
+    part_resp = requests.put(part['upload_url'], data=b'a' * 10)
+    resp = api_client.post(
+        reverse('s3_file_field:upload-complete'),
+        {
+            'upload_id': initialization['upload_id'],
+            'parts': [
+                {'part_number': 1, 'size': 10, 'etag': part_resp.headers['ETag'], 'duration': 0.25}
+            ],
+            'upload_signature': initialization['upload_signature'],
+        },
+        format='json',
+    )
+    requests.post(resp.data['complete_url'], data=resp.data['body']).raise_for_status()
+    api_client.post(
+        reverse('s3_file_field:finalize'),
+        {'upload_signature': initialization['upload_signature']},
+        format='json',
+    )
+
+    finished = {span.name: span for span in spans.get_finished_spans()}
+    initialize_span = finished['s3ff.upload_initialize']
+    complete_span = finished['s3ff.upload_complete']
+    finalize_span = finished['s3ff.finalize']
+    for span in [initialize_span, complete_span, finalize_span]:
+        assert span.attributes['s3ff.correlation_id'] == 'test-correlation-id'
+    # Later requests continue the trace of the initialization request
+    trace_id = initialize_span.context.trace_id
+    assert complete_span.context.trace_id == trace_id
+    assert finalize_span.context.trace_id == trace_id
+    # Backend calls are children of the view spans
+    create_span = finished['s3ff.multipart.create_upload_id']
+    assert create_span.parent.span_id == initialize_span.context.span_id
+    # Client timings are recorded
+    assert complete_span.attributes['s3ff.part_duration_total'] == 0.25
+    assert [event.attributes['s3ff.part_number'] for event in complete_span.events] == [1]
+
+
+def test_span_links_to_existing_trace(spans):
+    with tracing.span('origin'):
+        trace_context = tracing.get_trace_context()
+
+    with tracing.span('request'):
+        with tracing.span('linked', trace_context=trace_context):
+            pass
+
+    finished = {span.name: span for span in spans.get_finished_spans()}
+    linked = finished['linked']
+    assert linked.context.trace_id == finished['request'].context.trace_id
+    assert [link.context.span_id for link in linked.links] == [finished['origin'].context.span_id]
@@ -1,12 +1,17 @@
+import base64
+import hashlib
 from typing import Dict, cast
 
 from django.core import signing
+from django.core.cache import cache
 from django.core.files.storage import default_storage
 from django.urls import reverse
 import pytest
 import requests
 from rest_framework.test import APIClient
 
+from s3_file_field import _idempotency, _tokens, signals
+from s3_file_field._multipart import MultipartManager
 from s3_file_field._sizes import mb
 
 from .fuzzy import URL_RE, UUID_RE, Re
@@ -23,11 +28,16 @@ def test_prepare(api_client):
         'object_key': Re(r'[0-9a-f]{8}-[0-9a-f]{4}-[0-9a-f]{4}-[0-9a-f]{4}-[0-9a-f]{12}/test.txt'),
         'upload_id': UUID_RE,
         'parts': [{'part_number': 1, 'size': 10, 'upload_url': URL_RE}],
-        'upload_signature': Re(r'.*:.*'),
+        'upload_signature': Re(r'[\w-]+\.[0-9a-z]+\.[\w-]+'),
+        'checksum_algorithm': None,
+        'correlation_id': Re(r'[0-9a-f]{32}'),
     }
-    assert signing.loads(resp.data['upload_signature']) == {
+    assert _tokens.loads(resp.data['upload_signature']) == {
         'object_key': Re(r'[0-9a-f]{8}-[0-9a-f]{4}-[0-9a-f]{4}-[0-9a-f]{4}-[0-9a-f]{12}/test.txt'),
         'field_id': 'test_app.Resource.blob',
+        'upload_id': resp.data['upload_id'],
+        'file_size': 10,
+        'correlation_id': resp.data['correlation_id'],
     }
 
 
@@ -46,7 +56,9 @@ def test_prepare_two_parts(api_client):
             {'part_number': 1, 'size': mb(5), 'upload_url': URL_RE},
             {'part_number': 2, 'size': mb(5), 'upload_url': URL_RE},
         ],
-        'upload_signature': Re(r'.*:.*'),
+        'upload_signature': Re(r'[\w-]+\.[0-9a-z]+\.[\w-]+'),
+        'checksum_algorithm': None,
+        'correlation_id': Re(r'[0-9a-f]{32}'),
     }
 
 
@@ -65,10 +77,186 @@ def test_prepare_three_parts(api_client):
             {'part_number': 2, 'size': mb(5), 'upload_url': URL_RE},
             {'part_number': 3, 'size': mb(2), 'upload_url': URL_RE},
         ],
-        'upload_signature': Re(r'.*:.*'),
+        'upload_signature': Re(r'[\w-]+\.[0-9a-z]+\.[\w-]+'),
+        'checksum_algorithm': None,
+        'correlation_id': Re(r'[0-9a-f]{32}'),
     }
 
 
+def test_prepare_policy_violation(api_client):
+    resp = api_client.post(
+        reverse('s3_file_field:upload-initialize'),
+        {
+            'field_id': 'test_app.RestrictedResource.blob',
+            'file_name': 'test.txt',
+            'file_size': mb(20),
+            'content_type': 'image/png',
+        },
+        format='json',
+    )
+    assert resp.status_code == 400
+    assert resp.data == {'file_size': ['File must be at most 10.0\xa0MB.']}
+
+
+@pytest.fixture
+def idempotent_request_data():
+    yield {
+        'field_id': 'test_app.Resource.blob',
+        'file_name': 'test.txt',
+        'file_size': 10,
+        'idempotency_key': 'test-prepare-idempotency-key',
+    }
+    cache.clear()
+
+
+@pytest.mark.django_db
+def test_prepare_idempotency_key(api_client, django_user_model, idempotent_request_data, mocker):
+    api_client.force_authenticate(user=django_user_model.objects.create(username='test-user'))
+    initialize_upload = mocker.spy(MultipartManager, 'initialize_upload')
+    request_data = idempotent_request_data
+    resp = api_client.post(reverse('s3_file_field:upload-initialize'), request_data, format='json')
+    assert resp.status_code == 200
+
+    retry_resp = api_client.post(
+        reverse('s3_file_field:upload-initialize'), request_data, format='json'
+    )
+    assert retry_resp.status_code == 200
+    assert retry_resp.data == resp.data
+    assert initialize_upload.call_count == 1
+
+    conflict_resp = api_client.post(
+        reverse('s3_file_field:upload-initialize'),
+        {**request_data, 'file_size': 20},
+        format='json',
+    )
+    assert conflict_resp.status_code == 400
+    assert conflict_resp.data == {
+        'idempotency_key': ['This key was already used with a different request.']
+    }
+
+
+@pytest.mark.django_db
+def test_prepare_idempotency_key_hints(
+    api_client, django_user_model, idempotent_request_data, mocker
+):
+    api_client.force_authenticate(user=django_user_model.objects.create(username='test-user'))
+    initialize_upload = mocker.spy(MultipartManager, 'initialize_upload')
+    resp = api_client.post(
+        reverse('s3_file_field:upload-initialize'),
+        {**idempotent_request_data, 'bandwidth': 1_000_000, 'concurrency': 4},
+        format='json',
+    )
+    assert resp.status_code == 200
+
+    # A retry may measure its hints differently, but still receives the original response
+    retry_resp = api_client.post(
+        reverse('s3_file_field:upload-initialize'),
+        {**idempotent_request_data, 'bandwidth': 500_000, 'concurrency': 2},
+        format='json',
+    )
+
+    assert retry_resp.status_code == 200
+    assert retry_resp.data == resp.data
+    assert initialize_upload.call_count == 1
+
+
+@pytest.mark.django_db
+def test_prepare_idempotency_key_in_progress(
+    api_client, django_user_model, idempotent_request_data
+):
+    user = django_user_model.objects.create(username='test-user')
+    api_client.force_authenticate(user=user)
+    # A concurrent request has reserved the key
+    upload_request = {**idempotent_request_data}
+    idempotency_key = upload_request.pop('idempotency_key')
+    _idempotency.reserve(idempotency_key, f'user:{user.pk}', upload_request)
+
+    resp = api_client.post(
+        reverse('s3_file_field:upload-initialize'), idempotent_request_data, format='json'
+    )
+
+    assert resp.status_code == 409
+
+
+@pytest.mark.django_db
+def test_prepare_idempotency_key_failed(
+    api_client, django_user_model, idempotent_request_data, mocker
+):
+    api_client.force_authenticate(user=django_user_model.objects.create(username='test-user'))
+    mocker.patch.object(MultipartManager, 'initialize_upload', side_effect=Exception('Failed'))
+    with pytest.raises(Exception, match='Failed'):
+        api_client.post(
+            reverse('s3_file_field:upload-initialize'), idempotent_request_data, format='json'
+        )
+    mocker.stopall()
+
+    # The key was released, so the initialization may be retried
+    resp = api_client.post(
+        reverse('s3_file_field:upload-initialize'), idempotent_request_data, format='json'
+    )
+
+    assert resp.status_code == 200
+
+
+def test_prepare_idempotency_key_anonymous(api_client, idempotent_request_data, mocker):
+    initialize_upload = mocker.spy(MultipartManager, 'initialize_upload')
+
+    for _ in range(2):
+        resp = api_client.post(
+            reverse('s3_file_field:upload-initialize'), idempotent_request_data, format='json'
+        )
+        assert resp.status_code == 200
+
+    # Anonymous clients without a session can't be told apart, so their keys are ignored
+    assert initialize_upload.call_count == 2
+
+
+@pytest.mark.django_db
+def test_prepare_idempotency_key_aborted(
+    api_client, django_user_model, s3ff_memory_storage, idempotent_request_data, mocker
+):
+    api_client.force_authenticate(user=django_user_model.objects.create(username='test-user'))
+    initialize_upload = mocker.spy(MultipartManager, 'initialize_upload')
+    initialization = api_client.post(
+        reverse('s3_file_field:upload-initialize'), idempotent_request_data, format='json'
+    ).data
+    resp = api_client.post(
+        reverse('s3_file_field:upload-abort'),
+        {'upload_signature': initialization['upload_signature']},
+        format='json',
+    )
+    assert resp.status_code == 204
+
+    retry_resp = api_client.post(
+        reverse('s3_file_field:upload-initialize'), idempotent_request_data, format='json'
+    )
+
+    # The aborted upload is not replayed
+    assert retry_resp.status_code == 200
+    assert retry_resp.data['upload_id'] != initialization['upload_id']
+    assert initialize_upload.call_count == 2
+
+
+def test_finalize_size_mismatch(api_client, stored_file_object):
+    upload_signature = signing.dumps(
+        {
+            'field_id': 'test_app.Resource.blob',
+            'object_key': stored_file_object.name,
+            'file_size': stored_file_object.size + 1,
+        }
+    )
+
+    resp = api_client.post(
+        reverse('s3_file_field:finalize'),
+        {'upload_signature': upload_signature},
+        format='json',
+    )
+    assert resp.status_code == 400
+    assert resp.data == ['Object size does not match the initialized upload.']
+    # The rejected object should be removed
+    assert not default_storage.exists(stored_file_object.name)
+
+
 @pytest.mark.parametrize('file_size', [10, mb(10), mb(12)], ids=['10B', '10MB', '12MB'])
 @pytest.mark.parametrize(
     'content_type',
@@ -144,7 +332,7 @@ def test_full_upload_flow(
     )
     assert resp.status_code == 200
     assert resp.data == {
-        'field_value': Re(r'.*:.*'),
+        'field_value': Re(r'[\w-]+\.[0-9a-z]+\.[\w-]+'),
     }
 
     # Verify that the Content headers were stored correctly on the object
@@ -154,3 +342,186 @@ def test_full_upload_flow(
         assert object_resp.headers['Content-Type'] == content_type
 
     default_storage.delete(initialization['object_key'])
+
+
+def test_full_upload_flow_checksum(api_client: APIClient):
+    file_size = mb(7)
+    resp = api_client.post(
+        reverse('s3_file_field:upload-initialize'),
+        {
+            'field_id': 'test_app.ChecksumResource.blob',
+            'file_name': 'test.txt',
+            'file_size': file_size,
+        },
+        format='json',
+    )
+    assert resp.status_code == 200
+    initialization = resp.data
+    assert initialization['checksum_algorithm'] == 'SHA256'
+
+    parts = []
+    for part in initialization['parts']:
+        part_bytes = b'a' * part['size']
+        checksum = base64.b64encode(hashlib.sha256(part_bytes).digest()).decode()
+        # The checksum is signed into the part's URL
+        resp = api_client.post(
+            reverse('s3_file_field:upload-part-url'),
+            {
+                'upload_signature': initialization['upload_signature'],
+                'part_number': part['part_number'],
+                'size': part['size'],
+                'checksum': checksum,
+            },
+            format='json',
+        )
+        assert resp.status_code == 200
+        part_resp = requests.put(
+            resp.data['upload_url'], data=part_bytes, headers=resp.data['headers']
+        )
+        part_resp.raise_for_status()
+        parts.append(
+            {
+                'part_number': part['part_number'],
+                'size': part['size'],
+                'etag': part_resp.headers['ETag'],
+                'checksum': checksum,
+            }
+        )
+
+    resp = api_client.post(
+        reverse('s3_file_field:upload-complete'),
+        {
+            'upload_id': initialization['upload_id'],
+            'parts': parts,
+            'upload_signature': initialization['upload_signature'],
+        },
+        format='json',
+    )
+    assert resp.status_code == 200
+    assert '<ChecksumSHA256>' in resp.data['body']
+    complete_resp = requests.post(resp.data['complete_url'], data=resp.data['body'])
+    complete_resp.raise_for_status()
+
+    resp = api_client.post(
+        reverse('s3_file_field:finalize'),
+        {'upload_signature': initialization['upload_signature']},
+        format='json',
+    )
+    assert resp.status_code == 200
+
+    default_storage.delete(initialization['object_key'])
+
+
+def test_upload_part_url_without_checksums(api_client):
+    initialization = api_client.post(
+        reverse('s3_file_field:upload-initialize'),
+        {'field_id': 'test_app.Resource.blob', 'file_name': 'test.txt', 'file_size': 10},
+        format='json',
+    ).data
+
+    resp = api_client.post(
+        reverse('s3_file_field:upload-part-url'),
+        {
+            'upload_signature': initialization['upload_signature'],
+            'part_number': 1,
+            'size': 10,
+            'checksum': 'test-checksum',
+        },
+        format='json',
+    )
+
+    assert resp.status_code == 400
+    assert resp.data == {'upload_signature': ['This upload does not use checksums.']}
+
+
+def test_upload_abort(api_client):
+    resp = api_client.post(
+        reverse('s3_file_field:upload-initialize'),
+        {'field_id': 'test_app.Resource.blob', 'file_name': 'test.txt', 'file_size': 10},
+        format='json',
+    )
+    initialization = resp.data
+    part = initialization['parts'][0]
+    part_resp = requests.put(part['upload_url'], data=b'a' * 10)
+    part_resp.raise_for_status()
+    resp = api_client.post(
+        reverse('s3_file_field:upload-complete'),
+        {
+            'upload_id': initialization['upload_id'],
+            'parts': [{'part_number': 1, 'size': 10, 'etag': part_resp.headers['ETag']}],
+            'upload_signature': initialization['upload_signature'],
+        },
+        format='json',
+    )
+    completion = resp.data
+
+    resp = api_client.post(
+        reverse('s3_file_field:upload-abort'),
+        {'upload_signature': initialization['upload_signature']},
+        format='json',
+    )
+    assert resp.status_code == 204
+
+    # The upload no longer exists, so it can't be completed
+    complete_resp = requests.post(completion['complete_url'], data=completion['body'])
+    assert not complete_resp.ok
+
+
+def test_upload_abort_repeated(api_client, s3ff_memory_storage, mocker):
+    send = mocker.spy(signals, 'send')
+    initialization = api_client.post(
+        reverse('s3_file_field:upload-initialize'),
+        {'field_id': 'test_app.Resource.blob', 'file_name': 'test.txt', 'file_size': 10},
+        format='json',
+    ).data
+
+    for _ in range(2):
+        resp = api_client.post(
+            reverse('s3_file_field:upload-abort'),
+            {'upload_signature': initialization['upload_signature']},
+            format='json',
+        )
+        assert resp.status_code == 204
+    # The abort is only reported once
+    assert [call.args[0] for call in send.call_args_list].count(
+        signals.s3_file_field_upload_abort
+    ) == 1
+
+
+def test_upload_abort_completed(api_client, s3ff_memory_storage):
+    initialization = api_client.post(
+        reverse('s3_file_field:upload-initialize'),
+        {'field_id': 'test_app.Resource.blob', 'file_name': 'test.txt', 'file_size': 10},
+        format='json',
+    ).data
+    part = initialization['parts'][0]
+    part_resp = requests.put(part['upload_url'], data=b'a' * 10)
+    completion = api_client.post(
+        reverse('s3_file_field:upload-complete'),
+        {
+            'upload_id': initialization['upload_id'],
+            'parts': [{'part_number': 1, 'size': 10, 'etag': part_resp.headers['ETag']}],
+            'upload_signature': initialization['upload_signature'],
+        },
+        format='json',
+    ).data
+    requests.post(completion['complete_url'], data=completion['body']).raise_for_status()
+
+    resp = api_client.post(
+        reverse('s3_file_field:upload-abort'),
+        {'upload_signature': initialization['upload_signature']},
+        format='json',
+    )
+
+    assert resp.status_code == 409
+    assert s3ff_memory_storage.exists(initialization['object_key'])
+
+
+def test_upload_abort_invalid_signature(api_client):
+    resp = api_client.post(
+        reverse('s3_file_field:upload-abort'),
+        {'upload_signature': 'test-upload-signature'},
+        format='json',
+    )
+    assert resp.status_code == 400
+    assert resp.data == {'upload_signature': ['Invalid upload signature.']}